@@ -10,15 +10,144 @@ import time
 from PIL import Image
 from os import path
 import requests
-from geopy.geocoders import Nominatim
+from requests.adapters import HTTPAdapter
 from datetime import date, datetime, timedelta
 import calendar
 import math
-from typing import List, Dict, Tuple, Optional
+import sys
+import unicodedata
+from collections import OrderedDict
+import json
+import csv
+import zlib
+import codecs
+import io
+import importlib.util
+import os
+import multiprocessing
+import heapq
+import itertools
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from xml.etree import ElementTree
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, CancelledError, FIRST_COMPLETED, wait
+from collections import deque
+from typing import List, Dict, Tuple, Optional, Iterator, Callable, Any
+import numpy as np
 
 #Global theme Configuration
 main_colour_theme="#00199c"
 
+#Overpass result cache configuration
+overpass_cache_path = "outerinator_cache.db"  #Kept beside outerinator.db
+overpass_cache_ttl = 24 * 3600  #Seconds before a cached result is considered stale
+overpass_cache_max_bytes = 64 * 1024 * 1024  #Compressed size cap before LRU eviction
+overpass_tile_zoom = 12  #Slippy-map zoom of the fixed grid that Overpass downloads are cached on
+overpass_kept_tags = ('name', 'leisure', 'amenity', 'tourism', 'shop', 'sport', 'natural', 'opening_hours')  #Tags kept from each Overpass element
+overpass_chunk_bytes = 64 * 1024  #Size of each chunk read from a streamed Overpass response
+
+#Overpass endpoints, tried in order of health; OUTERINATOR_OVERPASS_URLS overrides them (comma separated)
+overpass_endpoints = tuple(url.strip() for url in os.environ.get("OUTERINATOR_OVERPASS_URLS", "https://overpass-api.de/api/interpreter,https://overpass.kumi.systems/api/interpreter").split(",") if url.strip())
+overpass_hedge_percentile = 90  #Latency percentile after which a second endpoint is also asked
+overpass_hedge_min_delay = 1.0  #Seconds, never hedge sooner than this
+overpass_hedge_default_delay = 5.0  #Seconds, used until enough latencies have been seen
+overpass_latency_samples = 50  #Recent response times kept per endpoint
+overpass_max_in_flight = 2  #Endpoints asked at once for one download
+
+#Geocode cache configuration, stored beside the Overpass cache
+geocode_cache_ttl = 30 * 24 * 3600  #Seconds a found location is trusted
+geocode_negative_ttl = 15 * 60  #Seconds a "no such place" answer is trusted before asking again
+geocode_memory_entries = 512  #Locations kept in the in-memory LRU tier
+geocode_cache_max_rows = 20000  #Stored locations before the least recently used are dropped
+default_start_coords = (-36.8509, 174.7645)  #Auckland, used when a start location cannot be found
+
+#Outbound HTTP configuration, one pooled keep-alive session per service
+http_user_agent = "outerinator_app/1.0"
+http_pool_sizes = {'nominatim': 2, 'overpass': 4, 'tiles': 8}  #Open connections kept per host
+http_pool_block = {'nominatim': False, 'overpass': False, 'tiles': True}  #Wait for a free connection rather than open extra ones
+http_timeouts = {'nominatim': (5, 10), 'overpass': (10, 60), 'tiles': (5, 15)}  #(connect, read) seconds
+#Brotli is only offered when urllib3 has a decoder for it
+http_accept_encoding = "gzip, deflate, br" if any(importlib.util.find_spec(name) for name in ("brotli", "brotlicffi")) else "gzip, deflate"
+
+#Retry and circuit breaker configuration for Overpass and Nominatim
+retry_attempts = 3  #Tries per request, including the first
+retry_base_delay = 0.5  #Seconds, backoff before the first retry, doubled for each later one
+retry_max_delay = 8.0  #Seconds, cap on a single backoff before jitter
+retry_max_wait = 15.0  #Seconds, a Retry-After longer than this fails fast instead of waiting
+retryable_statuses = (429, 500, 502, 503, 504)  #Responses treated as temporary overload
+circuit_failure_threshold = 4  #Temporary failures in a row before an endpoint is switched off
+circuit_reset_seconds = 60  #Seconds an endpoint stays switched off before a trial request
+cache_stale_grace = 7 * 24 * 3600  #Seconds expired cache entries are kept to fall back on while a service is down
+
+#Offline gazetteer configuration
+gazetteer_path = "outerinator_gazetteer.db"  #Local place names for search and geocoding
+gazetteer_seed_files = ("outerinator_places.csv", "outerinator_places.geojson", "cities15000.txt")  #Imported on first run if present beside the app
+gazetteer_search_limit = 10  #Results returned per search
+
+#Offline planning configuration, see LocalPlaceStore
+#Import an extract with: python Outerinator_iteration_5.py --import-extract region.osm.pbf
+local_places_path = "outerinator_osm.db"  #Places imported from local OSM extracts
+place_source = os.environ.get("OUTERINATOR_PLACE_SOURCE", "auto")  #'auto' uses imported extracts where they cover a search and Overpass elsewhere, 'offline' never goes online, 'online' ignores extracts
+extract_import_workers = os.cpu_count() or 1  #Processes used to parse a large .osm XML extract
+extract_import_min_slice = 32 * 1024 * 1024  #Bytes of XML per process, smaller extracts are parsed in one process
+extract_import_batch = 10000  #Places written per transaction
+local_places_indexed_keys = tuple(key for key in overpass_kept_tags if key not in ('name', 'opening_hours'))  #Tags entered in the inverted tag index
+osm_type_codes = {'node': 0, 'way': 1, 'relation': 2}  #Folded into POI row ids, other types use 3
+
+#Activity categories offered by PlanningFrame and the OSM tags each one searches for
+activity_osm_tags = {
+    "Outdoors": "leisure=park|natural=wood|natural=beach",
+    "Fun": "tourism=attraction|leisure=adult_gaming_centre",
+    "Food": "amenity=restaurant|amenity=cafe|amenity=fast_food",
+    "Arcade": "leisure=adult_gaming_centre",
+    "Family": "leisure=playground|tourism=zoo|tourism=aquarium",
+    "Romantic": "tourism=viewpoint|amenity=restaurant",
+    "Shopping": "shop=department_store|shop=mall",
+    "Culture": "tourism=museum|tourism=gallery|tourism=theatre"
+}
+
+#Map search configuration
+search_debounce_ms = 300  #Pause in typing before suggestions are looked up
+search_min_chars = 3  #Shortest query that gets suggestions while typing
+search_prefix_cache_entries = 64  #Recent queries whose results are reused when the query is narrowed
+nominatim_result_limit = 10  #Results asked of Nominatim per search
+#OUTERINATOR_NOMINATIM_URL and OUTERINATOR_NOMINATIM_MIN_INTERVAL point the app at a local stand-in server,
+#the interval must stay at 1 second or more against the public Nominatim
+nominatim_min_interval = float(os.environ.get("OUTERINATOR_NOMINATIM_MIN_INTERVAL", "1.0"))  #Seconds between Nominatim requests under its usage policy
+nominatim_search_url = os.environ.get("OUTERINATOR_NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+nominatim_backoff_seconds = 30  #Pause after a 403/429 when the server gives no Retry-After
+geocode_priority_interactive = 0  #Map searches the user is waiting on
+geocode_priority_background = 1  #Planner lookups that can wait behind them
+
+#Itinerary search configuration
+travel_matrix_max_per_category = 150  #Closest places kept per category, bounds the travel-time matrix
+travel_matrix_block_rows = 256  #Rows of the travel-time matrix computed per vectorised block
+insertion_candidates_checked = 8  #Cheapest insertions tried per route position during local search
+#Exact subset DP stays under ~0.2 s up to 20 candidates with 8 stops but takes ~2.3 s at 24,
+#while the heuristic needs under 20 ms at any of these sizes
+exact_solver_max_candidates = 20  #Largest candidate set solved exactly
+exact_solver_time_budget = 1.0  #Seconds before the exact solver gives up and the heuristic runs
+nearest_neighbours_checked = 24  #Nearby candidates per route stop considered for insertions and swaps
+randomised_insertion_choices = 3  #Feasible insertions a randomised construction picks between
+parallel_search_enabled = False  #Run seeded multi-start searches on a process pool
+parallel_search_starts = 64  #Randomised constructions per planning run across all workers
+parallel_search_budget = 3.0  #Wall-clock seconds allowed for the parallel search
+
+#Place classification table, compiled once by PlaceClassifier
+place_type_keys = ('leisure', 'amenity', 'tourism', 'shop', 'sport')  #Tags checked for a place's type, first present wins
+place_type_durations = (  #Typical visit hours; a type takes the first pattern it contains
+    ('park', 2.0), ('garden', 1.5), ('viewpoint', 0.5),
+    ('restaurant', 1.5), ('cafe', 1.0), ('bar', 2.0),
+    ('cinema', 3.0), ('theatre', 2.5),
+    ('museum', 2.0), ('gallery', 1.5), ('library', 1.0),
+    ('playground', 1.0), ('sports_centre', 2.0),
+    ('zoo', 3.0), ('aquarium', 2.0),
+    ('mall', 2.0), ('shop', 1.0),
+    ('arcade', 2.0), ('adventure_park', 3.0)
+)
+place_type_default_duration = 1.5  #Hours for types that match no pattern
+opening_hours_cache_size = 4096  #Distinct opening_hours strings kept compiled before the cache is reset
+
 class Outerinator(ctk.CTk):
     #Main application class for Outerinator - an outing planning application.
     #Handles the main window and frame management for the entire application.
@@ -66,6 +195,12 @@ class Outerinator(ctk.CTk):
                     FOREIGN KEY (user_id) REFERENCES users(id)
                 )
             """)
+
+            #Plans saved before plan_data existed keep working from their details text
+            cursor.execute("PRAGMA table_info(plans)")
+            cols = [row[1] for row in cursor.fetchall()]
+            if "plan_data" not in cols:
+                cursor.execute("ALTER TABLE plans ADD COLUMN plan_data TEXT DEFAULT NULL")
             conn.commit()
         
         #Create a container frame to hold all application frames
@@ -150,13 +285,14 @@ class MapWidget(ctk.CTkFrame):
     #with search, geocoding, and marker management features.    
     def setup_geocoder(self) -> None:
         #Initialise the geocoder service for address lookup and coordinate conversion.
-        try:
-            #Initialise Nominatim geocoder with custom user agent
-            #User agent is required by OpenStreetMap's usage policy
-            self.geolocator = Nominatim(user_agent="outerinator_app/1.0 (your_email@example.com)")
-        except Exception:
-            #Handle geocoder initialisation failure
-            self.geolocator = None
+        #Shared Nominatim client, rate limited for the whole app
+        #User agent is required by OpenStreetMap's usage policy and set on its pooled session
+        self.geocoding = GeocodingService.shared()
+        self.search_future = None  #Nominatim search currently queued for this widget
+        self.search_lock = threading.Lock()  #Guards search_future and search_generation against search threads
+
+        #Local place names answer most searches without a network request
+        self.gazetteer = Gazetteer()
 
     def setup_map(self, width: int, height: int) -> None:
         #Initialise the interactive map component.
@@ -164,6 +300,9 @@ class MapWidget(ctk.CTkFrame):
         #Args: width (int): Map display width, height (int): Map display height
         
         try:
+            #Send tile downloads through the pooled keep-alive session
+            tkintermapview.map_widget.requests = PooledTileRequests(PooledSession.shared('tiles'))
+
             #Create the main map widget using tkintermapview
             self.map_widget = tkintermapview.TkinterMapView(self, width=width, height=height, corner_radius=8)
             self.map_widget.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
@@ -198,6 +337,9 @@ class MapWidget(ctk.CTkFrame):
         #Search input field
         self.search_entry = ctk.CTkEntry(search_frame, placeholder_text="Search...", width=120, height=25)
         self.search_entry.pack(side="left", padx=(0, 3))
+        #Suggestions appear while typing, Enter searches straight away
+        self.search_entry.bind("<KeyRelease>", self.on_search_key)
+        self.search_entry.bind("<Return>", lambda event: self.robust_search_location())
         
         #Search button with magnifying glass icon to signify searching as it is a easily recgnisable sign
         self.search_btn = ctk.CTkButton(search_frame, text="🔍", command=self.robust_search_location, width=30, height=25)
@@ -230,6 +372,9 @@ class MapWidget(ctk.CTkFrame):
         query = self.search_entry.get().strip()
         if not query:
             return  #Ignore empty search queries
+
+        #A direct search replaces any suggestion still waiting or in flight
+        self.cancel_pending_search()
         
         #Update button to show search in progress
         self.search_btn.configure(state="disabled", text="Searching...")
@@ -238,59 +383,172 @@ class MapWidget(ctk.CTkFrame):
         self.clear_address_results()
         
         #Execute search in separate thread to maintain UI responsiveness
-        search_thread = threading.Thread(target=self.search_thread_target, args=(query,), daemon=True)
+        search_thread = threading.Thread(target=self.search_thread_target, args=(query, self.search_generation), daemon=True)
         search_thread.start()
+
+    def cancel_pending_search(self) -> None:
+        #Drop the debounced search, if any, and mark in-flight searches as superseded.
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        with self.search_lock:
+            if self.search_future is not None:
+                self.geocoding.cancel(self.search_future)
+                self.search_future = None
+            self.search_generation += 1
+        #A superseded search never reports back, so it must not leave the button waiting
+        self.search_btn.configure(state="normal", text="Search")
+
+    def on_search_key(self, event) -> None:
+        #Offer suggestions for the text typed so far once typing pauses.
+        #Narrowing a query that was already answered in full is filtered locally.
+
+        #Args: event: Tk key event
+        if event.keysym in ("Return", "KP_Enter", "Up", "Down", "Left", "Right", "Home", "End", "Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R", "Tab", "Escape"):
+            return
+
+        self.cancel_pending_search()
+        query = self.search_entry.get().strip()
+        if len(query) < search_min_chars:
+            self.clear_address_results()
+            return
+
+        cached_results = self.cached_search_results(query)
+        if cached_results:
+            self.show_address_results(cached_results)
+            return
+
+        generation = self.search_generation
+        self.search_after_id = self.after(search_debounce_ms, lambda: self.start_suggestion_search(query, generation))
+
+    def start_suggestion_search(self, query: str, generation: int) -> None:
+        #Run a debounced search unless the user has typed since it was scheduled.
+
+        #Args: query (str): The search query string, generation (int): search_generation when it was scheduled
+        self.search_after_id = None
+        if generation != self.search_generation:
+            return
+        search_thread = threading.Thread(target=self.search_thread_target, args=(query, generation, True), daemon=True)
+        search_thread.start()
+
+    def cached_search_results(self, query: str) -> Optional[List[Dict]]:
+        #Answer a query from an earlier search for it, or for a prefix of it whose result list was complete.
+        #Only gazetteer name searches are complete: they match by prefix, so a short list for a
+        #query holds every place any longer query could match. Nominatim does not match that way.
+
+        #Args: query (str): The search query string
+
+        #Returns: Optional[List[Dict]]: Matching results, or None if the network is needed
+        query_key = Gazetteer.normalise(query)
+        for length in range(len(query_key), 0, -1):
+            entry = self.search_prefix_cache.get(query_key[:length])
+            if entry is None:
+                continue
+            results, complete = entry
+            if length == len(query_key):
+                return results
+            if not complete:
+                return None
+
+            #Every typed word must start some word of the result's name
+            words = query_key.split()
+            matches = []
+            for result in results:
+                result_words = Gazetteer.normalise(result.get('display_name', '')).split()
+                if all(any(result_word.startswith(word) for result_word in result_words) for word in words):
+                    matches.append(result)
+            return matches or None
+        return None
+
+    def remember_search_results(self, query: str, results: List[Dict], complete: bool = False) -> None:
+        #Add a query's results to the prefix cache, dropping the oldest entries when full.
+
+        #Args: query (str): The search query string, results (List[Dict]): Its results, complete (bool): Whether they are every place a longer query could match
+        query_key = Gazetteer.normalise(query)
+        self.search_prefix_cache[query_key] = (results, complete)
+        self.search_prefix_cache.move_to_end(query_key)
+        while len(self.search_prefix_cache) > search_prefix_cache_entries:
+            self.search_prefix_cache.popitem(last=False)
         
-    def search_thread_target(self, query: str) -> None:
+    def search_thread_target(self, query: str, generation: Optional[int] = None, suggestion: bool = False) -> None:
     #Target function for search thread execution.
-    #Args: query (str): The search query string
+    #Only the lookup runs here, the results are handed to finish_search on the Tk thread
+    #because Tk widgets must not be touched from other threads.
+    #Args: query (str): The search query string, generation (Optional[int]): search_generation the search belongs to, suggestion (bool): Whether this is a type-ahead search rather than a direct one
     
+        error_msg = ""
         try:
-            #Rate limiting: wait before making API request to avoid 403 errors
-            time.sleep(1)
-
             #Fetch all location results matching the query
-            results = self.get_all_locations(query)
-        
-            #Update UI in the main thread based on search results
-            if results:
-                self.show_address_results(results)
-            else:
-                self.on_search_error()
-            
+            results, complete = self.get_all_locations(query, generation)
         except Exception as e:
-            error_msg = str(e)
-            msg=error_msg 
-            self.on_search_error(msg)
+            results, complete = None, False
+            error_msg = f"Search error: {e}"
+
+        self.after(0, lambda: self.finish_search(query, generation, results, suggestion, error_msg, complete))
+
+    def finish_search(self, query: str, generation: Optional[int], results: Optional[List[Dict]], suggestion: bool = False, error_msg: str = "", complete: bool = False) -> None:
+        #Show a search's results, unless newer typing or another search has superseded it.
+        #Runs on the Tk thread, where search_generation changes, so the check and the
+        #rendering cannot be separated by a newer search.
+
+        #Args: query (str): The search query string, generation (Optional[int]): search_generation the search belongs to, results (Optional[List[Dict]]): Results from get_all_locations, suggestion (bool): Whether this was a type-ahead search, error_msg (str): Error from the lookup, if it failed, complete (bool): Whether the results are every match, see cached_search_results
+        if generation is not None and generation != self.search_generation:
+            return
+
+        if results:
+            self.remember_search_results(query, results, complete)
+            self.show_address_results(results)
+        elif not suggestion:
+            self.on_search_error(error_msg)
+        elif error_msg:
+            #A suggestion that misses stays quiet, only a failed request is mentioned
+            self.map_error_label.configure(text=error_msg)
+            self.clear_error_after_delay()
         
-    def get_all_locations(self, query: str) -> Optional[List[Dict]]:
+    def get_all_locations(self, query: str, generation: Optional[int] = None) -> Tuple[Optional[List[Dict]], bool]:
         #Query OpenStreetMap Nominatim API for location data.
-        #Args: query (str): Location search query
+        #Runs on a search thread, so it touches no widgets and network errors are raised to the caller.
+        #Args: query (str): Location search query, generation (Optional[int]): search_generation the search belongs to, it is skipped if superseded before the request is sent
             
-        #Returns: Optional[List[Dict]]: List of location results or None if error
+        #Returns: Tuple[Optional[List[Dict]], bool]: (location results, or None if there are none or the search was superseded, whether they are every match a longer query could have)
+
+        #Try the offline gazetteer first, Nominatim is only asked about misses
+        gazetteer = getattr(self, 'gazetteer', None)
+        if gazetteer:
+            learned_results = gazetteer.search_learned(query)
+            if learned_results:
+                return learned_results, False
+            local_results = gazetteer.search_names(query)
+            if local_results:
+                #The name index matches by prefix, so a short list is every match
+                return local_results, len(local_results) < gazetteer_search_limit
+        if place_source == 'offline':
+            return None, False
 
-        #Configure HTTP headers for API request
-        headers = {'User-Agent': 'OuterinatorApp/1.0 (https://myapp.com)', 'Accept': 'application/json', 'Referer': 'https://myapp.com'}
-    
         try:
-            #Make API request to OpenStreetMap Nominatim service
-            response = requests.get(
-                "https://nominatim.openstreetmap.org/search", params={'q': query, 'format': 'json', 'addressdetails': 1}, headers=headers,timeout=10 )
-        
-            if response.status_code == 200:
-                data = response.json()
-                return data if data else None
-            else:
-                #Display API error status
-                self.map_error_label.configure(text=f"API returned status: {response.status_code}")
-                self.clear_error_after_delay()
-                return None
-            
-        except Exception as e:
-            #Display network or request error
-            self.map_error_label.configure(text=f"Search error: {e}")
-            self.clear_error_after_delay()
-            return None
+            #Queue the request on the shared Nominatim service, which handles rate limiting
+            future = self.geocoding.submit(query, nominatim_result_limit, geocode_priority_interactive)
+            if generation is not None:
+                with self.search_lock:
+                    if generation != self.search_generation:
+                        self.geocoding.cancel(future)
+                        return None, False
+                    self.search_future = future
+            try:
+                data = future.result()
+            finally:
+                with self.search_lock:
+                    if self.search_future is future:
+                        self.search_future = None
+
+            if data and gazetteer:
+                gazetteer.learn(query, data)
+            #Nominatim does not match by prefix, so its results never answer a longer query
+            return (data if data else None), False
+
+        except CancelledError:
+            #Superseded by newer typing
+            return None, False
         
     def clear_error_after_delay(self) -> None:
         #Clear error messages after a 3 second delay.
@@ -422,84 +680,2784 @@ class MapWidget(ctk.CTkFrame):
             #Center map on specified coordinates
             self.map_widget.set_position(lat, lon)
 
-            #Add marker at the location
-            self.map_widget.set_marker(lat, lon, text=query)
+            #Add marker at the location
+            self.map_widget.set_marker(lat, lon, text=query)
+
+            #Clear the search entry field
+            self.search_entry.delete(0, "end")
+        
+        except Exception as e:
+            #Handle map update errors
+            self.map_error_label.configure(text=f"Map update error: {e}")
+            self.clear_error_after_delay() 
+        
+    def on_search_success(self) -> None:
+        #Handle successful search completion.
+        self.search_btn.configure(state="normal", text="Search")
+        self.search_entry.delete(0, "end")
+        
+    def on_search_error(self, error_msg: str = "") -> None:
+        #Handle search failure and display error message.
+        
+        #Args: error_msg (str): Optional custom error message
+        self.search_btn.configure(state="normal", text="Search")
+        
+        #Use custom error message or default
+        error_text = error_msg if error_msg else "Search error: Location not found"
+        self.map_error_label.configure(text=error_text)
+    
+        #Clear error after delay
+        self.clear_error_after_delay()
+    
+        #Display error in results frame
+        if not hasattr(self, 'results_frame'):
+            self.results_frame = ctk.CTkFrame(self, fg_color="#1a1a1a", corner_radius=6)
+            self.results_frame.grid(row=2, column=0, sticky="ew", padx=5, pady=5)
+            
+            #Results frame grid configuration
+            self.results_frame.grid_rowconfigure(0, weight=1)
+            self.results_frame.grid_columnconfigure(0, weight=1)
+        
+            self.scrollable_frame = ctk.CTkScrollableFrame(self.results_frame, fg_color="#1a1a1a", height=150)
+            self.scrollable_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+    
+        #Clear previous content
+        for widget in self.scrollable_frame.winfo_children():
+            widget.destroy()
+        
+        #Display error message
+        error_label = ctk.CTkLabel(self.scrollable_frame, text="No locations found. Try a more specific search.", text_color="#ff6b6b", font=("Arial", 11))
+        error_label.pack(pady=10)
+        
+    def add_marker_at_center(self) -> None:
+        #Add a marker at the current center of the map view.
+        position = self.map_widget.get_position()
+        marker_text = f"Marker {len(self.map_widget.canvas_marker_list) + 1}"
+        self.map_widget.set_marker(position[0], position[1], text=marker_text)
+        
+    def clear_all_markers(self) -> None:
+        #Remove all markers from the map.
+        for marker in self.map_widget.canvas_marker_list:
+            marker.delete()
+    def __init__(self, parent, width: int = 400, height: int = 250):
+        #Initialise the map widget with specified dimensions.
+        
+       #Args: parent: The parent widget, width (int): Width of the map widget in pixels, height (int): Height of the map widget in pixels
+        super().__init__(parent)
+        
+        #Configure the map widget appearance
+        self.configure(fg_color="#2a2a2a", corner_radius=6, border_width=1, border_color="#000000")
+        
+        #Set up grid configuration for proper widget layout
+        self.grid_rowconfigure(0, weight=1) 
+        self.grid_rowconfigure(1, weight=0)  
+        self.grid_rowconfigure(2, weight=1)  
+        self.grid_columnconfigure(0, weight=1)  
+        
+        #Search-as-you-type state
+        self.search_after_id = None  #Pending debounced search
+        self.search_generation = 0  #Bumped by every new search, older results are dropped
+        self.search_prefix_cache = OrderedDict()  #Normalised query -> (results, complete)
+
+        #Initialise all map components
+        self.setup_geocoder()
+        self.setup_map(width, height)
+        self.setup_map_controls()
+
+class OverpassCache:
+    #Persistent SQLite cache for Overpass API results.
+    #Entries are keyed by a normalised (tile, tag set) signature, expire after a TTL
+    #and are evicted least recently used first once the cache grows past its size cap.
+    #Every operation opens its own connection so the cache is safe to share between
+    #background threads and separate app instances.
+
+    def __init__(self, db_path: str = overpass_cache_path, ttl_seconds: float = overpass_cache_ttl, max_bytes: int = overpass_cache_max_bytes):
+        #Initialise the cache and make sure its table exists.
+
+        #Args: db_path (str): SQLite file holding the cache, ttl_seconds (float): Default lifetime of an entry, max_bytes (int): Compressed size cap for all entries
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                #WAL lets other app instances keep reading while one writes
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS overpass_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        payload BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_overpass_cache_access ON overpass_cache (last_access)")
+                conn.commit()
+        except sqlite3.Error:
+            #Caching is an optimisation, planning still works without it
+            self.db_path = None
+
+    @staticmethod
+    def normalise_tags(tags: List[str]) -> str:
+        #Build a normalised signature for a list of tag patterns.
+        #Tag order, duplicates and whitespace do not change the signature.
+
+        #Args: tags (List[str]): OSM tag patterns such as "amenity=cafe|leisure=park"
+
+        #Returns: str: Sorted, de-duplicated "key=value" pairs joined by |
+        tag_set = set()
+        for tag_category in tags:
+            for tag_part in tag_category.split('|'):
+                if '=' in tag_part:
+                    key, value = tag_part.split('=', 1)
+                    tag_set.add(f"{key.strip()}={value.strip()}")
+        return "|".join(sorted(tag_set))
+
+    @staticmethod
+    def make_tile_key(zoom: int, x: int, y: int, tags: List[str]) -> str:
+        #Build the cache key for one fetch grid tile and a tag set.
+
+        #Args: zoom (int): Tile zoom level, x (int): Tile column, y (int): Tile row, tags (List[str]): OSM tag patterns
+
+        #Returns: str: Cache key
+        return f"tile:{zoom}/{x}/{y}|{OverpassCache.normalise_tags(tags)}"
+
+    def get(self, cache_key: str) -> Optional[List[Dict]]:
+        #Look up a single cached Overpass result.
+
+        #Args: cache_key (str): Cache key
+
+        #Returns: Optional[List[Dict]]: Cached elements, or None on a miss or expired entry
+        return self.get_many([cache_key]).get(cache_key)
+
+    def get_many(self, cache_keys: List[str], include_stale: bool = False) -> Dict[str, List[Dict]]:
+        #Look up several cached Overpass results in one transaction and mark them as recently used.
+
+        #Args: cache_keys (List[str]): Cache keys to look up, include_stale (bool): Also return entries that expired less than cache_stale_grace ago
+
+        #Returns: Dict[str, List[Dict]]: Elements for every key that was found and has not expired
+        if not self.db_path or not cache_keys:
+            return {}
+
+        now = time.time()
+        oldest_expiry = now - cache_stale_grace if include_stale else now
+        found = {}
+        try:
+            with self.lock, sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                #Stay well below SQLite's bound parameter limit
+                for start in range(0, len(cache_keys), 500):
+                    chunk = cache_keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor.execute(f"SELECT cache_key, payload FROM overpass_cache WHERE cache_key IN ({placeholders}) AND expires_at > ?", (*chunk, oldest_expiry))
+                    for cache_key, payload in cursor.fetchall():
+                        try:
+                            found[cache_key] = json.loads(zlib.decompress(payload).decode("utf-8"))
+                        except (zlib.error, ValueError):
+                            continue
+
+                    hit_keys = [key for key in chunk if key in found]
+                    if hit_keys:
+                        cursor.execute(f"UPDATE overpass_cache SET last_access = ? WHERE cache_key IN ({','.join('?' * len(hit_keys))})", (now, *hit_keys))
+                conn.commit()
+        except sqlite3.Error:
+            return found
+
+        return found
+
+    def put(self, cache_key: str, elements: List[Dict], ttl_seconds: Optional[float] = None) -> None:
+        #Store a single Overpass result.
+
+        #Args: cache_key (str): Cache key, elements (List[Dict]): Overpass elements to store, ttl_seconds (Optional[float]): Lifetime override for this entry
+        self.put_many({cache_key: elements}, ttl_seconds)
+
+    def put_many(self, entries: Dict[str, List[Dict]], ttl_seconds: Optional[float] = None) -> None:
+        #Store several Overpass results in one transaction and evict old entries if the size cap is exceeded.
+
+        #Args: entries (Dict[str, List[Dict]]): Elements to store by cache key, ttl_seconds (Optional[float]): Lifetime override for these entries
+        if not self.db_path or not entries:
+            return
+
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        rows = []
+        for cache_key, elements in entries.items():
+            payload = zlib.compress(json.dumps(elements, separators=(",", ":")).encode("utf-8"))
+            rows.append((cache_key, payload, len(payload), now, now + ttl, now))
+
+        try:
+            with self.lock, sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO overpass_cache (cache_key, payload, size, created_at, expires_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
+                self.evict(cursor, now)
+                conn.commit()
+        except sqlite3.Error:
+            return
+
+    def evict(self, cursor: sqlite3.Cursor, now: float) -> None:
+        #Drop entries expired for longer than cache_stale_grace, then the least recently used ones until under the size cap.
+
+        #Args: cursor (sqlite3.Cursor): Cursor inside the caller's transaction, now (float): Current timestamp
+        cursor.execute("DELETE FROM overpass_cache WHERE expires_at <= ?", (now - cache_stale_grace,))
+        cursor.execute("""
+            DELETE FROM overpass_cache WHERE cache_key IN (
+                SELECT cache_key FROM (
+                    SELECT cache_key, SUM(size) OVER (ORDER BY last_access DESC, cache_key) AS running_size
+                    FROM overpass_cache
+                ) WHERE running_size > ?
+            )
+        """, (self.max_bytes,))
+
+    def clear(self) -> None:
+        #Remove every cached Overpass result.
+        if not self.db_path:
+            return
+        try:
+            with self.lock, sqlite3.connect(self.db_path, timeout=10) as conn:
+                conn.execute("DELETE FROM overpass_cache")
+                conn.commit()
+        except sqlite3.Error:
+            return
+
+
+class GeocodeCache:
+    #Two-tier cache of forward geocoding results.
+    #A bounded in-memory LRU sits in front of a SQLite table that survives restarts.
+    #Names are normalised before lookup so "Auckland ", "auckland" and "AUCKLAND"
+    #share one entry. Places Nominatim could not find are stored with no coordinates
+    #and a short lifetime so a typo is not looked up again straight away, while a
+    #later fix on the server side is still picked up.
+
+    def __init__(self, db_path: str = overpass_cache_path, ttl_seconds: float = geocode_cache_ttl, negative_ttl_seconds: float = geocode_negative_ttl, memory_entries: int = geocode_memory_entries, max_rows: int = geocode_cache_max_rows):
+        #Initialise the cache and make sure its table exists.
+
+        #Args: db_path (str): SQLite file holding the cache, ttl_seconds (float): Lifetime of a found location, negative_ttl_seconds (float): Lifetime of a not-found answer, memory_entries (int): Size of the in-memory tier, max_rows (int): Row cap for the SQLite tier
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.memory_entries = memory_entries
+        self.max_rows = max_rows
+        self.memory = OrderedDict()  #Normalised name -> (coords or None, expires_at)
+        self.lock = threading.Lock()
+
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS geocode_cache (
+                        name_key TEXT PRIMARY KEY,
+                        lat REAL,
+                        lon REAL,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_access ON geocode_cache (last_access)")
+                conn.commit()
+        except sqlite3.Error:
+            #The in-memory tier still works without the database
+            self.db_path = None
+
+    @staticmethod
+    def normalise_name(location_name: str) -> str:
+        #Build the lookup key for a location name.
+        #Case, Unicode form, repeated whitespace and stray punctuation do not change the key.
+
+        #Args: location_name (str): Location as typed or displayed
+
+        #Returns: str: Normalised name
+        name = unicodedata.normalize("NFKC", location_name).casefold()
+        name = re.sub(r"\s*,\s*", ", ", name)
+        name = re.sub(r"\s+", " ", name)
+        return name.strip(" ,.;")
+
+    def remember(self, name_key: str, coords: Optional[Tuple[float, float]], expires_at: float) -> None:
+        #Put an entry in the in-memory tier, dropping the least recently used one when full.
+        with self.lock:
+            self.memory[name_key] = (coords, expires_at)
+            self.memory.move_to_end(name_key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, location_name: str, include_expired: bool = False) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        #Look up a location name.
+
+        #Args: location_name (str): Location as typed or displayed, include_expired (bool): Also accept answers that expired less than cache_stale_grace ago
+
+        #Returns: Tuple[bool, Optional[Tuple[float, float]]]: (hit, coordinates); a hit with None coordinates is a cached "not found"
+        name_key = self.normalise_name(location_name)
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(name_key)
+            if entry is not None:
+                if entry[1] > now or include_expired:
+                    self.memory.move_to_end(name_key)
+                    return True, entry[0]
+                del self.memory[name_key]
+
+        if not self.db_path:
+            return False, None
+
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT lat, lon, expires_at FROM geocode_cache WHERE name_key = ? AND expires_at > ?", (name_key, now - cache_stale_grace if include_expired else now))
+                row = cursor.fetchone()
+                if row is None:
+                    return False, None
+                cursor.execute("UPDATE geocode_cache SET last_access = ? WHERE name_key = ?", (now, name_key))
+                conn.commit()
+        except sqlite3.Error:
+            return False, None
+
+        coords = (row[0], row[1]) if row[0] is not None else None
+        self.remember(name_key, coords, row[2])
+        return True, coords
+
+    def put(self, location_name: str, coords: Optional[Tuple[float, float]]) -> None:
+        #Store a geocoding answer in both tiers.
+
+        #Args: location_name (str): Location as typed or displayed, coords (Optional[Tuple[float, float]]): Coordinates, or None if the place was not found
+        name_key = self.normalise_name(location_name)
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if coords is not None else self.negative_ttl_seconds)
+        self.remember(name_key, coords, expires_at)
+
+        if not self.db_path:
+            return
+        lat, lon = coords if coords is not None else (None, None)
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT OR REPLACE INTO geocode_cache (name_key, lat, lon, created_at, expires_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (name_key, lat, lon, now, expires_at, now))
+                cursor.execute("DELETE FROM geocode_cache WHERE expires_at <= ?", (now - cache_stale_grace,))
+                cursor.execute("DELETE FROM geocode_cache WHERE name_key IN (SELECT name_key FROM geocode_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+                conn.commit()
+        except sqlite3.Error:
+            return
+
+
+class PooledSession(requests.Session):
+    #requests.Session with a sized keep-alive connection pool, compression and default timeouts.
+    #One session is shared per outbound service (see PooledSession.shared), so repeat calls
+    #reuse an open TCP/TLS connection instead of paying a new handshake each time.
+
+    sessions = {}
+    sessions_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, service: str) -> 'PooledSession':
+        #Args: service (str): 'nominatim', 'overpass' or 'tiles'
+
+        #Returns: PooledSession: The process-wide session for that service
+        with cls.sessions_lock:
+            if service not in cls.sessions:
+                cls.sessions[service] = cls(service)
+            return cls.sessions[service]
+
+    @classmethod
+    def all_stats(cls) -> Dict[str, Dict[str, int]]:
+        #Returns: Dict[str, Dict[str, int]]: connection_stats() for every session created so far
+        with cls.sessions_lock:
+            sessions = dict(cls.sessions)
+        return {service: session.connection_stats() for service, session in sessions.items()}
+
+    def __init__(self, service: str):
+        #Args: service (str): Service name used to look up pool size, blocking and timeouts
+        super().__init__()
+        self.service = service
+        self.default_timeout = http_timeouts.get(service, (5, 30))
+        self.adapter = HTTPAdapter(pool_connections=2, pool_maxsize=http_pool_sizes.get(service, 4), pool_block=http_pool_block.get(service, False))
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+        self.headers.update({'User-Agent': http_user_agent, 'Accept-Encoding': http_accept_encoding})
+
+    def request(self, method, url, **kwargs):
+        #Every request gets the service's timeout unless the caller sets one
+        kwargs.setdefault('timeout', self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+    def connection_stats(self) -> Dict[str, int]:
+        #Count requests and the connections opened for them, from urllib3's pools.
+
+        #Returns: Dict[str, int]: requests, connections opened, and requests that reused a connection
+        pools = self.adapter.poolmanager.pools
+        total_requests = 0
+        total_connections = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                total_requests += pool.num_requests
+                total_connections += pool.num_connections
+        return {'requests': total_requests, 'connections': total_connections, 'reused': max(0, total_requests - total_connections)}
+
+
+class PooledTileRequests:
+    #Stand-in for the requests module inside tkintermapview, which calls requests.get
+    #directly for every map tile. Tiles are fetched whole through the shared 'tiles'
+    #session so each connection goes back to the pool instead of being held by a
+    #half-read raw stream. PNG tiles are already compressed, so no encoding is asked for.
+
+    exceptions = requests.exceptions
+
+    def __init__(self, session: PooledSession):
+        #Args: session (PooledSession): Session tiles are fetched through
+        self.session = session
+
+    def get(self, url: str, stream: bool = False, headers: Optional[Dict] = None, **kwargs):
+        response = self.session.get(url, headers={'Accept-Encoding': 'identity'}, **kwargs)
+        response.raw = io.BytesIO(response.content)
+        return response
+
+
+class RetryableError(RuntimeError):
+    #A temporary failure worth trying again, such as a 429 or 504 response.
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        #Args: message (str): Error description, retry_after (Optional[float]): Seconds the server asked us to wait, if it said
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ServiceUnavailable(RuntimeError):
+    #An outside service is overloaded or switched off by its circuit breaker.
+    #Callers fall back to cached data or tell the user to try again later,
+    #rather than reporting an empty answer.
+    pass
+
+
+class CircuitBreaker:
+    #Per-endpoint circuit breaker.
+    #After circuit_failure_threshold temporary failures in a row the circuit opens and
+    #requests to the endpoint fail straight away for circuit_reset_seconds, or for as
+    #long as a Retry-After asked if that is longer. A single trial request is then let
+    #through: if it succeeds the circuit closes, if it fails the circuit opens again.
+    #A shorter Retry-After leaves the circuit closed but still holds requests back
+    #until the time the server asked for.
+    #Use CircuitBreaker.for_endpoint() so every caller of an endpoint shares its state.
+
+    breakers = {}
+    breakers_lock = threading.Lock()
+
+    @classmethod
+    def for_endpoint(cls, url: str) -> 'CircuitBreaker':
+        #Args: url (str): Endpoint URL
+
+        #Returns: CircuitBreaker: The process-wide breaker for the endpoint, created on first use
+        with cls.breakers_lock:
+            if url not in cls.breakers:
+                cls.breakers[url] = cls(urlsplit(url).netloc or url)
+            return cls.breakers[url]
+
+    def __init__(self, name: str):
+        #Args: name (str): Name shown in error messages
+        self.name = name
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.open_until = None  #time.monotonic() the circuit may be tried again, None while closed
+        self.retry_at = None  #time.monotonic() a Retry-After asked us to wait until, None if none is pending
+        self.trial_running = False
+
+    def available(self) -> bool:
+        #Returns: bool: Whether a request could be sent now, without claiming the half-open trial
+        with self.lock:
+            now = time.monotonic()
+            if self.retry_at is not None and now < self.retry_at:
+                return False
+            return self.open_until is None or (now >= self.open_until and not self.trial_running)
+
+    def allow(self) -> bool:
+        #Ask to send a request. While half-open only one caller at a time is let through.
+
+        #Returns: bool: Whether the request may be sent
+        with self.lock:
+            if self.retry_at is not None and time.monotonic() < self.retry_at:
+                return False
+            if self.open_until is None:
+                return True
+            if time.monotonic() < self.open_until or self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def retry_in(self) -> float:
+        #Returns: float: Seconds until the endpoint will be tried again, 0 when it is not switched off or held back
+        with self.lock:
+            retry_at = max(self.open_until or 0.0, self.retry_at or 0.0)
+            return max(0.0, retry_at - time.monotonic()) if retry_at else 0.0
+
+    def record_success(self) -> None:
+        #Close the circuit after a good answer.
+        with self.lock:
+            self.failures = 0
+            self.open_until = None
+            self.retry_at = None
+            self.trial_running = False
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        #Count a temporary failure, opening the circuit once there have been too many.
+
+        #Args: retry_after (Optional[float]): Seconds the server asked us to wait, if it said
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if retry_after:
+                self.retry_at = time.monotonic() + retry_after
+            #A failed trial, a run of failures or a long Retry-After all switch the endpoint off
+            if self.open_until is not None or self.failures >= circuit_failure_threshold or (retry_after or 0) > retry_max_wait:
+                self.open_until = time.monotonic() + max(circuit_reset_seconds, retry_after or 0)
+
+    def release(self) -> None:
+        #End a request that says nothing about the endpoint's health, such as a cancelled one.
+        with self.lock:
+            self.trial_running = False
+
+
+class RetryPolicy:
+    #Retries temporary failures with capped exponential backoff and full jitter,
+    #so clients that failed together do not all come back at the same moment.
+    #A Retry-After from the server is honoured as the shortest wait, and one longer
+    #than retry_max_wait is given up on straight away.
+
+    transient_errors = (RetryableError, requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError)
+
+    def __init__(self, attempts: int = retry_attempts, base_delay: float = retry_base_delay, max_delay: float = retry_max_delay, max_wait: float = retry_max_wait):
+        #Args: attempts (int): Tries including the first, base_delay (float): Backoff before the first retry, max_delay (float): Cap on one backoff, max_wait (float): Longest Retry-After worth waiting for
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+
+    @staticmethod
+    def retry_after(response: requests.Response) -> Optional[float]:
+        #Read a Retry-After header, given either in seconds or as an HTTP date.
+
+        #Returns: Optional[float]: Seconds to wait, or None if the header is missing or unreadable
+        value = response.headers.get('Retry-After', '').strip()
+        if not value:
+            return None
+        if value.isdigit():
+            return float(value)
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, calendar.timegm(retry_at.utctimetuple()) - time.time())
+
+    @classmethod
+    def check(cls, response: requests.Response) -> None:
+        #Raise RetryableError if a response is a temporary overload.
+        if response.status_code in retryable_statuses:
+            raise RetryableError(f"API returned status: {response.status_code}", cls.retry_after(response))
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        #Args: attempt (int): Zero-based number of the attempt that just failed, retry_after (Optional[float]): Seconds the server asked us to wait
+
+        #Returns: float: Seconds to wait before the next attempt
+        backoff = random.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, retry_after or 0.0)
+
+    def call(self, send: Callable[[], Any], breaker: Optional[CircuitBreaker] = None) -> Any:
+        #Send a request, retrying temporary failures.
+
+        #Args: send (Callable): Sends the request and returns its result, raising RetryableError or a requests timeout/connection error when it is worth trying again, breaker (Optional[CircuitBreaker]): Breaker of the endpoint being called
+
+        #Returns: Any: The result of the first successful attempt
+        name = breaker.name if breaker is not None else "The service"
+        for attempt in range(self.attempts):
+            if breaker is not None and not breaker.allow():
+                raise ServiceUnavailable(f"{name} is not responding, try again in {math.ceil(breaker.retry_in())} s")
+            try:
+                result = send()
+            except self.transient_errors as error:
+                retry_after = getattr(error, 'retry_after', None)
+                if breaker is not None:
+                    breaker.record_failure(retry_after)
+                wait_seconds = self.delay(attempt, retry_after)
+                if attempt + 1 >= self.attempts or wait_seconds > self.max_wait:
+                    raise ServiceUnavailable(f"{name} is busy, try again shortly ({error})") from error
+                time.sleep(wait_seconds)
+                continue
+            except Exception:
+                if breaker is not None:
+                    breaker.release()
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+class TokenBucket:
+    #Token-bucket rate limiter.
+    #Callers reserve a token and are told how long to wait for it, so requests are
+    #spaced exactly at the configured rate and an idle limiter adds no delay at all.
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        #Args: rate (float): Tokens added per second, capacity (float): Most tokens that can build up while idle
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        #Take a token, going into debt if none is available.
+
+        #Returns: float: Seconds to wait before using the token
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self) -> None:
+        #Block until a token is available.
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def refund(self) -> None:
+        #Give back a token that was taken but not used.
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def penalise(self, seconds: float) -> None:
+        #Hold back the next token, for example after the server asks us to slow down.
+
+        #Args: seconds (float): Extra delay before the next token
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class GeocodingService:
+    #The single route to Nominatim for the whole process.
+    #Requests go through a priority queue served by one worker thread, paced by a
+    #token bucket at Nominatim's one-request-per-second policy. Identical pending
+    #queries share one request, and queries nobody is waiting on any more are
+    #cancelled before they are sent. Use GeocodingService.shared() rather than
+    #constructing one, so map searches and planning never compete for the limit.
+
+    shared_instance = None
+    shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> 'GeocodingService':
+        #Returns: GeocodingService: The process-wide service, created on first use
+        with cls.shared_lock:
+            if cls.shared_instance is None:
+                cls.shared_instance = cls()
+            return cls.shared_instance
+
+    def __init__(self, min_interval: float = nominatim_min_interval):
+        #Args: min_interval (float): Seconds between requests
+        self.limiter = TokenBucket(1.0 / min_interval)
+        self.session = PooledSession.shared('nominatim')
+        self.retry = RetryPolicy()
+        self.breaker = CircuitBreaker.for_endpoint(nominatim_search_url)
+        self.queue = []  #Heap of (priority, sequence, key)
+        self.pending = {}  #key -> [future, params, waiters]
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def submit(self, query: str, limit: int = nominatim_result_limit, priority: int = geocode_priority_interactive) -> Future:
+        #Queue a search, joining an identical one that is already waiting or running.
+
+        #Args: query (str): Search text, limit (int): Most results wanted, priority (int): Lower numbers are sent first
+
+        #Returns: Future: Resolves to the list of Nominatim results
+        key = (Gazetteer.normalise(query), limit)
+        with self.condition:
+            entry = self.pending.get(key)
+            if entry is not None and not entry[0].cancelled():
+                entry[2] += 1
+                #A more urgent caller moves the shared request forward
+                heapq.heappush(self.queue, (priority, next(self.sequence), key))
+                self.condition.notify()
+                return entry[0]
+
+            future = Future()
+            self.pending[key] = [future, {'q': query, 'format': 'json', 'addressdetails': 1, 'limit': limit}, 1]
+            heapq.heappush(self.queue, (priority, next(self.sequence), key))
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, daemon=True)
+                self.worker.start()
+            self.condition.notify()
+            return future
+
+    def cancel(self, future: Future) -> None:
+        #Stop waiting for a search; it is dropped if no other caller still wants it.
+
+        #Args: future (Future): Future returned by submit
+        with self.condition:
+            for key, entry in list(self.pending.items()):
+                if entry[0] is future:
+                    entry[2] -= 1
+                    if entry[2] <= 0 and future.cancel():
+                        del self.pending[key]
+                    return
+
+    def search(self, query: str, limit: int = nominatim_result_limit, priority: int = geocode_priority_interactive, timeout: Optional[float] = None) -> List[Dict]:
+        #Search and wait for the answer.
+
+        #Args: query (str): Search text, limit (int): Most results wanted, priority (int): Lower numbers are sent first, timeout (Optional[float]): Seconds to wait
+
+        #Returns: List[Dict]: Nominatim results, empty if nothing matched
+        return self.submit(query, limit, priority).result(timeout)
+
+    def run(self) -> None:
+        #Worker loop: send queued searches one at a time, most urgent first.
+        while True:
+            with self.condition:
+                while True:
+                    while self.queue and self.queue[0][2] not in self.pending:
+                        heapq.heappop(self.queue)
+                    if self.queue:
+                        break
+                    if not self.condition.wait(timeout=60):
+                        self.worker = None
+                        return
+                _, _, key = heapq.heappop(self.queue)
+                future, params, _ = self.pending[key]
+                #A search cancelled while queued never takes a token
+                if future.cancelled():
+                    self.forget(key, future)
+                    continue
+
+            #It can still be cancelled while waiting for the rate limit, then the token is returned
+            self.limiter.acquire()
+            with self.condition:
+                if not future.set_running_or_notify_cancel():
+                    self.forget(key, future)
+                    self.limiter.refund()
+                    continue
+
+            try:
+                result = self.fetch(params)
+            except Exception as error:
+                result = error
+            with self.condition:
+                self.forget(key, future)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def forget(self, key: Tuple[str, int], future: Future) -> None:
+        #Drop a finished search, unless a newer search for the same query has replaced it.
+        entry = self.pending.get(key)
+        if entry is not None and entry[0] is future:
+            del self.pending[key]
+
+    def fetch(self, params: Dict) -> List[Dict]:
+        #Send one search request, retrying temporary failures through the circuit breaker.
+        #The caller has already waited for the rate limit before the first attempt.
+
+        #Args: params (Dict): Query string parameters
+
+        #Returns: List[Dict]: Nominatim results
+        attempts = itertools.count()
+
+        def send() -> List[Dict]:
+            #Retries wait for the rate limit like any other request
+            if next(attempts):
+                self.limiter.acquire()
+            response = self.session.get(nominatim_search_url, params=params, headers={'Accept': 'application/json'})
+            if response.status_code in (403, 429):
+                retry_after = RetryPolicy.retry_after(response)
+                self.limiter.penalise(retry_after if retry_after is not None else nominatim_backoff_seconds)
+            RetryPolicy.check(response)
+            if response.status_code != 200:
+                raise RuntimeError(f"API returned status: {response.status_code}")
+            return response.json() or []
+
+        return self.retry.call(send, self.breaker)
+
+
+class Gazetteer:
+    #Offline place-name index used before Nominatim for map search and geocoding.
+    #Places are stored in SQLite with an FTS5 full-text index (with prefix indexes so
+    #partial words match quickly), falling back to an indexed LIKE-style range scan
+    #when FTS5 is unavailable. Places come from three sources:
+    #- imported lists (CSV, GeoJSON or a GeoNames dump), matched for any query
+    #- places from OSM extracts, only matched by their exact name while online, so the
+    #  cafes of a suburb never hide the suburb or its streets from Nominatim
+    #- Nominatim results learned from earlier searches, only served again for the same
+    #  query so a past search for one museum never hides the city it was in
+
+    columns = "places.name, places.display_name, places.lat, places.lon, places.place_class, places.place_type, places.importance"  #Read for every result, in to_result order
+
+    def __init__(self, db_path: str = gazetteer_path, seed_files: Tuple[str, ...] = gazetteer_seed_files):
+        #Initialise the gazetteer, creating its tables and importing seed files on first run.
+
+        #Args: db_path (str): SQLite file holding the gazetteer, seed_files (Tuple[str, ...]): Place lists imported when the gazetteer is empty
+        self.db_path = db_path
+        self.has_fts = False
+        self.lock = threading.Lock()
+
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS places (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        place_key TEXT UNIQUE NOT NULL,
+                        name TEXT NOT NULL,
+                        name_key TEXT NOT NULL,
+                        display_name TEXT NOT NULL,
+                        lat REAL NOT NULL,
+                        lon REAL NOT NULL,
+                        place_class TEXT,
+                        place_type TEXT,
+                        importance REAL DEFAULT 0,
+                        source TEXT NOT NULL
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_places_name_key ON places (name_key)")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS learned_queries (
+                        query_key TEXT PRIMARY KEY,
+                        place_keys TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+
+                try:
+                    cursor.execute("""
+                        CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5(
+                            display_name, content='places', content_rowid='id',
+                            tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+                        )
+                    """)
+                    #Keep the full-text index in step with the places table
+                    cursor.execute("CREATE TRIGGER IF NOT EXISTS places_ai AFTER INSERT ON places BEGIN INSERT INTO places_fts (rowid, display_name) VALUES (new.id, new.display_name); END")
+                    cursor.execute("CREATE TRIGGER IF NOT EXISTS places_ad AFTER DELETE ON places BEGIN INSERT INTO places_fts (places_fts, rowid, display_name) VALUES ('delete', old.id, old.display_name); END")
+                    cursor.execute("CREATE TRIGGER IF NOT EXISTS places_au AFTER UPDATE ON places BEGIN INSERT INTO places_fts (places_fts, rowid, display_name) VALUES ('delete', old.id, old.display_name); INSERT INTO places_fts (rowid, display_name) VALUES (new.id, new.display_name); END")
+                    self.has_fts = True
+                except sqlite3.OperationalError:
+                    #SQLite built without FTS5, searches use the name_key index instead
+                    self.has_fts = False
+
+                #Extract places stored by earlier versions as imported ones get their own source
+                cursor.execute("UPDATE places SET source = 'extract' WHERE place_key >= 'osm:' AND place_key < 'osm;' AND source = 'import'")
+                cursor.execute("SELECT COUNT(*) FROM places WHERE source = 'import'")
+                imported = cursor.fetchone()[0]
+                conn.commit()
+        except sqlite3.Error:
+            self.db_path = None
+            return
+
+        if not imported:
+            for seed_file in seed_files:
+                if path.exists(seed_file):
+                    self.import_file(seed_file)
+
+    @staticmethod
+    def normalise(text: str) -> str:
+        #Args: text (str): Place name or query
+
+        #Returns: str: Lowercased name with accents and punctuation removed, used for matching
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+        return " ".join(re.findall(r"\w+", text))
+
+    @staticmethod
+    def to_result(row: Tuple) -> Dict:
+        #Shape a places row like a Nominatim search result.
+        name, display_name, lat, lon, place_class, place_type, importance = row
+        return {'name': name, 'display_name': display_name, 'lat': str(lat), 'lon': str(lon), 'class': place_class, 'type': place_type, 'importance': importance}
+
+    def add_places(self, places: List[Dict], source: str) -> int:
+        #Insert or update places.
+
+        #Args: places (List[Dict]): Dicts with name, lat and lon, and optionally display_name, class, type, importance and place_key, source (str): Where the places came from
+
+        #Returns: int: Places stored
+        if not self.db_path:
+            return 0
+
+        rows = []
+        for place in places:
+            try:
+                lat, lon = float(place['lat']), float(place['lon'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            display_name = place.get('display_name') or place.get('name')
+            if not display_name:
+                continue
+            name = place.get('name') or display_name.split(',')[0].strip()
+            place_key = place.get('place_key') or f"{self.normalise(display_name)}@{lat:.4f},{lon:.4f}"
+            rows.append((place_key, name, self.normalise(name), display_name, lat, lon, place.get('class'), place.get('type'), float(place.get('importance') or 0), source))
+
+        if not rows:
+            return 0
+        try:
+            with self.lock, sqlite3.connect(self.db_path, timeout=10) as conn:
+                conn.executemany("""
+                    INSERT INTO places (place_key, name, name_key, display_name, lat, lon, place_class, place_type, importance, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (place_key) DO UPDATE SET
+                        name = excluded.name, name_key = excluded.name_key, display_name = excluded.display_name,
+                        lat = excluded.lat, lon = excluded.lon, place_class = excluded.place_class,
+                        place_type = excluded.place_type, importance = excluded.importance
+                """, rows)
+                conn.commit()
+        except sqlite3.Error:
+            return 0
+        return len(rows)
+
+    def learn(self, query: str, results: List[Dict]) -> None:
+        #Remember the Nominatim results for a query so it can be answered offline next time.
+
+        #Args: query (str): Search text, results (List[Dict]): Nominatim search results
+        if not self.db_path or not results:
+            return
+
+        places = []
+        for result in results:
+            place = dict(result)
+            if result.get('osm_type') and result.get('osm_id'):
+                place['place_key'] = f"osm:{result['osm_type']}/{result['osm_id']}"
+            place['name'] = result.get('name') or result.get('display_name', '').split(',')[0].strip()
+            places.append(place)
+        if not self.add_places(places, 'nominatim'):
+            return
+
+        place_keys = [place.get('place_key') or f"{self.normalise(place.get('display_name') or place['name'])}@{float(place['lat']):.4f},{float(place['lon']):.4f}" for place in places]
+        try:
+            with self.lock, sqlite3.connect(self.db_path, timeout=10) as conn:
+                conn.execute("INSERT OR REPLACE INTO learned_queries (query_key, place_keys, created_at) VALUES (?, ?, ?)", (self.normalise(query), json.dumps(place_keys), time.time()))
+                conn.commit()
+        except sqlite3.Error:
+            return
+
+    def search(self, query: str, limit: int = gazetteer_search_limit) -> List[Dict]:
+        #Search local places: the answers Nominatim gave if the query was searched online
+        #before, otherwise every place whose name matches the start of each query word.
+
+        #Args: query (str): Search text, limit (int): Most results returned
+
+        #Returns: List[Dict]: Nominatim-shaped results, best first, empty on a miss
+        return self.search_learned(query, limit) or self.search_names(query, limit)
+
+    def search_learned(self, query: str, limit: int = gazetteer_search_limit) -> List[Dict]:
+        #Args: query (str): Search text, limit (int): Most results returned
+
+        #Returns: List[Dict]: The Nominatim results learned for exactly this query, empty if it was never searched online
+        query_key = self.normalise(query)
+        if not self.db_path or not query_key:
+            return []
+
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT place_keys FROM learned_queries WHERE query_key = ?", (query_key,))
+                learned = cursor.fetchone()
+                if not learned:
+                    return []
+                place_keys = json.loads(learned[0])[:limit]
+                cursor.execute(f"SELECT place_key, {self.columns} FROM places WHERE place_key IN ({','.join('?' * len(place_keys))})", place_keys)
+                by_key = {row[0]: row[1:] for row in cursor.fetchall()}
+                return [self.to_result(by_key[key]) for key in place_keys if key in by_key]
+        except (sqlite3.Error, ValueError):
+            return []
+
+    def search_names(self, query: str, limit: int = gazetteer_search_limit) -> List[Dict]:
+        #Search local places by name, matching the start of each word in the query.
+        #Fewer than limit results means every matching place was returned.
+
+        #Args: query (str): Search text, limit (int): Most results returned
+
+        #Returns: List[Dict]: Nominatim-shaped results, best first, empty on a miss
+        query_key = self.normalise(query)
+        if not self.db_path or not query_key:
+            return []
+
+        columns = self.columns
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+
+                #Extract places answer only a search for their exact name unless offline
+                sources = "(places.source = 'import' OR (places.source = 'extract' AND (? OR places.name_key = ?)))"
+                source_params = (place_source == 'offline', query_key)
+                if self.has_fts:
+                    #Every word must match, the last one as a prefix of a longer word
+                    words = query_key.split()
+                    match = " ".join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+                    cursor.execute(f"""
+                        SELECT {columns} FROM places_fts JOIN places ON places.id = places_fts.rowid
+                        WHERE places_fts MATCH ? AND {sources}
+                        ORDER BY places.name_key = ? DESC, bm25(places_fts) - places.importance LIMIT ?
+                    """, (match.strip(), *source_params, query_key, limit))
+                else:
+                    #Range scan on the name index: every name starting with the query
+                    cursor.execute(f"""
+                        SELECT {columns} FROM places
+                        WHERE name_key >= ? AND name_key < ? AND {sources}
+                        ORDER BY name_key = ? DESC, importance DESC LIMIT ?
+                    """, (query_key, query_key + "\uffff", *source_params, query_key, limit))
+                return [self.to_result(row) for row in cursor.fetchall()]
+        except (sqlite3.Error, ValueError):
+            return []
+
+    def geocode(self, location_name: str) -> Optional[Tuple[float, float]]:
+        #Forward-geocode a place name from local data only.
+
+        #Args: location_name (str): Place name
+
+        #Returns: Optional[Tuple[float, float]]: Coordinates of the best match, or None on a miss
+        results = self.search(location_name, 1)
+        if not results:
+            return None
+        return float(results[0]['lat']), float(results[0]['lon'])
+
+    def import_file(self, file_path: str) -> int:
+        #Import a place list: CSV with name,lat,lon columns (plus optional display_name,
+        #class, type, importance), GeoJSON point features with a name property, or a
+        #tab-separated GeoNames dump such as cities15000.txt.
+
+        #Args: file_path (str): File to import
+
+        #Returns: int: Places imported
+        places = []
+        try:
+            if file_path.endswith((".geojson", ".json")):
+                with open(file_path, encoding="utf-8") as handle:
+                    data = json.load(handle)
+                for feature in data.get('features', []):
+                    geometry = feature.get('geometry') or {}
+                    properties = feature.get('properties') or {}
+                    if geometry.get('type') != 'Point' or not properties.get('name'):
+                        continue
+                    lon, lat = geometry['coordinates'][:2]
+                    places.append({**properties, 'lat': lat, 'lon': lon})
+            elif file_path.endswith(".txt"):
+                #GeoNames columns: id, name, ascii name, alternate names, lat, lon, class, code, country, ..., population at 14
+                with open(file_path, encoding="utf-8") as handle:
+                    for line in handle:
+                        fields = line.rstrip("\n").split("\t")
+                        if len(fields) < 15:
+                            continue
+                        places.append({
+                            'place_key': f"geonames:{fields[0]}",
+                            'name': fields[1],
+                            'display_name': f"{fields[1]}, {fields[8]}",
+                            'lat': fields[4],
+                            'lon': fields[5],
+                            'class': 'place',
+                            'type': fields[7].lower(),
+                            'importance': math.log10(int(fields[14] or 0) + 1) / 10
+                        })
+            else:
+                with open(file_path, newline="", encoding="utf-8") as handle:
+                    places = list(csv.DictReader(handle))
+        except (OSError, ValueError, KeyError, IndexError):
+            return 0
+
+        return self.add_places(places, 'import')
+
+
+def select_place_tags(tags: Dict[str, str], wanted_tags: Dict[str, set]) -> Optional[Dict[str, str]]:
+    #Check an OSM element against the wanted tags, as the Overpass queries would.
+
+    #Args: tags (Dict[str, str]): The element's tags, wanted_tags (Dict[str, set]): Wanted values for each key
+
+    #Returns: Optional[Dict[str, str]]: The tags the planner keeps, or None if the element is unnamed or not wanted
+    if not tags.get('name') or not any(tags.get(key) in values for key, values in wanted_tags.items()):
+        return None
+    return {key: value for key, value in tags.items() if key in overpass_kept_tags}
+
+
+def find_osm_xml_element(handle, offset: int) -> Optional[int]:
+    #Find where the first top-level element at or after offset starts in an .osm XML file.
+    #OSM tools write one element start per line, so a slice boundary can be moved to a line start.
+    handle.seek(offset)
+    if offset:
+        handle.readline()  #Skip the rest of a partial line
+    while True:
+        position = handle.tell()
+        line = handle.readline()
+        if not line:
+            return None
+        if line.lstrip().startswith((b"<node", b"<way", b"<relation", b"<bounds")):
+            return position
+
+
+def osm_xml_slices(file_path: str, parts: int) -> List[Tuple[int, int]]:
+    #Split the elements of an .osm XML file into byte ranges that can be parsed independently.
+
+    #Args: file_path (str): Extract to split, parts (int): Slices wanted
+
+    #Returns: List[Tuple[int, int]]: (start, end) offsets, each starting at an element
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as handle:
+        first = find_osm_xml_element(handle, 0)
+        if first is None:
+            return []
+        #Stop before the closing </osm> so every slice holds whole elements only
+        handle.seek(max(0, size - 4096))
+        tail = handle.read()
+        closing = tail.rfind(b"</osm>")
+        last = size - len(tail) + closing if closing >= 0 else size
+
+        offsets = [first]
+        for part in range(1, parts):
+            offset = find_osm_xml_element(handle, first + (last - first) * part // parts)
+            if offset is not None and offsets[-1] < offset < last:
+                offsets.append(offset)
+        offsets.append(last)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def iter_osm_xml_slice(file_path: str, start: int, end: int) -> Iterator[ElementTree.Element]:
+    #Yield the top-level elements of one slice of an .osm XML file, freeing each once handled.
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    parser.feed(b"<osm>")
+    root = None
+    depth = 0
+
+    def drain() -> Iterator[ElementTree.Element]:
+        nonlocal root, depth
+        for event, element in parser.read_events():
+            if event == "start":
+                depth += 1
+                if root is None:
+                    root = element
+                continue
+            depth -= 1
+            if depth == 1:
+                yield element
+                root.clear()
+
+    with open(file_path, "rb") as handle:
+        handle.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = handle.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            parser.feed(chunk)
+            yield from drain()
+    parser.feed(b"</osm>")
+    yield from drain()
+
+
+def scan_osm_xml_slice(file_path: str, start: int, end: int, wanted_tags: Dict[str, set]) -> Tuple[List[Dict], List[Tuple[int, Dict, List[int]]], Optional[Tuple[float, float, float, float]]]:
+    #Process pool entry point: find the wanted places in one slice of an .osm XML file.
+
+    #Returns: Tuple: (Overpass-style node elements, [(way id, kept tags, node ids)] for wanted ways, the file's <bounds> if in this slice)
+    places, ways, bounds = [], [], None
+    for element in iter_osm_xml_slice(file_path, start, end):
+        if element.tag == "bounds":
+            bounds = tuple(float(element.get(name)) for name in ("minlat", "minlon", "maxlat", "maxlon"))
+            continue
+        if element.tag not in ("node", "way"):
+            continue
+        tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+        kept = select_place_tags(tags, wanted_tags) if tags else None
+        if kept is None:
+            continue
+
+        if element.tag == "node":
+            places.append({'type': 'node', 'id': int(element.get('id')), 'lat': float(element.get('lat')), 'lon': float(element.get('lon')), 'tags': kept})
+            continue
+        center = element.find('center')
+        if center is not None:
+            #Overpass "out center" exports already carry the centre
+            places.append({'type': 'way', 'id': int(element.get('id')), 'center': {'lat': float(center.get('lat')), 'lon': float(center.get('lon'))}, 'tags': kept})
+        else:
+            ways.append((int(element.get('id')), kept, [int(node.get('ref')) for node in element.iter('nd')]))
+    return places, ways, bounds
+
+
+def locate_osm_xml_nodes(file_path: str, start: int, end: int, node_ids: set) -> Dict[int, Tuple[float, float]]:
+    #Process pool entry point: collect the coordinates of the given nodes from one slice of an .osm XML file.
+    locations = {}
+    for element in iter_osm_xml_slice(file_path, start, end):
+        if element.tag == "node":
+            node_id = int(element.get('id'))
+            if node_id in node_ids:
+                locations[node_id] = (float(element.get('lat')), float(element.get('lon')))
+    return locations
+
+
+class LocalPlaceStore:
+    #Local POI store for places from OpenStreetMap extracts and Overpass downloads,
+    #used to plan without a network.
+    #Extracts (.osm.pbf, .osm XML or GeoJSON) are filtered to named places matching the
+    #activity_osm_tags categories and stored in Overpass element form, so OutingPlanner
+    #can answer query_osm_places from here and nothing after it knows the difference.
+    #The area each extract covers is recorded to decide which searches it can answer.
+    #Places are indexed twice: an R*Tree over their positions and an inverted index from
+    #each (key, value) tag to the places carrying it, so a bbox search for every selected
+    #category is one indexed query. Without the R*Tree module a (lat, lon) index is used.
+
+    def __init__(self, db_path: str = local_places_path):
+        #Initialise the store and make sure its tables exist.
+
+        #Args: db_path (str): SQLite file holding the imported places
+        self.db_path = db_path
+        self.has_rtree = False
+        self.tag_ids = {}  #(key, value) -> tag_id, filled as tags are seen
+        self.lock = threading.Lock()
+
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                #Row ids are derived from the OSM type and id, see poi_id
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS pois (
+                        id INTEGER PRIMARY KEY,
+                        osm_type TEXT NOT NULL,
+                        osm_id INTEGER NOT NULL,
+                        lat REAL NOT NULL,
+                        lon REAL NOT NULL,
+                        tags TEXT NOT NULL
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS tag_values (
+                        tag_id INTEGER PRIMARY KEY,
+                        key TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        UNIQUE (key, value)
+                    )
+                """)
+                #Inverted index, clustered by tag so each tag's places are read together
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS poi_tags (
+                        tag_id INTEGER NOT NULL,
+                        poi_id INTEGER NOT NULL,
+                        PRIMARY KEY (tag_id, poi_id)
+                    ) WITHOUT ROWID
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_poi_tags_poi ON poi_tags (poi_id)")
+
+                try:
+                    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pois_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+                    self.has_rtree = True
+                except sqlite3.OperationalError:
+                    #SQLite built without R*Tree, bbox searches use a plain index instead
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_pois_position ON pois (lat, lon)")
+
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS osm_extracts (
+                        file_path TEXT PRIMARY KEY,
+                        imported_at REAL NOT NULL,
+                        places INTEGER NOT NULL,
+                        min_lat REAL NOT NULL,
+                        min_lon REAL NOT NULL,
+                        max_lat REAL NOT NULL,
+                        max_lon REAL NOT NULL
+                    )
+                """)
+                cursor.execute("SELECT tag_id, key, value FROM tag_values")
+                self.tag_ids = {(key, value): tag_id for tag_id, key, value in cursor.fetchall()}
+
+                #Places stored by the unindexed table of earlier versions move across once
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'osm_places'")
+                legacy = cursor.fetchone() is not None
+                conn.commit()
+        except sqlite3.Error:
+            self.db_path = None
+            return
+
+        if legacy:
+            self.migrate_legacy_places()
+
+    @staticmethod
+    def poi_id(osm_type: str, osm_id: int) -> int:
+        #Returns: int: Row id of an OSM object, unique for every type and id pair
+        return osm_id * 4 + osm_type_codes.get(osm_type, 3)
+
+    def migrate_legacy_places(self) -> None:
+        #Move places from the old osm_places table into the indexed tables.
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                rows = conn.execute("SELECT osm_type, osm_id, lat, lon, tags FROM osm_places").fetchall()
+            self.add_elements([{'type': osm_type, 'id': osm_id, 'lat': lat, 'lon': lon, 'tags': json.loads(tags)} for osm_type, osm_id, lat, lon, tags in rows])
+            with self.lock, sqlite3.connect(self.db_path, timeout=10) as conn:
+                conn.execute("DROP TABLE osm_places")
+                conn.commit()
+        except (sqlite3.Error, ValueError):
+            return
+
+    @staticmethod
+    def wanted_tags() -> Dict[str, set]:
+        #Returns: Dict[str, set]: Every key=value searched for by any activity category
+        wanted = {}
+        for patterns in activity_osm_tags.values():
+            for pattern in patterns.split('|'):
+                key, value = pattern.split('=', 1)
+                wanted.setdefault(key, set()).add(value)
+        return wanted
+
+    def covers(self, bbox: Tuple[float, float, float, float]) -> bool:
+        #A search is only answered locally if one extract holds all of it; an extract
+        #ending partway across the search would silently lose the places beyond its edge.
+
+        #Args: bbox (Tuple): (min_lat, min_lon, max_lat, max_lon) of the search
+
+        #Returns: bool: Whether a single imported extract contains the whole bbox
+        if not self.db_path:
+            return False
+        min_lat, min_lon, max_lat, max_lon = bbox
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                row = conn.execute("SELECT 1 FROM osm_extracts WHERE min_lat <= ? AND max_lat >= ? AND min_lon <= ? AND max_lon >= ? LIMIT 1",
+                                   (min_lat, max_lat, min_lon, max_lon)).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None
+
+    def query(self, bbox: Tuple[float, float, float, float], values_by_key: Dict[str, List[str]]) -> List[Dict]:
+        #Find the stored places inside a bbox that match any of the tag filters, in one query.
+        #The R*Tree finds the places in the bbox and each is kept only if the inverted index
+        #lists it under one of the wanted tags, so places of other types are never read.
+
+        #Args: bbox (Tuple): (min_lat, min_lon, max_lat, max_lon) to search, values_by_key (Dict[str, List[str]]): Wanted values for each key, from parse_osm_tags
+
+        #Returns: List[Dict]: Overpass-style elements
+        if not self.db_path or not values_by_key:
+            return []
+        min_lat, min_lon, max_lat, max_lon = bbox
+        #The wanted tag ids are looked up once inside the query, then probed per place
+        wanted = " OR ".join(f"(key = ? AND value IN ({','.join('?' * len(values))}))" for values in values_by_key.values())
+        tag_params = [item for key, values in values_by_key.items() for item in (key, *values)]
+        tag_filter = "EXISTS (SELECT 1 FROM poi_tags WHERE poi_tags.poi_id = {} AND poi_tags.tag_id IN (SELECT tag_id FROM tag_values WHERE " + wanted + "))"
+
+        position_filter = "pois.lat BETWEEN ? AND ? AND pois.lon BETWEEN ? AND ?"
+        params = [min_lat, max_lat, min_lon, max_lon]
+        if self.has_rtree:
+            #R*Tree boxes are rounded outwards to 32-bit floats, so positions are checked exactly too
+            sql = f"""
+                SELECT pois.osm_type, pois.osm_id, pois.lat, pois.lon, pois.tags
+                FROM pois_rtree JOIN pois ON pois.id = pois_rtree.id
+                WHERE pois_rtree.max_lat >= ? AND pois_rtree.min_lat <= ? AND pois_rtree.max_lon >= ? AND pois_rtree.min_lon <= ?
+                    AND {position_filter} AND {tag_filter.format('pois_rtree.id')}
+            """
+            params = [min_lat, max_lat, min_lon, max_lon] + params
+        else:
+            sql = f"SELECT osm_type, osm_id, lat, lon, tags FROM pois WHERE {position_filter} AND {tag_filter.format('pois.id')}"
+        with sqlite3.connect(self.db_path, timeout=10) as conn:
+            rows = conn.execute(sql, (*params, *tag_params)).fetchall()
+
+        elements = []
+        for osm_type, osm_id, lat, lon, tags_json in rows:
+            tags = json.loads(tags_json)
+            if osm_type == 'node':
+                elements.append({'type': osm_type, 'id': osm_id, 'lat': lat, 'lon': lon, 'tags': tags})
+            else:
+                elements.append({'type': osm_type, 'id': osm_id, 'center': {'lat': lat, 'lon': lon}, 'tags': tags})
+        return elements
+
+    def add_elements(self, elements: List[Dict]) -> int:
+        #Store Overpass-style elements and index them, replacing earlier copies of the same OSM objects.
+
+        #Returns: int: Elements stored
+        if not self.db_path:
+            return 0
+
+        with self.lock, sqlite3.connect(self.db_path, timeout=10) as conn:
+            try:
+                return self.write_batches(conn.cursor(), elements)
+            except sqlite3.Error:
+                #Ids handed out in a rolled back transaction may be reused for other tags
+                self.tag_ids.clear()
+                raise
+
+    def write_batches(self, cursor: sqlite3.Cursor, elements: List[Dict]) -> int:
+        #Write elements and their index entries, committing every extract_import_batch places.
+
+        #Returns: int: Elements stored
+        stored = 0
+        for start in range(0, len(elements), extract_import_batch):
+            rows, boxes, tag_rows = [], [], []
+            for element in elements[start:start + extract_import_batch]:
+                position = element if 'lat' in element else element.get('center')
+                if not position:
+                    continue
+                tags = element.get('tags', {})
+                row_id = self.poi_id(element['type'], element['id'])
+                rows.append((row_id, element['type'], element['id'], position['lat'], position['lon'], json.dumps(tags, separators=(",", ":"))))
+                boxes.append((row_id, position['lat'], position['lat'], position['lon'], position['lon']))
+                for key in local_places_indexed_keys:
+                    if key in tags:
+                        tag_rows.append((self.tag_id(cursor, key, tags[key]), row_id))
+
+            #A replaced place may have changed type, so its old index entries go first
+            cursor.executemany("DELETE FROM poi_tags WHERE poi_id = ?", [(row[0],) for row in rows])
+            cursor.executemany("INSERT OR REPLACE INTO pois (id, osm_type, osm_id, lat, lon, tags) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            cursor.executemany("INSERT OR IGNORE INTO poi_tags (tag_id, poi_id) VALUES (?, ?)", tag_rows)
+            if self.has_rtree:
+                cursor.executemany("INSERT OR REPLACE INTO pois_rtree (id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)", boxes)
+            cursor.connection.commit()
+            stored += len(rows)
+        return stored
+
+    def tag_id(self, cursor: sqlite3.Cursor, key: str, value: str) -> int:
+        #Look up or create the id of a (key, value) tag.
+
+        #Args: cursor (sqlite3.Cursor): Cursor inside the caller's transaction, key (str): Tag key, value (str): Tag value
+        tag_id = self.tag_ids.get((key, value))
+        if tag_id is None:
+            cursor.execute("INSERT OR IGNORE INTO tag_values (key, value) VALUES (?, ?)", (key, value))
+            cursor.execute("SELECT tag_id FROM tag_values WHERE key = ? AND value = ?", (key, value))
+            tag_id = cursor.fetchone()[0]
+            self.tag_ids[(key, value)] = tag_id
+        return tag_id
+
+    def import_extract(self, file_path: str, workers: int = extract_import_workers, gazetteer: Optional['Gazetteer'] = None) -> int:
+        #Import the wanted places from an OSM extract.
+
+        #Args: file_path (str): .osm.pbf, .osm/.xml or .geojson/.json file, workers (int): Processes for XML parsing, gazetteer (Optional[Gazetteer]): Also add the places here so map search finds them by name
+
+        #Returns: int: Places imported
+        if not self.db_path:
+            raise RuntimeError(f"Cannot open the local place store {local_places_path}")
+
+        if file_path.endswith(".pbf"):
+            elements, bounds = self.read_osm_pbf(file_path)
+        elif file_path.endswith((".osm", ".xml")):
+            elements, bounds = self.read_osm_xml(file_path, workers)
+        elif file_path.endswith((".geojson", ".json")):
+            elements, bounds = self.read_geojson(file_path)
+        else:
+            raise RuntimeError(f"Unsupported extract format: {file_path}")
+
+        count = self.add_elements(elements)
+        if bounds is None and elements:
+            #No declared bounds, so the extract covers the area its places span
+            positions = [element if 'lat' in element else element['center'] for element in elements]
+            lats = [position['lat'] for position in positions]
+            lons = [position['lon'] for position in positions]
+            bounds = (min(lats), min(lons), max(lats), max(lons))
+        if bounds is not None:
+            with self.lock, sqlite3.connect(self.db_path, timeout=10) as conn:
+                conn.execute("INSERT OR REPLACE INTO osm_extracts (file_path, imported_at, places, min_lat, min_lon, max_lat, max_lon) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (os.path.abspath(file_path), time.time(), count, *bounds))
+                conn.commit()
+
+        if gazetteer is not None:
+            gazetteer.add_places([{
+                'place_key': f"osm:{element['type']}/{element['id']}",
+                'name': element['tags']['name'],
+                'lat': element['lat'] if 'lat' in element else element['center']['lat'],
+                'lon': element['lon'] if 'lon' in element else element['center']['lon'],
+                'class': next((key for key in place_type_keys if key in element['tags']), None),
+                'type': next((element['tags'][key] for key in place_type_keys if key in element['tags']), None)
+            } for element in elements], 'extract')
+        return count
+
+    def read_osm_xml(self, file_path: str, workers: int) -> Tuple[List[Dict], Optional[Tuple[float, float, float, float]]]:
+        #Parse an .osm XML extract, in parallel slices when it is large.
+        #A first pass finds the wanted nodes and ways; ways only list node ids, so a second
+        #pass looks up those nodes and each way is placed at the centre of their bounding
+        #box, as Overpass does for "out center". Relations are skipped.
+
+        #Returns: Tuple: (Overpass-style elements, the file's declared bounds or None)
+        parts = max(1, min(workers, os.path.getsize(file_path) // extract_import_min_slice))
+        slices = osm_xml_slices(file_path, parts)
+        if not slices:
+            return [], None
+        wanted = self.wanted_tags()
+
+        pool = None
+        if len(slices) > 1:
+            pool = ProcessPoolExecutor(max_workers=len(slices), mp_context=multiprocessing.get_context("spawn"))
+        try:
+            def run(function, *extra):
+                #Run one pass over every slice, in the pool when there is one
+                if pool is None:
+                    return [function(file_path, start, end, *extra) for start, end in slices]
+                return list(pool.map(function, *zip(*[(file_path, start, end, *extra) for start, end in slices])))
+
+            elements, ways, bounds = [], [], None
+            for slice_places, slice_ways, slice_bounds in run(scan_osm_xml_slice, wanted):
+                elements.extend(slice_places)
+                ways.extend(slice_ways)
+                bounds = bounds or slice_bounds
+
+            if ways:
+                node_ids = {node_id for _, _, refs in ways for node_id in refs}
+                locations = {}
+                for slice_locations in run(locate_osm_xml_nodes, node_ids):
+                    locations.update(slice_locations)
+                for way_id, tags, refs in ways:
+                    points = [locations[node_id] for node_id in refs if node_id in locations]
+                    if not points:
+                        continue
+                    lats, lons = zip(*points)
+                    elements.append({'type': 'way', 'id': way_id, 'center': {'lat': (min(lats) + max(lats)) / 2, 'lon': (min(lons) + max(lons)) / 2}, 'tags': tags})
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return elements, bounds
+
+    def read_osm_pbf(self, file_path: str) -> Tuple[List[Dict], Optional[Tuple[float, float, float, float]]]:
+        #Parse an .osm.pbf extract with pyosmium, which decodes blocks on its own worker threads.
+
+        #Returns: Tuple: (Overpass-style elements, the file's declared bounds or None)
+        if importlib.util.find_spec("osmium") is None:
+            raise RuntimeError("Importing .osm.pbf extracts needs the osmium package (pip install osmium)")
+        import osmium
+
+        wanted = self.wanted_tags()
+        elements = []
+
+        class PlaceHandler(osmium.SimpleHandler):
+            def node(self, node):
+                #Most nodes are untagged way vertices, skip them before building a dict
+                if 'name' not in node.tags:
+                    return
+                kept = select_place_tags({tag.k: tag.v for tag in node.tags}, wanted)
+                if kept is not None and node.location.valid():
+                    elements.append({'type': 'node', 'id': node.id, 'lat': node.location.lat, 'lon': node.location.lon, 'tags': kept})
+
+            def way(self, way):
+                if 'name' not in way.tags:
+                    return
+                kept = select_place_tags({tag.k: tag.v for tag in way.tags}, wanted)
+                if kept is None:
+                    return
+                points = [(node.location.lat, node.location.lon) for node in way.nodes if node.location.valid()]
+                if points:
+                    lats, lons = zip(*points)
+                    elements.append({'type': 'way', 'id': way.id, 'center': {'lat': (min(lats) + max(lats)) / 2, 'lon': (min(lons) + max(lons)) / 2}, 'tags': kept})
+
+        #locations=True keeps node positions so ways can be placed
+        PlaceHandler().apply_file(file_path, locations=True)
+
+        bounds = None
+        reader = osmium.io.Reader(file_path, osmium.osm.osm_entity_bits.NOTHING)
+        box = reader.header().box()
+        reader.close()
+        if box.valid():
+            bounds = (box.bottom_left.lat, box.bottom_left.lon, box.top_right.lat, box.top_right.lon)
+        return elements, bounds
+
+    def read_geojson(self, file_path: str) -> Tuple[List[Dict], Optional[Tuple[float, float, float, float]]]:
+        #Parse a GeoJSON export such as osmtogeojson output; features are placed at the centre of their geometry's bounding box.
+
+        #Returns: Tuple: (Overpass-style elements, None as GeoJSON declares no coverage)
+        with open(file_path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        wanted = self.wanted_tags()
+
+        elements = []
+        for number, feature in enumerate(data.get('features', [])):
+            properties = feature.get('properties') or {}
+            tags = properties.get('tags') if isinstance(properties.get('tags'), dict) else properties
+            kept = select_place_tags(tags, wanted)
+            if kept is None:
+                continue
+
+            #Flatten nested coordinate arrays down to [lon, lat] pairs
+            points = []
+            stack = [(feature.get('geometry') or {}).get('coordinates')]
+            while stack:
+                item = stack.pop()
+                if isinstance(item, list) and len(item) >= 2 and all(isinstance(value, (int, float)) for value in item[:2]):
+                    points.append(item)
+                elif isinstance(item, list):
+                    stack.extend(item)
+            if not points:
+                continue
+            lons = [point[0] for point in points]
+            lats = [point[1] for point in points]
+
+            #OSM ids come as "node/123" from osmtogeojson, or as osm_type/osm_id properties
+            feature_id = str(feature.get('id') or properties.get('@id') or "")
+            osm_type, _, osm_id = feature_id.partition("/")
+            if not osm_id.isdigit():
+                osm_type, osm_id = properties.get('osm_type', 'node'), str(properties.get('osm_id', number))
+            if len(points) == 1:
+                elements.append({'type': osm_type, 'id': int(osm_id), 'lat': lats[0], 'lon': lons[0], 'tags': kept})
+            else:
+                elements.append({'type': osm_type, 'id': int(osm_id), 'center': {'lat': (min(lats) + max(lats)) / 2, 'lon': (min(lons) + max(lons)) / 2}, 'tags': kept})
+        return elements, None
+
+
+class OverpassEndpointPool:
+    #Health-scored set of Overpass endpoints with hedged requests.
+    #A download goes to the healthiest endpoint first. If it has not answered by the
+    #overpass_hedge_percentile of recent response times, the next endpoint is asked
+    #too, and an endpoint that fails hands over to the next one straight away. The
+    #first valid response wins and the slower requests are told to stop.
+    #Endpoints whose circuit breaker is open or whose Retry-After has not passed are
+    #skipped, and when every endpoint fails with a temporary error the whole round is
+    #retried with backoff.
+
+    def __init__(self, urls: Tuple[str, ...] = overpass_endpoints):
+        #Args: urls (Tuple[str, ...]): Overpass interpreter URLs
+        self.urls = list(urls)
+        self.breakers = {url: CircuitBreaker.for_endpoint(url) for url in self.urls}
+        self.retry = RetryPolicy()
+        self.lock = threading.Lock()
+        self.latencies = {url: deque(maxlen=overpass_latency_samples) for url in self.urls}
+        self.consecutive_failures = {url: 0 for url in self.urls}
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.urls)), thread_name_prefix="overpass")
+
+    def health_score(self, url: str) -> float:
+        #Expected seconds to an answer, inflated for every recent failure; lower is better.
+        with self.lock:
+            samples = list(self.latencies[url])
+            failures = self.consecutive_failures[url]
+        typical = float(np.median(samples)) if samples else overpass_hedge_default_delay
+        return typical * (1 + 2 * failures)
+
+    def ranked(self) -> List[str]:
+        #Returns: List[str]: Endpoints that are not switched off, healthiest first (configured order breaks ties)
+        return sorted((url for url in self.urls if self.breakers[url].available()), key=self.health_score)
+
+    def hedge_delay(self) -> float:
+        #Returns: float: Seconds to wait for an answer before asking another endpoint
+        with self.lock:
+            samples = [latency for latencies in self.latencies.values() for latency in latencies]
+        if len(samples) < 5:
+            return overpass_hedge_default_delay
+        return max(overpass_hedge_min_delay, float(np.percentile(samples, overpass_hedge_percentile)))
+
+    def record(self, url: str, latency: Optional[float]) -> None:
+        #Record the outcome of a request.
+
+        #Args: url (str): Endpoint, latency (Optional[float]): Seconds to a valid answer, or None if it failed
+        with self.lock:
+            if latency is None:
+                self.consecutive_failures[url] += 1
+            else:
+                self.consecutive_failures[url] = 0
+                self.latencies[url].append(latency)
+
+    def timed(self, request: Callable[[str, threading.Event], Any], url: str, cancel: threading.Event) -> Any:
+        #Run one request against one endpoint and record how it went.
+        breaker = self.breakers[url]
+        started = time.perf_counter()
+        try:
+            result = request(url, cancel)
+        except Exception as error:
+            #Requests stopped because another endpoint won say nothing about this one's health
+            if cancel.is_set():
+                breaker.release()
+                raise
+            self.record(url, None)
+            if isinstance(error, RetryPolicy.transient_errors):
+                breaker.record_failure(getattr(error, 'retry_after', None))
+            else:
+                breaker.release()
+            raise
+        if result is not None:
+            self.record(url, time.perf_counter() - started)
+            breaker.record_success()
+        else:
+            breaker.release()
+        return result
+
+    def fetch(self, request: Callable[[str, threading.Event], Any]) -> Any:
+        #Run a request with hedging and failover across the endpoints, retrying with
+        #backoff while every endpoint is failing temporarily.
+
+        #Args: request (Callable): Called as request(url, cancel) in a worker thread, raises RetryableError on a temporary failure and should return None once cancel is set
+
+        #Returns: Any: The first valid result, raises ServiceUnavailable if no endpoint could answer
+        for attempt in range(self.retry.attempts):
+            result, errors = self.fetch_round(request)
+            if result is not None:
+                return result
+            if not errors:
+                #Every endpoint was skipped; wait for the first one that will be back soon enough
+                wait_seconds = min(self.breakers[url].retry_in() for url in self.urls)
+                if attempt + 1 >= self.retry.attempts or wait_seconds > self.retry.max_wait:
+                    raise ServiceUnavailable("Every Overpass server is switched off after repeated failures, try again shortly")
+                time.sleep(wait_seconds)
+                continue
+
+            transient = [error for error in errors if isinstance(error, RetryPolicy.transient_errors)]
+            if not transient:
+                #The query itself was refused, asking again will not help
+                raise errors[-1]
+            #Wait until the first endpoint can be asked again, the shortest Retry-After or none at all;
+            #each breaker holds its own endpoint back until its Retry-After has passed
+            retry_after = min(getattr(error, 'retry_after', None) or 0.0 for error in transient) or None
+            wait_seconds = self.retry.delay(attempt, retry_after)
+            if attempt + 1 >= self.retry.attempts or wait_seconds > self.retry.max_wait:
+                break
+            time.sleep(wait_seconds)
+
+        raise ServiceUnavailable(f"OpenStreetMap's Overpass servers are busy, try again shortly ({transient[-1]})") from transient[-1]
+
+    def fetch_round(self, request: Callable[[str, threading.Event], Any]) -> Tuple[Any, List[Exception]]:
+        #Ask each available endpoint in turn, hedging slow ones, until one answers.
+
+        #Returns: Tuple[Any, List[Exception]]: (first valid result or None, errors from the endpoints that failed)
+        remaining = self.ranked()
+        cancel = threading.Event()
+        in_flight = {}
+        errors = []
+        hedge_at = None
+
+        while True:
+            #Start another endpoint when nothing is running or the current ones are slow
+            now = time.monotonic()
+            if remaining and len(in_flight) < overpass_max_in_flight and (not in_flight or now >= hedge_at):
+                url = remaining.pop(0)
+                if not self.breakers[url].allow():
+                    continue
+                in_flight[self.executor.submit(self.timed, request, url, cancel)] = url
+                hedge_at = now + self.hedge_delay()
+            if not in_flight:
+                return None, errors
+
+            timeout = max(0.0, hedge_at - time.monotonic()) if remaining and len(in_flight) < overpass_max_in_flight else None
+            done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                del in_flight[future]
+                error = future.exception()
+                if error is not None:
+                    errors.append(error)
+                    continue
+                result = future.result()
+                if result is not None:
+                    cancel.set()
+                    return result, errors
+            #A failed endpoint hands over to the next one straight away
+            if done:
+                hedge_at = time.monotonic()
+
+
+class OverpassStreamParser:
+    #Incremental parser for Overpass JSON responses.
+    #Raw byte chunks are fed in as they arrive and each element is decoded on its own,
+    #so the full body, its text and the complete dict tree are never held at once.
+    #Only named elements with usable coordinates are kept, slimmed to the fields the
+    #planner reads.
+
+    def __init__(self):
+        #Initialise an empty parser for one response.
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.offset = 0
+        self.state = "header"  #header -> elements -> trailer
+        self.trailer = ""
+        self.remark = None
+        self.complete = False
+
+    def feed(self, chunk: bytes) -> Iterator[Dict]:
+        #Add a chunk of the response body and yield every element it completes.
+
+        #Args: chunk (bytes): Next piece of the raw response body
+        self.buffer += self.text_decoder.decode(chunk)
+
+        if self.state == "header":
+            marker = self.buffer.find('"elements"')
+            if marker < 0:
+                return
+            array_start = self.buffer.find("[", marker)
+            if array_start < 0:
+                return
+            self.offset = array_start + 1
+            self.state = "elements"
+
+        if self.state == "elements":
+            yield from self.parse_elements()
+
+        if self.state == "trailer":
+            self.trailer += self.buffer[self.offset:]
+            self.buffer = ""
+            self.offset = 0
+
+    def parse_elements(self) -> Iterator[Dict]:
+        #Decode complete elements from the buffer, leaving any partial one for the next chunk.
+        buffer = self.buffer
+        position = self.offset
+        length = len(buffer)
+
+        while True:
+            #Skip separators between elements
+            while position < length and buffer[position] in " \t\r\n,":
+                position += 1
+            if position >= length:
+                break
+            if buffer[position] == "]":
+                self.state = "trailer"
+                position += 1
+                break
+
+            try:
+                element, position = self.json_decoder.raw_decode(buffer, position)
+            except ValueError:
+                #The element continues in a later chunk
+                break
+
+            place = self.slim_element(element)
+            if place:
+                yield place
+
+        #Drop consumed text so the buffer only ever holds one partial element
+        self.buffer = buffer[position:]
+        self.offset = 0
+
+    def close(self) -> List[Dict]:
+        #Finish parsing once the body has been fully read and pick up any trailing remark.
+
+        #Returns: List[Dict]: Any elements completed by the end of the body
+        self.buffer += self.text_decoder.decode(b"", final=True)
+        elements = []
+        if self.state == "elements":
+            elements = list(self.parse_elements())
+        if self.state != "trailer":
+            return elements
+
+        self.trailer += self.buffer[self.offset:]
+        try:
+            trailer = json.loads("{" + self.trailer.strip().lstrip(","))
+        except ValueError:
+            return elements
+        self.remark = trailer.get("remark")
+        self.complete = True
+        return elements
+
+    @staticmethod
+    def slim_element(element: Dict) -> Optional[Dict]:
+        #Reduce an Overpass element to its id, coordinates and the tags the planner uses.
+
+        #Args: element (Dict): Raw Overpass element
+
+        #Returns: Optional[Dict]: Slim element, or None if it has no name or coordinates
+        tags = element.get('tags') or {}
+        place_name = tags.get('name', '')
+        if not place_name or place_name in ['None', 'null']:
+            return None
+
+        if 'lat' in element and 'lon' in element:
+            lat, lon = element['lat'], element['lon']
+        elif 'center' in element:
+            lat, lon = element['center']['lat'], element['center']['lon']
+        elif 'bounds' in element:
+            bounds = element['bounds']
+            lat = (bounds['minlat'] + bounds['maxlat']) / 2
+            lon = (bounds['minlon'] + bounds['maxlon']) / 2
+        else:
+            return None
+
+        return {
+            'type': element.get('type'),
+            'id': element.get('id'),
+            'lat': lat,
+            'lon': lon,
+            'tags': {key: tags[key] for key in overpass_kept_tags if key in tags}
+        }
+
+
+class PlaceClassifier:
+    #Maps OSM tags to place types, integer category codes and visit durations.
+    #Compiled once from place_type_durations: every type string gets a category code the
+    #first time it is seen, resolved to a duration code by the same first-substring-match
+    #rule as the table order (so "sports_centre" matches "sports_centre" but
+    #"adventure_park" matches "park"), and is a single dict lookup from then on.
+
+    def __init__(self, type_keys: Tuple[str, ...] = place_type_keys, duration_table: Tuple[Tuple[str, float], ...] = place_type_durations, default_duration: float = place_type_default_duration):
+        #Args: type_keys (Tuple[str, ...]): Tag keys checked for the type in priority order, duration_table (Tuple[Tuple[str, float], ...]): (pattern, hours) pairs in match order, default_duration (float): Hours for unmatched types
+        self.type_keys = tuple(type_keys)
+        self.patterns = tuple(pattern for pattern, _ in duration_table)
+
+        #Duration code i is table row i; the last code is the default
+        self.duration_hours = tuple(hours for _, hours in duration_table) + (default_duration,)
+        self.duration_minutes = np.asarray([int(round(hours * 60)) for hours in self.duration_hours], dtype=np.int32)
+        self.default_code = len(self.patterns)
+
+        self.type_codes = {}  #Type string -> category code
+        self.type_names = []  #Category code -> type string
+        self.type_duration_codes = []  #Category code -> duration code
+        self.lock = threading.Lock()
+
+        for pattern in self.patterns:
+            self.type_code(pattern)
+        self.type_code('unknown')
+
+    def type_code(self, place_type: str) -> int:
+        #Get the category code of a place type, compiling it on first sight.
+
+        #Args: place_type (str): Place type identifier
+
+        #Returns: int: Category code
+        code = self.type_codes.get(place_type)
+        if code is not None:
+            return code
+
+        duration_code = next((i for i, pattern in enumerate(self.patterns) if pattern in place_type), self.default_code)
+        with self.lock:
+            code = self.type_codes.get(place_type)
+            if code is None:
+                code = len(self.type_names)
+                self.type_names.append(place_type)
+                self.type_duration_codes.append(duration_code)
+                self.type_codes[place_type] = code
+        return code
+
+    def place_type(self, tags: Dict[str, str]) -> str:
+        #Pick the place type from OSM tags.
+
+        #Args: tags (Dict[str, str]): OSM tags
+
+        #Returns: str: Value of the first type key present, or 'unknown'
+        for key in self.type_keys:
+            value = tags.get(key)
+            if value is not None:
+                return value
+        return 'unknown'
+
+    def duration(self, place_type: str) -> float:
+        #Args: place_type (str): Place type identifier
+
+        #Returns: float: Typical visit length in hours
+        return self.duration_hours[self.type_duration_codes[self.type_code(place_type)]]
+
+    def classify_types(self, place_types: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        #Classify a whole candidate list in one call.
+
+        #Args: place_types (List[str]): Place type per candidate
+
+        #Returns: Tuple[np.ndarray, np.ndarray]: int32 category codes and int32 visit minutes per candidate
+        codes = np.fromiter((self.type_code(place_type) for place_type in place_types), dtype=np.int32, count=len(place_types))
+        duration_codes = np.asarray(self.type_duration_codes, dtype=np.int32)[codes]
+        return codes, self.duration_minutes[duration_codes]
+
+
+class OpeningHoursParser:
+    #Compiles OSM opening_hours values into sorted (open, close) minute intervals over
+    #one week, starting Monday 00:00, and maps them onto an outing window.
+    #Many places share identical values ("Mo-Fr 09:00-17:00"), so compiled results are
+    #cached by string. Only the common subset of the syntax is understood: day ranges
+    #and lists, comma-separated times, "off", "24/7" and times past midnight. Anything
+    #else (months, dates, sunrise, comments) compiles to None, meaning "unknown", and
+    #the place is treated as always open rather than wrongly pruned.
+
+    days = ('Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa', 'Su')
+    week_minutes = 7 * 24 * 60
+    rule_pattern = re.compile(r'^(?P<days>(?:Mo|Tu|We|Th|Fr|Sa|Su|PH|SH)(?:\s*[-,]\s*(?:Mo|Tu|We|Th|Fr|Sa|Su|PH|SH))*)?\s*:?\s*(?P<times>.*)$')
+    time_pattern = re.compile(r'^(\d{1,2}):(\d{2})\s*(?:-\s*(\d{1,2}):(\d{2}))?\+?$')
+
+    def __init__(self, max_entries: int = opening_hours_cache_size):
+        #Args: max_entries (int): Compiled values kept before the cache is reset
+        self.max_entries = max_entries
+        self.cache = {}  #opening_hours string -> compiled weekly intervals, or None if unknown
+        self.lock = threading.Lock()
+
+    def compile(self, value: Optional[str]) -> Optional[Tuple[Tuple[int, int], ...]]:
+        #Compile an opening_hours value, using the cache when it has been seen before.
+
+        #Args: value (Optional[str]): Raw OSM opening_hours value
+
+        #Returns: Optional[Tuple[Tuple[int, int], ...]]: Weekly (open, close) minutes, empty if never open, or None if unknown
+        if not value:
+            return None
+        if value in self.cache:
+            return self.cache[value]
+
+        compiled = self.parse(value.strip())
+        with self.lock:
+            if len(self.cache) >= self.max_entries:
+                self.cache.clear()
+            self.cache[value] = compiled
+        return compiled
+
+    def parse(self, value: str) -> Optional[Tuple[Tuple[int, int], ...]]:
+        #Parse an opening_hours value without the cache.
+
+        #Args: value (str): Raw OSM opening_hours value
+
+        #Returns: Optional[Tuple[Tuple[int, int], ...]]: Weekly (open, close) minutes, or None if unsupported
+        if value == '24/7':
+            return ((0, self.week_minutes),)
+
+        #Days no rule mentions are closed; later rules replace earlier ones for their days
+        day_intervals = [[] for _ in self.days]
+        for rule in value.replace('||', ';').split(';'):
+            rule = rule.strip()
+            if not rule:
+                continue
+
+            match = self.rule_pattern.match(rule)
+            if match.group('days'):
+                selected = self.parse_days(match.group('days'))
+                if selected is None:
+                    return None
+            else:
+                selected = range(len(self.days))
+
+            times = match.group('times').strip()
+            if times.lower() in ('off', 'closed'):
+                intervals = []
+            elif times in ('', '24/7'):
+                intervals = [(0, 24 * 60)]
+            else:
+                intervals = self.parse_times(times)
+                if intervals is None:
+                    return None
+
+            for day in selected:
+                day_intervals[day] = list(intervals)
+
+        #Lay the days end to end, wrapping Sunday night into Monday morning
+        weekly = []
+        for day, intervals in enumerate(day_intervals):
+            for start, end in intervals:
+                start, end = day * 24 * 60 + start, day * 24 * 60 + end
+                if end > self.week_minutes:
+                    weekly.append((0, end - self.week_minutes))
+                    end = self.week_minutes
+                weekly.append((start, end))
+
+        return self.merge(weekly)
+
+    def parse_days(self, text: str) -> Optional[List[int]]:
+        #Args: text (str): Day selector such as "Mo-Fr", "Sa,Su" or "Fr-Mo"
+
+        #Returns: Optional[List[int]]: Day numbers from Monday = 0, or None if unsupported
+        #Public and school holidays are not known here, so they are left out
+        selected = []
+        for part in text.replace(' ', '').split(','):
+            if part in ('PH', 'SH'):
+                continue
+            first, _, last = part.partition('-')
+            if first not in self.days or (last and last not in self.days):
+                return None
+            start = self.days.index(first)
+            end = self.days.index(last) if last else start
+            selected.extend((start + offset) % 7 for offset in range((end - start) % 7 + 1))
+        return selected
+
+    def parse_times(self, text: str) -> Optional[List[Tuple[int, int]]]:
+        #Args: text (str): Time selector such as "09:00-12:00,13:00-17:30" or "18:00-02:00"
+
+        #Returns: Optional[List[Tuple[int, int]]]: (open, close) minutes from the day's midnight, or None if unsupported
+        intervals = []
+        for part in text.split(','):
+            match = self.time_pattern.match(part.strip())
+            if not match:
+                return None
+            start = int(match.group(1)) * 60 + int(match.group(2))
+            if match.group(3) is None:
+                #Open end ("18:00+") is taken as open until midnight
+                end = 24 * 60
+            else:
+                end = int(match.group(3)) * 60 + int(match.group(4))
+            if start >= 48 * 60 or end > 48 * 60:
+                return None
+            if end <= start:
+                end += 24 * 60
+            intervals.append((start, end))
+        return intervals
+
+    @staticmethod
+    def merge(intervals: List[Tuple[int, int]]) -> Tuple[Tuple[int, int], ...]:
+        #Sort intervals and join any that overlap or touch.
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return tuple(merged)
+
+    def windows(self, value: Optional[str], outing_start: datetime, window_minutes: int) -> Optional[Tuple[Tuple[int, int], ...]]:
+        #Map an opening_hours value onto an outing.
+
+        #Args: value (Optional[str]): Raw OSM opening_hours value, outing_start (datetime): Outing start time, window_minutes (int): Length of the outing
+
+        #Returns: Optional[Tuple[Tuple[int, int], ...]]: (open, close) minutes from the outing start, empty if closed throughout, or None if open throughout or unknown
+        weekly = self.compile(value)
+        if weekly is None:
+            return None
+
+        offset = outing_start.weekday() * 24 * 60 + outing_start.hour * 60 + outing_start.minute
+        windows = []
+        for week in range((offset + window_minutes) // self.week_minutes + 1):
+            shift = week * self.week_minutes - offset
+            for start, end in weekly:
+                start, end = max(start + shift, 0), min(end + shift, window_minutes)
+                if start < end:
+                    windows.append((start, end))
+
+        windows = self.merge(windows)
+        if windows == ((0, window_minutes),):
+            return None
+        return windows
+
+
+class PlaceRecord:
+    #Compact place used by the planner in place of the raw Overpass element.
+    #Only the fields the scheduler and the results page read are kept, in slots rather
+    #than a per-place dict; names and types are interned so repeats share one string.
+    #The full tag set stays with OutingPlanner and is looked up by OSM id when needed.
+
+    __slots__ = ('osm_type', 'osm_id', 'lat', 'lon', 'name', 'place_type', 'opening_hours')
+
+    def __init__(self, osm_type: str, osm_id: int, lat: float, lon: float, name: str, place_type: str, opening_hours: Optional[str] = None):
+        #Args: osm_type (str): OSM element type, osm_id (int): OSM element id, lat (float): Latitude, lon (float): Longitude, name (str): Place name, place_type (str): Place type identifier, opening_hours (Optional[str]): Raw OSM opening_hours value
+        self.osm_type = sys.intern(osm_type or '')
+        self.osm_id = osm_id
+        self.lat = float(lat)
+        self.lon = float(lon)
+        self.name = sys.intern(name)
+        self.place_type = sys.intern(place_type)
+        self.opening_hours = sys.intern(opening_hours) if opening_hours else None
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return (self.osm_type, self.osm_id)
+
+    @property
+    def coords(self) -> Tuple[float, float]:
+        return (self.lat, self.lon)
+
+    def __repr__(self):
+        return f"PlaceRecord({self.osm_type}/{self.osm_id}, {self.name!r}, {self.place_type})"
+
+    def to_dict(self) -> Dict:
+        return {'type': self.osm_type, 'id': self.osm_id, 'lat': self.lat, 'lon': self.lon, 'name': self.name, 'place_type': self.place_type, 'opening_hours': self.opening_hours}
+
+    @staticmethod
+    def from_dict(data: Dict) -> 'PlaceRecord':
+        return PlaceRecord(data.get('type'), data.get('id'), data['lat'], data['lon'], data['name'], data['place_type'], data.get('opening_hours'))
+
+
+class PlanResult:
+    #Everything needed to show, save and reopen a plan without any network access.
+    #Built by OutingPlanner.create_plan from the exact start coordinates used for the
+    #search, so the results page never has to geocode the start location again.
+
+    def __init__(self, start_location: str, start_coords: Tuple[float, float], outing_start: datetime, outing_end: datetime, itinerary: List[Dict], places_found: int, candidates_considered: int, search_stats: Optional[Dict] = None):
+        #Args: start_location (str): Start location as shown to the user, start_coords (Tuple[float, float]): Coordinates the search started from, outing_start (datetime): Outing start time, outing_end (datetime): Outing end time, itinerary (List[Dict]): Itinerary from create_optimal_itinerary, places_found (int): Places returned by the search, candidates_considered (int): Places the route search chose from, search_stats (Optional[Dict]): Route optimiser results
+        self.start_location = start_location
+        self.start_coords = (float(start_coords[0]), float(start_coords[1]))
+        self.outing_start = outing_start
+        self.outing_end = outing_end
+        self.itinerary = itinerary
+        self.places_found = places_found
+        self.candidates_considered = candidates_considered
+        self.search_stats = search_stats
+
+    @property
+    def stop_coords(self) -> List[Tuple[float, float]]:
+        return [item['coordinates'] for item in self.itinerary]
+
+    def details_text(self) -> str:
+        #Returns: str: One line per stop, as stored in the plans table's details column
+        return "\n".join([
+            f"{i+1}. {item['activity']} ({item['type']}) "
+            f"from {item['start_time'].strftime('%H:%M')} to {item['end_time'].strftime('%H:%M')}"
+            for i, item in enumerate(self.itinerary)
+        ])
+
+    def to_json(self) -> str:
+        #Serialise the plan for the plans table's plan_data column.
+
+        #Returns: str: JSON text
+        return json.dumps({
+            'start_location': self.start_location,
+            'start_coords': list(self.start_coords),
+            'outing_start': self.outing_start.isoformat(),
+            'outing_end': self.outing_end.isoformat(),
+            'places_found': self.places_found,
+            'candidates_considered': self.candidates_considered,
+            'search_stats': self.search_stats,
+            'itinerary': [{
+                **item,
+                'place': item['place'].to_dict(),
+                'start_time': item['start_time'].isoformat(),
+                'end_time': item['end_time'].isoformat(),
+                'coordinates': list(item['coordinates'])
+            } for item in self.itinerary]
+        }, separators=(",", ":"))
+
+    @staticmethod
+    def from_json(text: str) -> 'PlanResult':
+        #Rebuild a plan saved with to_json.
+
+        #Args: text (str): JSON text
+
+        #Returns: PlanResult: The saved plan
+        data = json.loads(text)
+        itinerary = [{
+            **item,
+            'place': PlaceRecord.from_dict(item['place']),
+            'start_time': datetime.fromisoformat(item['start_time']),
+            'end_time': datetime.fromisoformat(item['end_time']),
+            'coordinates': tuple(item['coordinates'])
+        } for item in data['itinerary']]
+        return PlanResult(data['start_location'], tuple(data['start_coords']), datetime.fromisoformat(data['outing_start']), datetime.fromisoformat(data['outing_end']), itinerary, data['places_found'], data['candidates_considered'], data.get('search_stats'))
+
+
+class PlaceGridIndex:
+    #Uniform lat/lon grid over candidate places for nearest-neighbour and radius queries.
+    #Points are bucketed once per planning run; queries only visit the cells around the
+    #query point, so lookups stay fast when dense city centres return many candidates.
+    #Distances use an equirectangular approximation, which is accurate at outing scale.
+
+    def __init__(self, coords: np.ndarray, ids: Optional[List[int]] = None, cell_km: Optional[float] = None):
+        #Build the grid.
+
+        #Args: coords (np.ndarray): (N, 2) array of (lat, lon) points, ids (Optional[List[int]]): Identifier per point, defaults to row numbers, cell_km (Optional[float]): Grid cell size in kilometers, by default sized for about 8 points per cell
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.ids = np.asarray(ids if ids is not None else range(len(self.coords)), dtype=np.int64)
+        self.positions = {int(point_id): row for row, point_id in enumerate(self.ids.tolist())}
+
+        reference_lat = float(np.mean(self.coords[:, 0])) if len(self.coords) else 0.0
+        self.km_per_deg_lat = 111.0
+        self.km_per_deg_lon = max(111.0 * math.cos(math.radians(reference_lat)), 1e-6)
+
+        if cell_km is None:
+            if len(self.coords) > 1:
+                height_km = float(np.ptp(self.coords[:, 0])) * self.km_per_deg_lat
+                width_km = float(np.ptp(self.coords[:, 1])) * self.km_per_deg_lon
+                cell_km = math.sqrt(max(height_km * width_km, 1e-6) * 8 / len(self.coords))
+            cell_km = max(cell_km or 1.0, 0.05)
+        self.cell_lat = cell_km / self.km_per_deg_lat
+        self.cell_lon = cell_km / self.km_per_deg_lon
+        self.cell_km = cell_km
+
+        self.cells = {}
+        self.cell_bounds = (0, 0, 0, 0)
+        if len(self.coords):
+            cell_rows = np.floor(self.coords[:, 0] / self.cell_lat).astype(np.int64)
+            cell_cols = np.floor(self.coords[:, 1] / self.cell_lon).astype(np.int64)
+            order = np.lexsort((cell_cols, cell_rows))
+            keys = np.stack([cell_rows[order], cell_cols[order]], axis=1)
+            boundaries = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+            for group in np.split(order, boundaries):
+                self.cells[(int(cell_rows[group[0]]), int(cell_cols[group[0]]))] = group
+            self.cell_bounds = (int(cell_rows.min()), int(cell_cols.min()), int(cell_rows.max()), int(cell_cols.max()))
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def coordinates(self, point_id: int) -> Tuple[float, float]:
+        #Get the coordinates stored for an identifier.
+        lat, lon = self.coords[self.positions[point_id]]
+        return float(lat), float(lon)
+
+    def distances_km(self, lat: float, lon: float, rows: np.ndarray) -> np.ndarray:
+        #Approximate distances from a point to the given rows of the index.
+        delta_lat = (self.coords[rows, 0] - lat) * self.km_per_deg_lat
+        delta_lon = (self.coords[rows, 1] - lon) * self.km_per_deg_lon
+        return np.hypot(delta_lat, delta_lon)
+
+    def rows_in_ring(self, center_cell: Tuple[int, int], ring: int) -> List[np.ndarray]:
+        #Collect the point rows of every cell exactly `ring` cells away from the center cell.
+        row, col = center_cell
+        found = []
+        for cell_row in range(row - ring, row + ring + 1):
+            for cell_col in range(col - ring, col + ring + 1):
+                if max(abs(cell_row - row), abs(cell_col - col)) != ring:
+                    continue
+                rows = self.cells.get((cell_row, cell_col))
+                if rows is not None:
+                    found.append(rows)
+        return found
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[int]:
+        #Find every point within radius_km of a location.
+
+        #Returns: List[int]: Identifiers of matching points, nearest first
+        if not self.cells:
+            return []
+        center_cell = (math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon))
+        rings = int(math.ceil(radius_km / self.cell_km)) + 1
+        groups = [rows for ring in range(rings + 1) for rows in self.rows_in_ring(center_cell, ring)]
+        if not groups:
+            return []
+        rows = np.concatenate(groups)
+        distances = self.distances_km(lat, lon, rows)
+        inside = distances <= radius_km
+        rows, distances = rows[inside], distances[inside]
+        return self.ids[rows[np.argsort(distances, kind="stable")]].tolist()
+
+    def nearest(self, lat: float, lon: float, k: int, exclude: Optional[set] = None) -> List[int]:
+        #Find the k points closest to a location, searching outwards ring by ring.
+
+        #Args: lat (float): Query latitude, lon (float): Query longitude, k (int): Number of neighbours wanted, exclude (Optional[set]): Identifiers to skip
+
+        #Returns: List[int]: Identifiers of the nearest points, nearest first
+        if not self.cells or k <= 0:
+            return []
+        exclude_ids = np.fromiter(exclude, dtype=np.int64) if exclude else None
+        center_cell = (math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon))
+        min_row, min_col, max_row, max_col = self.cell_bounds
+        max_ring = max(abs(center_cell[0] - min_row), abs(center_cell[0] - max_row), abs(center_cell[1] - min_col), abs(center_cell[1] - max_col))
+
+        found_rows = []
+        found_distances = []
+        kept = 0
+        for ring in range(max_ring + 1):
+            for rows in self.rows_in_ring(center_cell, ring):
+                if exclude:
+                    rows = rows[~np.isin(self.ids[rows], exclude_ids)]
+                if len(rows):
+                    found_rows.append(rows)
+                    found_distances.append(self.distances_km(lat, lon, rows))
+                    kept += len(rows)
+
+            #Anything outside this ring is at least ring * cell_km away
+            if kept >= k:
+                distances = np.concatenate(found_distances)
+                if np.partition(distances, k - 1)[k - 1] <= ring * self.cell_km:
+                    break
+
+        if not found_rows:
+            return []
+        rows = np.concatenate(found_rows)
+        distances = np.concatenate(found_distances)
+        return self.ids[rows[np.argsort(distances, kind="stable")[:k]]].tolist()
+
+
+class ItineraryOptimizer:
+    #Orienteering-style route search over a precomputed travel-time matrix.
+    #Maximises the number of stops, then the number of distinct categories, then
+    #minimises travel, while every stop fits inside the outing window.
+    #All times are whole minutes measured from the start of the outing, and index 0
+    #of the matrix is the start point.
+
+    def __init__(self, travel_matrix: np.ndarray, durations: List[int], types: List[int], window_minutes: int, max_stops: int, min_final_minutes: int = 30, spatial_index: Optional[PlaceGridIndex] = None, opening_windows: Optional[List[Optional[Tuple[Tuple[int, int], ...]]]] = None):
+        #Initialise the optimizer for one planning run.
+
+        #Args: travel_matrix (np.ndarray): (N+1, N+1) travel minutes with the start at index 0, durations (List[int]): Activity minutes per matrix index (index 0 unused), types (List[int]): Place category code per matrix index (index 0 unused), window_minutes (int): Length of the outing, max_stops (int): Cap on scheduled stops, min_final_minutes (int): Shortest visit allowed when the last stop is cut short by the end of the outing, spatial_index (Optional[PlaceGridIndex]): Index over matrix indices used to limit moves to nearby places, opening_windows (Optional[List]): (open, close) minutes per matrix index from OpeningHoursParser.windows, None where a place is open throughout
+        self.travel = travel_matrix
+        self.spatial_index = spatial_index
+        self.neighbour_cache = {}  #Matrix index -> nearest other indices, filled on demand
+        self.durations = durations
+        self.types = types
+        self.window = window_minutes
+        self.max_stops = max_stops
+        self.min_final_minutes = min_final_minutes
+        self.candidates = list(range(1, len(durations)))
+
+        #Places open throughout get the whole outing as their only window
+        whole_outing = ((0, window_minutes),)
+        self.opening = [whole_outing if not opening_windows or opening_windows[index] is None else opening_windows[index] for index in range(len(durations))]
+
+    def visit(self, index: int, arrival: int, is_last: bool) -> Optional[Tuple[int, int]]:
+        #Fit a visit into the first opening window it can use, waiting for opening if needed.
+        #A visit must end by closing time, except that the last stop may be cut short.
+
+        #Args: index (int): Matrix index of the place, arrival (int): Minute the place is reached, is_last (bool): Whether this is the final stop of the route
+
+        #Returns: Optional[Tuple[int, int]]: (start, end) minutes of the visit, or None if it cannot fit
+        duration = self.durations[index]
+        for open_minute, close_minute in self.opening[index]:
+            start = max(arrival, open_minute)
+            end_limit = min(close_minute, self.window)
+            if start >= end_limit:
+                continue
+            if start + duration <= end_limit:
+                return start, start + duration
+            if is_last and end_limit - start >= self.min_final_minutes:
+                return start, end_limit
+        return None
+
+    def visit_starts(self, index: int, arrivals: np.ndarray, never: int, is_last: bool) -> np.ndarray:
+        #Vectorised visit(): earliest start at one place for an array of arrival minutes.
+
+        #Args: index (int): Matrix index of the place, arrivals (np.ndarray): Arrival minutes, never (int): Marker for unreachable states, is_last (bool): Allow the visit to be cut short
+
+        #Returns: np.ndarray: Start minutes, or never where the visit cannot fit
+        starts = np.full(arrivals.shape, never, dtype=np.int64)
+        duration = self.durations[index]
+        for open_minute, close_minute in self.opening[index]:
+            begin = np.maximum(arrivals, open_minute)
+            end_limit = min(close_minute, self.window)
+            fits = begin + duration <= end_limit
+            if is_last:
+                fits |= end_limit - begin >= self.min_final_minutes
+            starts = np.where((starts == never) & (arrivals < never) & (begin < end_limit) & fits, begin, starts)
+        return starts
+
+    def schedule(self, route: List[int]) -> Optional[List[Tuple[int, int, int, int]]]:
+        #Simulate a route through the outing window.
+        #The last stop may be shortened to end with the outing if enough time remains,
+        #matching the rules the greedy planner has always used. Places that are not yet
+        #open are waited for.
+
+        #Args: route (List[int]): Matrix indices in visiting order
+
+        #Returns: Optional[List[Tuple[int, int, int, int]]]: (index, travel, start, end) minutes per stop, or None if infeasible
+        current_time = 0
+        previous = 0
+        stops = []
+        last_position = len(route) - 1
+
+        for position, index in enumerate(route):
+            travel_minutes = int(self.travel[previous, index])
+            visit = self.visit(index, current_time + travel_minutes, position == last_position)
+            if visit is None:
+                return None
+
+            stops.append((index, travel_minutes, visit[0], visit[1]))
+            current_time = visit[1]
+            previous = index
+
+        return stops
+
+    def score(self, route: List[int]) -> Optional[Tuple[int, int, int]]:
+        #Score a route so that larger tuples are better.
+
+        #Args: route (List[int]): Matrix indices in visiting order
+
+        #Returns: Optional[Tuple[int, int, int]]: (stops, distinct categories, -travel minutes), or None if infeasible
+        if len(route) > self.max_stops:
+            return None
+        stops = self.schedule(route)
+        if stops is None:
+            return None
+        return len(route), len({self.types[index] for index in route}), -sum(stop[1] for stop in stops)
+
+    def route_travel(self, route: List[int]) -> int:
+        #Total travel minutes of a route, ignoring feasibility.
+        previous = 0
+        total = 0
+        for index in route:
+            total += int(self.travel[previous, index])
+            previous = index
+        return total
+
+    def greedy_route(self, order: List[int]) -> List[int]:
+        #Walk candidates in a fixed order and keep every one that still fits.
+        #This is the planner's original single-pass algorithm.
+
+        #Args: order (List[int]): Matrix indices in the order they should be tried
+
+        #Returns: List[int]: Route of accepted indices
+        route = []
+        for index in order:
+            if len(route) >= self.max_stops:
+                break
+            if self.schedule(route + [index]) is not None:
+                route.append(index)
+        return route
+
+    def best_insertion(self, route: List[int], unvisited: List[int], prefer_new_types: bool = True, rng: Optional[random.Random] = None) -> Optional[List[int]]:
+        #Find the cheapest feasible way to add one more stop to a route.
+        #Cost is the detour plus the time spent at the stop, since together they use up the window.
+
+        #Args: route (List[int]): Current route, unvisited (List[int]): Indices that may be inserted, prefer_new_types (bool): Try categories not yet visited before any others, rng (Optional[random.Random]): If given, pick randomly among the cheapest feasible insertions
+
+        #Returns: Optional[List[int]]: Extended route, or None if nothing fits
+        if not unvisited or len(route) >= self.max_stops:
+            return None
+
+        unvisited_array = np.asarray(unvisited)
+        visited_types = {self.types[index] for index in route}
+        repeat_penalty = np.asarray([10 ** 6 if prefer_new_types and self.types[index] in visited_types else 0 for index in unvisited], dtype=np.int64)
+        repeat_penalty += np.asarray([self.durations[index] for index in unvisited], dtype=np.int64)
+
+        options = []
+        stops = [0] + route
+        for position in range(len(route) + 1):
+            before = stops[position]
+            detour = self.travel[before, unvisited_array].astype(np.int64)
+            if position < len(route):
+                after = route[position]
+                detour = detour + self.travel[unvisited_array, after] - self.travel[before, after]
+            cost = detour + repeat_penalty
+            for candidate in np.argsort(cost, kind="stable")[:insertion_candidates_checked]:
+                options.append((int(cost[candidate]), position, unvisited[candidate]))
+
+        options.sort()
+        feasible_routes = []
+        choices = randomised_insertion_choices if rng else 1
+        for _, position, index in options:
+            new_route = route[:position] + [index] + route[position:]
+            if new_route not in feasible_routes and self.schedule(new_route) is not None:
+                feasible_routes.append(new_route)
+                if len(feasible_routes) >= choices:
+                    break
+
+        if not feasible_routes:
+            return None
+        return rng.choice(feasible_routes) if rng else feasible_routes[0]
+
+    def nearby_unvisited(self, route: List[int], unvisited: List[int]) -> List[int]:
+        #Narrow the unvisited candidates to the nearest neighbours of the start and each stop.
+
+        #Args: route (List[int]): Current route, unvisited (List[int]): All unvisited indices
+
+        #Returns: List[int]: Unvisited indices close to the route, in their original order
+        if self.spatial_index is None or len(unvisited) <= nearest_neighbours_checked:
+            return unvisited
+
+        nearby = set()
+        for stop in [0] + route:
+            #A stop's neighbours never change, so each is only looked up once per run
+            if stop not in self.neighbour_cache:
+                lat, lon = self.spatial_index.coordinates(stop)
+                self.neighbour_cache[stop] = self.spatial_index.nearest(lat, lon, nearest_neighbours_checked + self.max_stops + 1)
+            nearby.update(self.neighbour_cache[stop])
+        return [index for index in unvisited if index in nearby]
+
+    def insert_nearby(self, route: List[int], unvisited: List[int], prefer_new_types: bool = True, rng: Optional[random.Random] = None) -> Optional[List[int]]:
+        #Insert a stop chosen from places near the route, widening to every place if none fits.
+        nearby = self.nearby_unvisited(route, unvisited)
+        new_route = self.best_insertion(route, nearby, prefer_new_types, rng)
+        if new_route is None and len(nearby) < len(unvisited):
+            new_route = self.best_insertion(route, unvisited, prefer_new_types, rng)
+        return new_route
+
+    def construct(self, prefer_new_types: bool = True, rng: Optional[random.Random] = None) -> List[int]:
+        #Build a route by repeated cheapest insertion.
+
+        #Args: prefer_new_types (bool): Favour unseen categories over cheaper stops, rng (Optional[random.Random]): Randomise each insertion among the cheapest few
+
+        #Returns: List[int]: Feasible route
+        route = []
+        unvisited = list(self.candidates)
+        while True:
+            new_route = self.insert_nearby(route, unvisited, prefer_new_types, rng)
+            if new_route is None:
+                return route
+            unvisited = [index for index in unvisited if index not in new_route]
+            route = new_route
+
+    def improve(self, route: List[int], max_passes: int = 50) -> List[int]:
+        #Improve a feasible route with insertion, 2-opt, or-opt and swap moves until none helps.
+
+        #Args: route (List[int]): Feasible starting route, max_passes (int): Upper bound on improvement rounds
+
+        #Returns: List[int]: Route with a score at least as good as the input
+        best_route = list(route)
+        best_score = self.score(best_route)
+        if best_score is None:
+            return []
+
+        for _ in range(max_passes):
+            improved = False
+            for candidate_route in self.neighbours(best_route):
+                candidate_score = self.score(candidate_route)
+                if candidate_score is not None and candidate_score > best_score:
+                    best_route, best_score = candidate_route, candidate_score
+                    improved = True
+                    break
+            if not improved:
+                break
+
+        return best_route
+
+    def neighbours(self, route: List[int]):
+        #Yield routes one local-search move away, cheapest move types first.
+
+        #Args: route (List[int]): Current route
+        visited = set(route)
+        unvisited = [index for index in self.candidates if index not in visited]
+
+        #Add another stop if one fits, trying a new category first
+        for prefer_new_types in (True, False):
+            extended = self.insert_nearby(route, unvisited, prefer_new_types)
+            if extended is not None:
+                yield extended
+
+        #2-opt: reverse a section of the route
+        for i in range(len(route) - 1):
+            for j in range(i + 1, len(route)):
+                yield route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+
+        #Or-opt: move a run of up to three stops elsewhere
+        for length in range(1, min(3, len(route)) + 1):
+            for i in range(len(route) - length + 1):
+                segment = route[i:i + length]
+                rest = route[:i] + route[i + length:]
+                for j in range(len(rest) + 1):
+                    if j != i:
+                        yield rest[:j] + segment + rest[j:]
+
+        #Swap: replace a stop with the nearby unvisited place that uses the least time
+        unvisited = self.nearby_unvisited(route, unvisited)
+        if unvisited:
+            unvisited_array = np.asarray(unvisited)
+            unvisited_durations = np.asarray([self.durations[index] for index in unvisited], dtype=np.int64)
+            stops = [0] + route
+            for position, current in enumerate(route):
+                before = stops[position]
+                detour = self.travel[before, unvisited_array].astype(np.int64) + unvisited_durations
+                if position + 1 < len(route):
+                    detour = detour + self.travel[unvisited_array, route[position + 1]]
+                for candidate in np.argsort(detour, kind="stable")[:insertion_candidates_checked]:
+                    yield route[:position] + [unvisited[candidate]] + route[position + 1:]
+
+    def solve_exact(self, time_budget: Optional[float] = None) -> Optional[List[int]]:
+        #Find the provably best route with a Held-Karp style dynamic program over subsets.
+        #Routes are grown one stop at a time up to max_stops. Each layer holds labels in NumPy
+        #arrays: a subset, its last stop, the arrival there and the driving so far. Waiting for
+        #opening means an earlier arrival can cost more driving, so a subset and last stop keep
+        #every label that no other label beats on both arrival and driving. Without opening
+        #hours that is a single label, the earliest arrival.
+
+        #Args: time_budget (Optional[float]): Seconds allowed before giving up
+
+        #Returns: Optional[List[int]]: Best route, or None if the time budget ran out
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        count = len(self.candidates)
+        if count == 0 or self.max_stops <= 0:
+            return []
+
+        never = np.int64(2 ** 40)  #Arrival used for unreachable states
+        nodes = np.asarray(self.candidates)
+        travel = self.travel[np.ix_(nodes, nodes)].astype(np.int64)
+        durations = np.asarray([self.durations[index] for index in self.candidates], dtype=np.int64)
+        bits = np.left_shift(np.int64(1), np.arange(count, dtype=np.int64))
+
+        #Categories are renumbered so a subset's categories fit in one integer bitmask
+        type_ids = {}
+        type_bits = np.asarray([1 << type_ids.setdefault(self.types[index], len(type_ids)) for index in self.candidates], dtype=np.int64)
+
+        #Layer of single-stop routes, as (masks, last stops, arrivals, driving, parent labels)
+        first_legs = self.travel[0, nodes].astype(np.int64)
+        reachable = np.flatnonzero(first_legs < self.window)
+        layers = [(bits[reachable], reachable, first_legs[reachable], first_legs[reachable], None)]
+
+        for size in range(2, min(self.max_stops, count) + 1):
+            masks, lasts, arrivals, driving, _ = layers[-1]
+            #Only stops that finish inside the window can be followed by another stop
+            finishes = np.full(len(lasts), never, dtype=np.int64)
+            for position, index in enumerate(self.candidates):
+                at_stop = lasts == position
+                if np.any(at_stop):
+                    starts = self.visit_starts(index, arrivals[at_stop], never, False)
+                    finishes[at_stop] = np.where(starts < never, starts + durations[position], never)
+            open_labels = np.flatnonzero(finishes < never)
+            if len(open_labels) == 0:
+                break
+
+            new_labels = []
+            for following in range(count):
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+
+                sources = open_labels[(masks[open_labels] & bits[following]) == 0]
+                legs = travel[lasts[sources], following]
+                fits = finishes[sources] + legs < self.window
+                sources, legs = sources[fits], legs[fits]
+                if len(sources) == 0:
+                    continue
+                new_masks = masks[sources] | bits[following]
+                new_arrivals = finishes[sources] + legs
+                new_driving = driving[sources] + legs
+
+                #Sorted by subset, then arrival, a label is kept only if it drives less than every
+                #earlier-arriving label of its subset. Each subset's driving is offset below the
+                #previous subset's so one running minimum serves every subset at once
+                order = np.lexsort((new_driving, new_arrivals, new_masks))
+                new_masks, new_arrivals, new_driving, sources = new_masks[order], new_arrivals[order], new_driving[order], sources[order]
+                subset_starts = np.concatenate(([True], new_masks[1:] != new_masks[:-1]))
+                subset_numbers = np.cumsum(subset_starts)
+                offset_driving = new_driving + (subset_numbers[-1] - subset_numbers) * (int(new_driving.max()) + 1)
+                best_before = np.concatenate(([offset_driving[0] + 1], np.minimum.accumulate(offset_driving)[:-1]))
+                kept = offset_driving < best_before
+                new_labels.append((new_masks[kept], np.full(int(np.count_nonzero(kept)), following), new_arrivals[kept], new_driving[kept], sources[kept]))
+
+            if not new_labels:
+                break
+            layers.append(tuple(np.concatenate([labels[part] for labels in new_labels]) for part in range(5)))
+
+        #The largest subset with a valid last stop wins, then categories, then driving
+        for size in range(len(layers), 0, -1):
+            masks, lasts, arrivals, driving, _ = layers[size - 1]
+            valid = np.zeros(len(lasts), dtype=bool)
+            for position, index in enumerate(self.candidates):
+                at_stop = lasts == position
+                if np.any(at_stop):
+                    valid[at_stop] = self.visit_starts(index, arrivals[at_stop], never, True) < never
+            if not np.any(valid):
+                continue
+
+            subset_types = np.zeros(len(masks), dtype=np.int64)
+            for position in range(count):
+                subset_types |= np.where((masks & bits[position]) != 0, type_bits[position], 0)
+            distinct_types = np.asarray([bin(value).count("1") for value in subset_types.tolist()], dtype=np.int64)
+            ranking = np.where(valid, distinct_types * (never * 4) - driving, np.iinfo(np.int64).min)
+            label = int(np.argmax(ranking))
+
+            #Walk the parent labels back to the first stop
+            route = []
+            for layer_size in range(size, 0, -1):
+                _, layer_lasts, _, _, layer_parents = layers[layer_size - 1]
+                route.append(self.candidates[int(layer_lasts[label])])
+                if layer_parents is None:
+                    break
+                label = int(layer_parents[label])
+            return route[::-1]
+
+        return []
+
+    def rank(self, route: List[int]) -> Optional[Tuple[int, int, int, int]]:
+        #Rank a route for multi-start search: score, then slack left at the end of the outing.
+
+        #Args: route (List[int]): Matrix indices in visiting order
+
+        #Returns: Optional[Tuple[int, int, int, int]]: (stops, distinct categories, -travel, slack minutes), or None if infeasible
+        route_score = self.score(route)
+        if route_score is None:
+            return None
+        stops = self.schedule(route)
+        finish = stops[-1][3] if stops else 0
+        return route_score + (self.window - finish,)
+
+    def search_randomised(self, seeds: List[int], deadline: float) -> List[int]:
+        #Run seeded randomised constructions with local search until the seeds or time run out.
+
+        #Args: seeds (List[int]): Random seeds, one construction each, deadline (float): time.time() after which no new construction starts
+
+        #Returns: List[int]: Best route found
+        best_route = []
+        best_rank = self.rank(best_route)
+        for seed in seeds:
+            if time.time() >= deadline:
+                break
+            rng = random.Random(seed)
+            route = self.improve(self.construct(rng.random() < 0.5, rng))
+            route_rank = self.rank(route)
+            if route_rank is not None and route_rank > best_rank:
+                best_route, best_rank = route, route_rank
+        return best_route
+
+    def optimise(self, seed_routes: List[List[int]] = ()) -> List[int]:
+        #Run the constructive heuristic and local search, keeping the best route found.
+
+        #Args: seed_routes (List[List[int]]): Extra feasible routes to improve, e.g. the greedy result
+
+        #Returns: List[int]: Best route
+        best_route = []
+        best_score = self.score(best_route)
+        for start_route in [self.construct(True), self.construct(False)] + [list(route) for route in seed_routes]:
+            route = self.improve(start_route)
+            route_score = self.score(route)
+            if route_score is not None and route_score > best_score:
+                best_route, best_score = route, route_score
+        return best_route
+
+
+def run_itinerary_search(optimizer: ItineraryOptimizer, seeds: List[int], deadline: float) -> List[int]:
+    #Process pool entry point for one worker's share of a multi-start search.
+    return optimizer.search_randomised(seeds, deadline)
 
-            #Clear the search entry field
-            self.search_entry.delete(0, "end")
-        
-        except Exception as e:
-            #Handle map update errors
-            self.map_error_label.configure(text=f"Map update error: {e}")
-            self.clear_error_after_delay() 
-        
-    def on_search_success(self) -> None:
-        #Handle successful search completion.
-        self.search_btn.configure(state="normal", text="Search")
-        self.search_entry.delete(0, "end")
-        
-    def on_search_error(self, error_msg: str = "") -> None:
-        #Handle search failure and display error message.
-        
-        #Args: error_msg (str): Optional custom error message
-        self.search_btn.configure(state="normal", text="Search")
-        
-        #Use custom error message or default
-        error_text = error_msg if error_msg else "Search error: Location not found"
-        self.map_error_label.configure(text=error_text)
-    
-        #Clear error after delay
-        self.clear_error_after_delay()
-    
-        #Display error in results frame
-        if not hasattr(self, 'results_frame'):
-            self.results_frame = ctk.CTkFrame(self, fg_color="#1a1a1a", corner_radius=6)
-            self.results_frame.grid(row=2, column=0, sticky="ew", padx=5, pady=5)
-            
-            #Results frame grid configuration
-            self.results_frame.grid_rowconfigure(0, weight=1)
-            self.results_frame.grid_columnconfigure(0, weight=1)
-        
-            self.scrollable_frame = ctk.CTkScrollableFrame(self.results_frame, fg_color="#1a1a1a", height=150)
-            self.scrollable_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-    
-        #Clear previous content
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        
-        #Display error message
-        error_label = ctk.CTkLabel(self.scrollable_frame, text="No locations found. Try a more specific search.", text_color="#ff6b6b", font=("Arial", 11))
-        error_label.pack(pady=10)
-        
-    def add_marker_at_center(self) -> None:
-        #Add a marker at the current center of the map view.
-        position = self.map_widget.get_position()
-        marker_text = f"Marker {len(self.map_widget.canvas_marker_list) + 1}"
-        self.map_widget.set_marker(position[0], position[1], text=marker_text)
-        
-    def clear_all_markers(self) -> None:
-        #Remove all markers from the map.
-        for marker in self.map_widget.canvas_marker_list:
-            marker.delete()
-    def __init__(self, parent, width: int = 400, height: int = 250):
-        #Initialise the map widget with specified dimensions.
-        
-       #Args: parent: The parent widget, width (int): Width of the map widget in pixels, height (int): Height of the map widget in pixels
-        super().__init__(parent)
-        
-        #Configure the map widget appearance
-        self.configure(fg_color="#2a2a2a", corner_radius=6, border_width=1, border_color="#000000")
-        
-        #Set up grid configuration for proper widget layout
-        self.grid_rowconfigure(0, weight=1) 
-        self.grid_rowconfigure(1, weight=0)  
-        self.grid_rowconfigure(2, weight=1)  
-        self.grid_columnconfigure(0, weight=1)  
-        
-        #Initialise all map components
-        self.setup_geocoder()
-        self.setup_map(width, height)
-        self.setup_map_controls()
 
 class OutingPlanner:
     #Core planning engine that handles location search, distance calculation,
@@ -507,26 +3465,58 @@ class OutingPlanner:
     
     def __init__(self):
         #Initialise the outing planner with geocoding capabilities.
-        self.geocoder = Nominatim(user_agent="outerinator_app/1.0")
-        self.geocode_cache = {}
+        self.geocoding = GeocodingService.shared()
+        self.geocode_cache = GeocodeCache()
+        self.gazetteer = Gazetteer()
+        self.overpass_cache = OverpassCache()
+        self.overpass_endpoints = OverpassEndpointPool()
+        self.local_places = LocalPlaceStore()
+        self.classifier = PlaceClassifier()
+        self.opening_hours = OpeningHoursParser()
+        self.place_tags = {}  #(osm type, osm id) -> tags for the places from the last search
+        self.travel_matrix_cache = None  #(candidate signature, matrix) from the last planning run
+        self.last_search_stats = None  #Route optimiser results from the last planning run
+        self.last_query_status = None  #'ok', 'stale', 'unavailable' or 'error' for the last place search
+        self.last_query_source = None  #'overpass' or 'local' for the last place search
+        self.exact_solver_max_candidates = exact_solver_max_candidates
+        self.exact_solver_time_budget = exact_solver_time_budget
+        self.parallel_search = parallel_search_enabled
+        self.parallel_search_workers = os.cpu_count() or 1
+        self.parallel_search_starts = parallel_search_starts
+        self.parallel_search_budget = parallel_search_budget
+        self.search_pool = None  #Process pool created on first parallel search
         
     def geocode_location(self, location_name: str) -> Tuple[float, float]:
         #Check cache first
-        if location_name in self.geocode_cache:
-            return self.geocode_cache[location_name]
+        hit, coords = self.geocode_cache.get(location_name)
+        if hit:
+            return coords if coords is not None else default_start_coords
+
+        #Then the offline gazetteer, before going to Nominatim
+        coords = self.gazetteer.geocode(location_name)
+        if coords:
+            self.geocode_cache.put(location_name, coords)
+            return coords
+        if place_source == 'offline':
+            return default_start_coords
         
         try:
-            location = self.geocoder.geocode(location_name)
-            if location:
-                coords = (location.latitude, location.longitude)
-                self.geocode_cache[location_name] = coords
+            results = self.geocoding.search(location_name, 1, geocode_priority_background)
+            if results:
+                coords = (float(results[0]['lat']), float(results[0]['lon']))
+                self.geocode_cache.put(location_name, coords)
+                self.gazetteer.learn(location_name, results)
                 return coords
+            #Nominatim answered but knows no such place
+            self.geocode_cache.put(location_name, None)
         except Exception:
-            pass
+            #Network errors are not cached so the next plan tries again,
+            #meanwhile an expired answer is better than the default location
+            hit, coords = self.geocode_cache.get(location_name, include_expired=True)
+            if hit and coords is not None:
+                return coords
         
-        default = (-36.8509, 174.7645)
-        self.geocode_cache[location_name] = default
-        return default
+        return default_start_coords
     
     def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         #Calculate great-circle distance between two points using Haversine formula.
@@ -551,65 +3541,352 @@ class OutingPlanner:
         c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
         
         return R * c  #Distance in kilometers
+
+    def calculate_distances(self, lat1, lon1, lat2, lon2) -> np.ndarray:
+        #Vectorised version of calculate_distance using the same Haversine formula.
+        #Arguments may be scalars or arrays and broadcast like NumPy, so one origin against
+        #many destinations and two equal-length coordinate arrays are both supported.
+
+        #Args: lat1, lon1: Starting point latitude(s) and longitude(s), lat2, lon2: Ending point latitude(s) and longitude(s)
+
+        #Returns: np.ndarray: Distances in kilometers
+        R = 6371  #Earth's radius in kilometers
+
+        lat1_rad = np.radians(np.asarray(lat1, dtype=np.float64))
+        lat2_rad = np.radians(np.asarray(lat2, dtype=np.float64))
+        delta_lat = lat2_rad - lat1_rad
+        delta_lon = np.radians(np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64))
+
+        a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon / 2) ** 2
+        #Rounding can push a fractionally above 1 for antipodal points
+        a = np.clip(a, 0.0, 1.0)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+        return R * c
     
+    def lat_lon_to_tile(self, lat: float, lon: float, zoom: int = None) -> Tuple[int, int]:
+        #Convert coordinates to slippy-map tile indices on the fixed fetch grid.
+
+        #Args: lat (float): Latitude, lon (float): Longitude, zoom (int): Tile zoom level, defaults to overpass_tile_zoom
+
+        #Returns: Tuple[int, int]: (x, y) tile indices
+        zoom = overpass_tile_zoom if zoom is None else zoom
+        n = 2 ** zoom
+        lat = max(min(lat, 85.0511), -85.0511)
+        lat_rad = math.radians(lat)
+        x = int((lon + 180.0) / 360.0 * n)
+        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    def tile_bounds(self, x: int, y: int, zoom: int = None) -> Tuple[float, float, float, float]:
+        #Get the bbox covered by a slippy-map tile.
+
+        #Args: x (int): Tile column, y (int): Tile row, zoom (int): Tile zoom level, defaults to overpass_tile_zoom
+
+        #Returns: Tuple[float, float, float, float]: (min_lat, min_lon, max_lat, max_lon)
+        zoom = overpass_tile_zoom if zoom is None else zoom
+        n = 2 ** zoom
+        min_lon = x / n * 360.0 - 180.0
+        max_lon = (x + 1) / n * 360.0 - 180.0
+        max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+        min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+        return min_lat, min_lon, max_lat, max_lon
+
+    def calculate_bounding_box(self, center_lat: float, center_lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+        #Args: center_lat (float): Latitude of the center point, center_lon (float): Longitude of the center point, radius_km (float): Search radius in kilometers
+
+        #Returns: Tuple[float, float, float, float]: (min_lat, min_lon, max_lat, max_lon) of the square around the search circle
+        radius_deg = radius_km / 111.0
+        lon_radius_deg = radius_deg / max(math.cos(math.radians(center_lat)), 1e-6)
+        return center_lat - radius_deg, center_lon - lon_radius_deg, center_lat + radius_deg, center_lon + lon_radius_deg
+
+    def get_tiles_for_area(self, center_lat: float, center_lon: float, radius_km: float) -> List[Tuple[int, int]]:
+        #List the fetch grid tiles that cover a search radius around a point.
+
+        #Args: center_lat (float): Latitude of the center point, center_lon (float): Longitude of the center point, radius_km (float): Search radius in kilometers
+
+        #Returns: List[Tuple[int, int]]: (x, y) indices of every covering tile
+        min_lat, min_lon, max_lat, max_lon = self.calculate_bounding_box(center_lat, center_lon, radius_km)
+
+        #Tile rows count downwards from the north, so max_lat gives the smallest y
+        min_x, min_y = self.lat_lon_to_tile(max_lat, min_lon)
+        max_x, max_y = self.lat_lon_to_tile(min_lat, max_lon)
+
+        return [(x, y) for y in range(min_y, max_y + 1) for x in range(min_x, max_x + 1)]
+
+    def group_missing_tiles(self, missing_tiles: List[Tuple[int, int]]) -> List[Tuple[int, int, int, int]]:
+        #Split the tiles to download into rectangles holding only those tiles.
+        #Each row is cut into runs of adjacent tiles, and a run spanning the same columns
+        #as one on the row above extends that rectangle, so a wholly uncached area is
+        #still one download while an L-shaped strip never re-fetches the cached corner.
+
+        #Args: missing_tiles (List[Tuple[int, int]]): (x, y) indices of tiles not in the cache
+
+        #Returns: List[Tuple[int, int, int, int]]: (min_x, min_y, max_x, max_y) of each rectangle
+        rows = {}
+        for x, y in missing_tiles:
+            rows.setdefault(y, []).append(x)
+
+        rectangles = []
+        open_runs = {}  #(min_x, max_x) -> index of the rectangle that run ended on the previous row
+        for y in sorted(rows):
+            xs = sorted(set(rows[y]))
+            runs = []
+            start = xs[0]
+            for previous, x in zip(xs, xs[1:] + [None]):
+                if x is None or x != previous + 1:
+                    runs.append((start, previous))
+                    start = x
+
+            row_runs = {}
+            for min_x, max_x in runs:
+                index = open_runs.get((min_x, max_x))
+                if index is not None and rectangles[index][3] == y - 1:
+                    rectangles[index] = (min_x, rectangles[index][1], max_x, y)
+                else:
+                    index = len(rectangles)
+                    rectangles.append((min_x, y, max_x, y))
+                row_runs[(min_x, max_x)] = index
+            open_runs = row_runs
+        return rectangles
+
     def query_osm_places(self, center_lat: float, center_lon: float, radius_km: float, tags: List[str]) -> List[Dict]:
     #Query OpenStreetMap Overpass API for places within radius_km
     #that match any of the given tag filters.
+    #The area is snapped to a fixed grid of map tiles so overlapping searches reuse
+    #tiles that are already cached and only the missing tiles are downloaded.
+    #If Overpass is unavailable, expired tiles still in the cache are used instead and
+    #last_query_status says so, so an outage is not mistaken for an empty area.
+    #Searches lying wholly inside one imported extract are answered locally instead, see place_source.
     
     #Args: center_lat (float): Latitude of the center point, center_lon (float): Longitude of the center point, radius_km (float): Search radius in kilometers, tags (List[str]): List of OSM tag patterns to filter places
     
+        self.last_query_status = 'ok'
+        if place_source == 'offline' or (place_source == 'auto' and self.local_places.covers(self.calculate_bounding_box(center_lat, center_lon, radius_km))):
+            return self.query_local_places(center_lat, center_lon, radius_km, tags)
+
+        self.last_query_source = 'overpass'
         try:
-            radius_deg = radius_km / 111.0
-            min_lat, max_lat = center_lat - radius_deg, center_lat + radius_deg
-            min_lon = center_lon - radius_deg / math.cos(math.radians(center_lat))
-            max_lon = center_lon + radius_deg / math.cos(math.radians(center_lat))
-
-            #Build Overpass query for ALL tag patterns from ALL selected categories
-            overpass_parts = []
-        
-            #Process each tag category
-            for tag_category in tags:
-                #Split by | to get individual tags
-                individual_tags = tag_category.split('|')
-                
-                for tag_part in individual_tags:
-                    tag_part = tag_part.strip()
-                    if '=' in tag_part:
-                        key, value = tag_part.split('=', 1)
-                        key = key.strip()
-                        value = value.strip()
-                    
-                        #Add queries for nodes, ways, and relations
-                        overpass_parts.append(
-                            f'node["{key}"="{value}"]({min_lat},{min_lon},{max_lat},{max_lon});'
-                        )
-                        overpass_parts.append(
-                            f'way["{key}"="{value}"]({min_lat},{min_lon},{max_lat},{max_lon});'
-                        )
-                        overpass_parts.append(
-                            f'relation["{key}"="{value}"]({min_lat},{min_lon},{max_lat},{max_lon});'
-                        )
+            tiles = self.get_tiles_for_area(center_lat, center_lon, radius_km)
+            tile_keys = {tile: OverpassCache.make_tile_key(overpass_tile_zoom, tile[0], tile[1], tags) for tile in tiles}
 
-            if not overpass_parts:
-                return []
+            elements_by_tile = self.overpass_cache.get_many(list(tile_keys.values()))
+            missing_tiles = [tile for tile in tiles if tile_keys[tile] not in elements_by_tile]
 
-            #Combine all parts into a single union query
-            overpass_query = "[out:json][timeout:30];(" + "".join(overpass_parts) + ");out center;"
-        
-            response = requests.post(
-                "https://overpass-api.de/api/interpreter",
-                data=overpass_query,
-                headers={'User-Agent': 'OuterinatorApp/1.0'},
-                timeout=30
-            )
+            #Download each rectangle of missing tiles, leaving the cached tiles alone
+            unavailable_tiles = []
+            for min_x, min_y, max_x, max_y in self.group_missing_tiles(missing_tiles):
+                min_lat, min_lon, _, _ = self.tile_bounds(min_x, max_y)
+                _, _, max_lat, max_lon = self.tile_bounds(max_x, min_y)
+                rectangle_tiles = [(x, y) for y in range(min_y, max_y + 1) for x in range(min_x, max_x + 1)]
 
-            if response.status_code == 200:
-                return response.json().get('elements', [])
-            else:
-                return []
+                try:
+                    fetched_elements = self.fetch_osm_area((min_lat, min_lon, max_lat, max_lon), tags)
+                except ServiceUnavailable:
+                    unavailable_tiles.extend(rectangle_tiles)
+                    continue
+
+                if fetched_elements is not None:
+                    #Split the download back into tiles so each can be reused on its own
+                    fetched_by_tile = {tile: [] for tile in rectangle_tiles}
+                    for element in fetched_elements:
+                        coords = self.get_place_coordinates(element)
+                        if not coords:
+                            continue
+                        tile = self.lat_lon_to_tile(coords[0], coords[1])
+                        if tile in fetched_by_tile:
+                            fetched_by_tile[tile].append(element)
+
+                    new_entries = {OverpassCache.make_tile_key(overpass_tile_zoom, tile[0], tile[1], tags): tile_elements for tile, tile_elements in fetched_by_tile.items()}
+                    self.overpass_cache.put_many(new_entries)
+                    elements_by_tile.update(new_entries)
+                    #Keep downloaded places for offline planning too
+                    try:
+                        self.local_places.add_elements(fetched_elements)
+                    except sqlite3.Error:
+                        pass
+
+            if unavailable_tiles:
+                stale_tiles = self.overpass_cache.get_many([tile_keys[tile] for tile in unavailable_tiles], include_stale=True)
+                elements_by_tile.update(stale_tiles)
+                self.last_query_status = 'stale' if stale_tiles else 'unavailable'
+
+            #Merge the tiles, dropping elements that appear in more than one
+            places = []
+            seen_ids = set()
+            for tile in tiles:
+                for element in elements_by_tile.get(tile_keys[tile], []):
+                    element_id = (element.get('type'), element.get('id'))
+                    if element_id in seen_ids:
+                        continue
+                    seen_ids.add(element_id)
+                    places.append(element)
+
+            #Tiles are square, so trim the corners back to the requested circle
+            return self.filter_places_within_radius(self.ingest_places(places), center_lat, center_lon, radius_km)
 
         except Exception:
+            self.last_query_status = 'error'
+            return []
+
+    def query_local_places(self, center_lat: float, center_lon: float, radius_km: float, tags: List[str]) -> List[PlaceRecord]:
+        #Answer query_osm_places from the imported extracts without any network.
+
+        #Args: center_lat (float): Latitude of the center point, center_lon (float): Longitude of the center point, radius_km (float): Search radius in kilometers, tags (List[str]): List of OSM tag patterns to filter places
+
+        #Returns: List[PlaceRecord]: Matching places inside the radius
+        self.last_query_source = 'local'
+        try:
+            places = self.local_places.query(self.calculate_bounding_box(center_lat, center_lon, radius_km), self.parse_osm_tags(tags))
+        except (sqlite3.Error, ValueError):
+            self.last_query_status = 'error'
             return []
+        return self.filter_places_within_radius(self.ingest_places(places), center_lat, center_lon, radius_km)
+
+    def filter_places_within_radius(self, places: List[PlaceRecord], center_lat: float, center_lon: float, radius_km: float) -> List[PlaceRecord]:
+        #Drop places further than radius_km from the center along the great circle.
+        #Distances for all candidates are computed in one vectorised pass.
+
+        #Args: places (List[PlaceRecord]): Places from ingest_places, center_lat (float): Latitude of the center point, center_lon (float): Longitude of the center point, radius_km (float): Search radius in kilometers
+
+        #Returns: List[PlaceRecord]: Places inside the circle
+        if not places:
+            return []
+
+        lats = np.fromiter((place.lat for place in places), dtype=np.float64, count=len(places))
+        lons = np.fromiter((place.lon for place in places), dtype=np.float64, count=len(places))
+        distances = self.calculate_distances(center_lat, center_lon, lats, lons)
+
+        return [places[i] for i in np.flatnonzero(distances <= radius_km)]
+
+    def ingest_places(self, places: List[Dict]) -> List[PlaceRecord]:
+        #Convert OSM elements into PlaceRecords, once per search.
+        #Tags are moved into self.place_tags keyed by OSM id, replacing the previous
+        #search's tags, so they stay available through get_place_tags without every
+        #candidate and itinerary item holding on to its own dict.
+
+        #Args: places (List[Dict]): OSM place data
+
+        #Returns: List[PlaceRecord]: One record per element with a name and coordinates
+        records = []
+        place_tags = {}
+
+        for place in places:
+            if isinstance(place, PlaceRecord):
+                records.append(place)
+                continue
+
+            tags = place.get('tags', {})
+            place_name = tags.get('name', '')
+            if not place_name or place_name in ['None', 'null']:
+                continue
+
+            place_coords = self.get_place_coordinates(place)
+            if not place_coords:
+                continue
+
+            record = PlaceRecord(place.get('type'), place.get('id'), place_coords[0], place_coords[1], place_name, self.get_place_type(place), tags.get('opening_hours'))
+            place_tags[record.key] = tags
+            records.append(record)
+
+        self.place_tags = place_tags
+        return records
+
+    def get_place_tags(self, osm_type: str, osm_id: int) -> Dict[str, str]:
+        #Look up the OSM tags of a place from the last search.
+
+        #Args: osm_type (str): OSM element type, osm_id (int): OSM element id
+
+        #Returns: Dict[str, str]: The place's tags, or an empty dict if it is not known
+        return self.place_tags.get((osm_type, osm_id), {})
+
+    def parse_osm_tags(self, tags: List[str]) -> Dict[str, List[str]]:
+        #Collect the tag patterns from every selected category, grouped by key.
+        #Pairs shared between categories (e.g. amenity=restaurant in Food and Romantic) appear once.
+
+        #Args: tags (List[str]): List of OSM tag patterns such as "amenity=cafe|leisure=park"
+
+        #Returns: Dict[str, List[str]]: Sorted, de-duplicated values for each key
+        values_by_key = {}
+        for tag_category in tags:
+            #Split by | to get individual tags
+            for tag_part in tag_category.split('|'):
+                if '=' in tag_part:
+                    key, value = tag_part.split('=', 1)
+                    values_by_key.setdefault(key.strip(), set()).add(value.strip())
+
+        return {key: sorted(values) for key, values in sorted(values_by_key.items())}
+
+    def compile_overpass_query(self, bbox: Tuple[float, float, float, float], tags: List[str]) -> Optional[str]:
+        #Compile the tag filters into a compact Overpass QL union.
+        #Emits one nwr statement per key, matching all of its values with a single anchored
+        #regex alternation, and sets the bbox once globally instead of on every statement.
+
+        #Args: bbox (Tuple): (min_lat, min_lon, max_lat, max_lon) to search, tags (List[str]): List of OSM tag patterns to filter places
+
+        #Returns: Optional[str]: Overpass QL query, or None if no usable tag patterns were given
+        values_by_key = self.parse_osm_tags(tags)
+        if not values_by_key:
+            return None
+
+        min_lat, min_lon, max_lat, max_lon = bbox
+        statements = []
+        for key, values in values_by_key.items():
+            key_text = key.replace('\\', '\\\\').replace('"', '\\"')
+            if len(values) == 1:
+                #Exact match lets the server use its tag index directly
+                value_text = values[0].replace('\\', '\\\\').replace('"', '\\"')
+                statements.append(f'nwr["{key_text}"="{value_text}"];')
+            else:
+                pattern = "|".join(re.escape(value).replace('\\', '\\\\').replace('"', '\\"') for value in values)
+                statements.append(f'nwr["{key_text}"~"^({pattern})$"];')
+
+        return f"[out:json][timeout:30][bbox:{min_lat},{min_lon},{max_lat},{max_lon}];(" + "".join(statements) + ");out center;"
+
+    def fetch_osm_area(self, bbox: Tuple[float, float, float, float], tags: List[str]) -> Optional[List[Dict]]:
+        #Download every element matching the tag filters inside a bbox from Overpass.
+
+        #Args: bbox (Tuple): (min_lat, min_lon, max_lat, max_lon) to search, tags (List[str]): List of OSM tag patterns to filter places
+
+        #Returns: Optional[List[Dict]]: Overpass elements, raises ServiceUnavailable if Overpass is overloaded or unreachable
+        overpass_query = self.compile_overpass_query(bbox, tags)
+        if not overpass_query:
+            return []
+
+        #The endpoint pool picks mirrors and hedges slow requests
+        return self.overpass_endpoints.fetch(lambda url, cancel: self.fetch_overpass_query(url, overpass_query, cancel))
+
+    def fetch_overpass_query(self, url: str, overpass_query: str, cancel: Optional[threading.Event] = None) -> Optional[List[Dict]]:
+        #Run an Overpass query against one endpoint.
+
+        #Args: url (str): Overpass interpreter URL, overpass_query (str): Overpass QL, cancel (Optional[threading.Event]): Set when another endpoint has already answered
+
+        #Returns: Optional[List[Dict]]: Overpass elements, or None if cancelled; raises RetryableError on an overload or incomplete result
+        #Stream the body through the incremental parser instead of loading it whole
+        parser = OverpassStreamParser()
+        elements = []
+        with PooledSession.shared('overpass').post(
+            url,
+            data=overpass_query,
+            stream=True
+        ) as response:
+            RetryPolicy.check(response)
+            if response.status_code != 200:
+                raise RuntimeError(f"API returned status: {response.status_code}")
+
+            for chunk in response.iter_content(chunk_size=overpass_chunk_bytes):
+                if cancel is not None and cancel.is_set():
+                    return None
+                elements.extend(parser.feed(chunk))
+        elements.extend(parser.close())
+
+        #Overpass reports server-side timeouts as a remark on a 200 response,
+        #so partial or truncated results are not treated as complete tiles
+        if cancel is not None and cancel.is_set():
+            return None
+        if not parser.complete or parser.remark:
+            raise RetryableError(f"Overpass returned an incomplete result: {parser.remark or 'truncated response'}")
+        return elements
     
     def estimate_activity_duration(self, place_type: str) -> float:
         #Estimate typical duration for different types of activities.
@@ -618,72 +3895,131 @@ class OutingPlanner:
             
         #Returns: float: Estimated duration in hours
         
-        #Duration mapping for common activity types
-        duration_map = {
-            'park': 2.0, 'garden': 1.5, 'viewpoint': 0.5,
-            'restaurant': 1.5, 'cafe': 1.0, 'bar': 2.0,
-            'cinema': 3.0, 'theatre': 2.5,
-            'museum': 2.0, 'gallery': 1.5, 'library': 1.0,
-            'playground': 1.0, 'sports_centre': 2.0,
-            'zoo': 3.0, 'aquarium': 2.0,
-            'mall': 2.0, 'shop': 1.0,
-            'arcade': 2.0, 'adventure_park': 3.0
-        }
-        
-        #Find matching duration or return default
-        for key, duration in duration_map.items():
-            if key in place_type:
-                return duration
-                
-        return 1.5  #Default duration for unknown types
+        #Durations come from place_type_durations via the compiled classifier
+        return self.classifier.duration(place_type)
     
-    def create_optimal_itinerary(self, places: List[Dict], start_coords: Tuple[float, float], outing_start: datetime, outing_end: datetime) -> List[Dict]:
+    def prepare_candidates(self, places: List[PlaceRecord], start_coords: Tuple[float, float]) -> List[Dict]:
+        #Filter and categorise places into the candidate set used for scheduling.
+        #Places sharing a name are reduced to the one nearest the start, whatever its type,
+        #then the closest travel_matrix_max_per_category places of each type are kept so
+        #the travel-time matrix stays memory-bounded.
+
+        #Args: places (List[PlaceRecord]): Available places to visit, start_coords (Tuple[float, float]): Starting location coordinates
+
+        #Returns: List[Dict]: Candidates sorted by category then distance, each with its travel-time matrix 'index'
+        if not places:
+            return []
+
+        #Distance from the start to every candidate in one vectorised call
+        lats = np.fromiter((place.lat for place in places), dtype=np.float64, count=len(places))
+        lons = np.fromiter((place.lon for place in places), dtype=np.float64, count=len(places))
+        start_distances = self.calculate_distances(start_coords[0], start_coords[1], lats, lons) * 1.4
+
+        #Categorise places nearest first, keeping the nearest place of each name
+        places_by_category = {}
+        seen_names = set()
+
+        for index in np.argsort(start_distances, kind='stable').tolist():
+            place = places[index]
+            if place.name in seen_names:
+                continue
+            seen_names.add(place.name)
+
+            category_places = places_by_category.setdefault(place.place_type, [])
+            if len(category_places) >= travel_matrix_max_per_category:
+                continue
+            category_places.append({
+                'place': place,
+                'distance': float(start_distances[index]),
+                'coords': place.coords,
+                'type': place.place_type,
+                'name': place.name
+            })
+
+        candidates = [place_data for category in sorted(places_by_category) for place_data in places_by_category[category]]
+
+        #Row/column 0 of the travel-time matrix is the start point
+        for index, place_data in enumerate(candidates, start=1):
+            place_data['index'] = index
+
+        return candidates
+
+    def build_travel_time_matrix(self, coords: np.ndarray) -> np.ndarray:
+        #Build a dense matrix of travel times between every pair of points.
+        #Uses the planner's road model: straight-line distance x1.4 at 25 km/h plus 5 minutes.
+        #Rows are computed in blocks so temporary float arrays stay small for large sets.
+
+        #Args: coords (np.ndarray): (N, 2) array of (lat, lon) points
+
+        #Returns: np.ndarray: (N, N) int32 array of travel times in whole minutes
+        count = len(coords)
+        matrix = np.empty((count, count), dtype=np.int32)
+
+        for start in range(0, count, travel_matrix_block_rows):
+            block = coords[start:start + travel_matrix_block_rows]
+            distances = self.calculate_distances(block[:, 0:1], block[:, 1:2], coords[:, 0], coords[:, 1])
+            matrix[start:start + len(block)] = np.rint((distances * 1.4 / 25.0) * 60 + 5)
+
+        #Staying put costs nothing
+        np.fill_diagonal(matrix, 0)
+        return matrix
+
+    def get_travel_time_matrix(self, start_coords: Tuple[float, float], candidates: List[Dict]) -> np.ndarray:
+        #Get the travel-time matrix for a candidate set, reusing the last one if nothing changed.
+        #Replanning the same search with a different time window then skips the distance work.
+
+        #Args: start_coords (Tuple[float, float]): Starting location coordinates, candidates (List[Dict]): Candidates from prepare_candidates
+
+        #Returns: np.ndarray: Travel-time matrix with the start point at index 0
+        matrix_key = (tuple(start_coords), tuple((c['place'].osm_type, c['place'].osm_id, c['name']) for c in candidates))
+        if self.travel_matrix_cache and self.travel_matrix_cache[0] == matrix_key:
+            return self.travel_matrix_cache[1]
+
+        coords = np.asarray([start_coords] + [c['coords'] for c in candidates], dtype=np.float64)
+        matrix = self.build_travel_time_matrix(coords)
+        self.travel_matrix_cache = (matrix_key, matrix)
+        return matrix
+
+    def create_optimal_itinerary(self, places: List[PlaceRecord], start_coords: Tuple[float, float], outing_start: datetime, outing_end: datetime) -> List[Dict]:
     #Create optimized itinerary considering travel time and activity duration.
     #Ensures diversity by mixing different place categories.
     
-    #Args: places (List[Dict]): Available places to visit, start_coords (Tuple[float, float]): Starting location coordinates, outing_start (datetime): Outing start time, outing_end (datetime): Outing end time
+    #Args: places (List[PlaceRecord]): Available places to visit (raw OSM dicts are ingested first), start_coords (Tuple[float, float]): Starting location coordinates, outing_start (datetime): Outing start time, outing_end (datetime): Outing end time
         
     #Returns: List[Dict]: Optimized itinerary with timing information
 
+        self.last_search_stats = None
         if not places:
             return []
-    
-        itinerary = []
-        current_time = outing_start
-        current_location = start_coords
 
-        #Filter and categorise places
-        places_by_category = {}
+        if not all(isinstance(place, PlaceRecord) for place in places):
+            places = self.ingest_places(places)
 
-        for place in places:
-            place_name = place.get('tags', {}).get('name', '')
-            if not place_name or place_name in ['', 'None', 'null']:
-                continue
-                
-            place_coords = self.get_place_coordinates(place)
-            if not place_coords:
-                continue
-                
-            straight_distance = self.calculate_distance(start_coords[0], start_coords[1], place_coords[0], place_coords[1])
-            realistic_distance = straight_distance * 1.4
+        window_minutes = int((outing_end - outing_start).total_seconds() // 60)
 
-            place_type = self.get_place_type(place)
+        #Drop places closed for the whole outing before any distance work.
+        #Windows are worked out once per distinct opening_hours value.
+        windows_by_hours = {}
+        open_places = []
+        for place in places:
+            if place.opening_hours not in windows_by_hours:
+                windows_by_hours[place.opening_hours] = self.opening_hours.windows(place.opening_hours, outing_start, window_minutes)
+            if windows_by_hours[place.opening_hours] != ():
+                open_places.append(place)
+        places = open_places
+    
+        candidates = self.prepare_candidates(places, start_coords)
+        if not candidates:
+            return []
 
-            if place_type not in places_by_category:
-                places_by_category[place_type] = []
+        travel_matrix = self.get_travel_time_matrix(start_coords, candidates)
 
-            places_by_category[place_type].append({
-                'place': place,
-                'distance': realistic_distance,
-                'coords': place_coords,
-                'type': place_type,
-                'name': place_name
-            })
+        places_by_category = {}
+        for place_data in candidates:
+            places_by_category.setdefault(place_data['type'], []).append(place_data)
 
-        #Sort each category by distance, then shuffle top candidates
+        #Shuffle top candidates within each distance-sorted category
         for category in places_by_category:
-            places_by_category[category].sort(key=lambda x: x['distance'])
-
             #Shuffle the top 10 closest places in each category
             #This gives variety while still favoring nearby places
             if len(places_by_category[category]) > 3:
@@ -692,8 +4028,7 @@ class OutingPlanner:
                 random.shuffle(top_section)
                 places_by_category[category] = top_section + rest_section
 
-        #Remove duplicates and create diversified list
-        seen_names = set()
+        #Create diversified list
         unique_places = []
 
         categories = list(places_by_category.keys())
@@ -705,61 +4040,140 @@ class OutingPlanner:
         for i in range(max_iterations):
             for category in categories:
                 if i < len(places_by_category[category]):
-                    place_data = places_by_category[category][i]
-                    if place_data['name'] not in seen_names:
-                        seen_names.add(place_data['name'])
-                        unique_places.append(place_data)
-    
-        #Build itinerary from diversified list of places from chosen categories
-        for place_data in unique_places:
-            if current_time >= outing_end:
-                break
+                    unique_places.append(places_by_category[category][i])
+    
+        #Limit activities by available time
+        total_hours = window_minutes / 60
+        max_activities = min(8, max(3, int(total_hours / 1.5)))
+
+        #Category codes and visit minutes for every candidate in one classifier call
+        type_codes, duration_minutes = self.classifier.classify_types([place_data['type'] for place_data in candidates])
+        durations = [0] + duration_minutes.tolist()
+        types = [-1] + type_codes.tolist()
+        #Index the start (0) and candidates once so the search only looks at nearby places
+        spatial_index = PlaceGridIndex([start_coords] + [place_data['coords'] for place_data in candidates])
+        opening_windows = [None] + [windows_by_hours[place_data['place'].opening_hours] for place_data in candidates]
+        optimizer = ItineraryOptimizer(travel_matrix, durations, types, window_minutes, max_activities, spatial_index=spatial_index, opening_windows=opening_windows)
+
+        #The diversified single pass is kept as the baseline and as a seed for local search
+        baseline_route = optimizer.greedy_route([place_data['index'] for place_data in unique_places])
+
+        #Small candidate sets are solved exactly, larger ones or a blown time budget fall back to the heuristic
+        route = None
+        solver = 'heuristic'
+        if len(candidates) <= self.exact_solver_max_candidates:
+            route = optimizer.solve_exact(self.exact_solver_time_budget)
+            solver = 'exact'
+        if route is None and self.parallel_search:
+            route = self.parallel_optimise(optimizer, [baseline_route])
+            solver = 'parallel'
+        if route is None:
+            route = optimizer.optimise([baseline_route])
+            solver = 'heuristic'
+
+        baseline_travel = optimizer.route_travel(baseline_route)
+        route_travel = optimizer.route_travel(route)
+        #Travel is only comparable over the same number of stops, otherwise dropping a stop would
+        #count as a saving. When the counts differ the chosen stops are taken in the order the
+        #single pass would have tried them instead
+        if len(route) == len(baseline_route):
+            compared_travel = baseline_travel
+        else:
+            pass_order = {place_data['index']: position for position, place_data in enumerate(unique_places)}
+            compared_travel = optimizer.route_travel(sorted(route, key=pass_order.get))
+        self.last_search_stats = {
+            'solver': solver,
+            'candidates': len(candidates),
+            'baseline_stops': len(baseline_route),
+            'baseline_travel_minutes': baseline_travel,
+            'stops': len(route),
+            'travel_minutes': route_travel,
+            'travel_minutes_saved': compared_travel - route_travel
+        }
+
+        return self.build_itinerary(optimizer.schedule(route), candidates, start_coords, outing_start)
+
+    def create_plan(self, start_location: str, start_coords: Tuple[float, float], places: List[PlaceRecord], outing_start: datetime, outing_end: datetime) -> PlanResult:
+        #Plan an outing and package it with everything the results page needs.
+
+        #Args: start_location (str): Start location as shown to the user, start_coords (Tuple[float, float]): Starting location coordinates, places (List[PlaceRecord]): Available places to visit, outing_start (datetime): Outing start time, outing_end (datetime): Outing end time
 
-            #Calculate distance
-            distance = self.calculate_distance(current_location[0], current_location[1], place_data['coords'][0], place_data['coords'][1])
+        #Returns: PlanResult: The plan, with an empty itinerary if nothing fits
+        itinerary = self.create_optimal_itinerary(places, start_coords, outing_start, outing_end)
+        search_stats = self.last_search_stats
+        candidates_considered = search_stats['candidates'] if search_stats else 0
+        return PlanResult(start_location, start_coords, outing_start, outing_end, itinerary, len(places), candidates_considered, search_stats)
 
-            #Apply apply a multiplier to account for roads because I cannot use road maps
-            realistic_distance = distance * 1.4
-            travel_time_hours = (realistic_distance / 25.0) + (5 / 60.0)
-            travel_end_time = current_time + timedelta(hours=travel_time_hours)
+    def parallel_optimise(self, optimizer: ItineraryOptimizer, seed_routes: List[List[int]]) -> Optional[List[int]]:
+        #Run many seeded randomised searches on a process pool and keep the best route.
+        #Seeds are split evenly across one task per worker so the optimizer is only sent once
+        #to each process, and the deterministic search runs here while the workers are busy.
 
-            if travel_end_time >= outing_end:
+        #Args: optimizer (ItineraryOptimizer): Optimizer for this planning run, seed_routes (List[List[int]]): Extra routes to improve locally
+
+        #Returns: Optional[List[int]]: Best route, or None if the pool could not be used
+        deadline = time.time() + self.parallel_search_budget
+        workers = max(1, self.parallel_search_workers)
+        seeds = [random.randrange(2 ** 31) for _ in range(self.parallel_search_starts)]
+
+        try:
+            if self.search_pool is None:
+                #Spawned workers do not inherit the GUI or the planning thread's state
+                self.search_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            futures = [self.search_pool.submit(run_itinerary_search, optimizer, seeds[worker::workers], deadline) for worker in range(workers)]
+        except Exception:
+            self.search_pool = None
+            return None
+
+        best_route = optimizer.optimise(seed_routes)
+        best_rank = optimizer.rank(best_route)
+
+        #Give workers a moment past the deadline to finish the construction they are on
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.time()) + 0.5)
+        for future in not_done:
+            future.cancel()
+
+        for future in done:
+            try:
+                route = future.result()
+            except Exception:
                 continue
+            route_rank = optimizer.rank(route)
+            if route_rank is not None and route_rank > best_rank:
+                best_route, best_rank = route, route_rank
 
-            #Estimate time spent at the location
-            activity_duration = self.estimate_activity_duration(place_data['type'])
-            activity_end_time = travel_end_time + timedelta(hours=activity_duration)
+        return best_route
 
-            #Adjust if it exceeds outing time
-            if activity_end_time > outing_end:
-                remaining_time = (outing_end - travel_end_time).total_seconds() / 3600
-                if remaining_time >= 0.5:
-                    activity_duration = remaining_time
-                    activity_end_time = outing_end
-                else:
-                    continue
+    def build_itinerary(self, stops: List[Tuple[int, int, int, int]], candidates: List[Dict], start_coords: Tuple[float, float], outing_start: datetime) -> List[Dict]:
+        #Turn a scheduled route into the itinerary dicts shown and saved by PlanningFrame.
+
+        #Args: stops (List[Tuple]): (index, travel, start, end) minutes from ItineraryOptimizer.schedule, candidates (List[Dict]): Candidates from prepare_candidates, start_coords (Tuple[float, float]): Starting location coordinates, outing_start (datetime): Outing start time
+
+        #Returns: List[Dict]: Itinerary with timing information
+        itinerary = []
+        stops = stops or []
+
+        #Every leg at once, from the start or previous stop to the next stop
+        coords = np.asarray([start_coords] + [candidates[index - 1]['coords'] for index, _, _, _ in stops], dtype=np.float64)
+        #Apply apply a multiplier to account for roads because I cannot use road maps
+        leg_distances = self.calculate_distances(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1]) * 1.4
+
+        for leg, (index, travel_minutes, arrival, departure) in enumerate(stops):
+            place_data = candidates[index - 1]
+            realistic_distance = float(leg_distances[leg])
 
             itinerary.append({
                 'place': place_data['place'],
-                'start_time': travel_end_time,
-                'end_time': activity_end_time,
+                'start_time': outing_start + timedelta(minutes=arrival),
+                'end_time': outing_start + timedelta(minutes=departure),
                 'activity': place_data['name'],
                 'type': place_data['type'],
-                'duration': activity_duration,
-                'travel_time': travel_time_hours,
+                'duration': (departure - arrival) / 60.0,
+                'travel_time': travel_minutes / 60.0,
                 'coordinates': place_data['coords'],
                 'distance': realistic_distance
             })
 
-            current_time = activity_end_time
-            current_location = place_data['coords']
-
-            #Limit activities by available time
-            total_hours = (outing_end - outing_start).total_seconds() / 3600
-            max_activities = min(8, max(3, int(total_hours / 1.5)))
-
-            if len(itinerary) >= max_activities:
-                break
         return itinerary
 
     def get_place_coordinates(self, place: Dict) -> Optional[Tuple[float, float]]:
@@ -789,12 +4203,8 @@ class OutingPlanner:
             
         #Returns: str: Place type identifier
         
-        tags = place.get('tags', {})
         #Check common OSM tag categories for place type
-        for key in ['leisure', 'amenity', 'tourism', 'shop', 'sport']:
-            if key in tags:
-                return tags[key]
-        return 'unknown'
+        return self.classifier.place_type(place.get('tags', {}))
 
 
 class OpeningFrame(ctk.CTkFrame):
@@ -1447,17 +4857,17 @@ class MainPageFrame(ctk.CTkFrame):
         with sqlite3.connect("outerinator.db") as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT plan_name, start_location, date, start_time, end_time, details
+                SELECT plan_name, start_location, date, start_time, end_time, details, plan_data
                 FROM plans WHERE id = ?
             """, (plan_id,))
             
             plan = cursor.fetchone()
                 
             if plan:
-                plan_name, start_location, plan_date, start_time, end_time, details = plan
-                self.show_plan_popup(plan_id, plan_name, start_location, plan_date, start_time, end_time, details)
+                plan_name, start_location, plan_date, start_time, end_time, details, plan_data = plan
+                self.show_plan_popup(plan_id, plan_name, start_location, plan_date, start_time, end_time, details, plan_data)
     
-    def show_plan_popup(self, plan_id, plan_name, start_location, plan_date, start_time, end_time, details):
+    def show_plan_popup(self, plan_id, plan_name, start_location, plan_date, start_time, end_time, details, plan_data=None):
         #Show plan details in a popup.
         popup = ctk.CTkToplevel(self)
         popup.title(f"Plan Details: {plan_name}")
@@ -1494,6 +4904,11 @@ class MainPageFrame(ctk.CTkFrame):
         info_label = ctk.CTkLabel(content, text=info_text, font=("Open Sans", 11), justify="left", anchor="w")
         info_label.pack(fill="both", padx=10, pady=10)
         
+        #Plans saved with their coordinates can be shown on the map again
+        if plan_data:
+            map_btn = ctk.CTkButton(popup, text="🗺️ Show on Map", command=lambda data=plan_data, pop=popup: self.open_saved_plan(data, pop), fg_color="#4CAF50", hover_color="#45a049", height=40, font=("Open Sans", 12, "bold"))
+            map_btn.pack(pady=(10, 0), padx=20, fill="x")
+
         #Close button
         close_btn = ctk.CTkButton(popup, text="Close", command=popup.destroy, fg_color="#007acc", hover_color="#005a99", height=40, font=("Open Sans", 12, "bold"))
         close_btn.pack(pady=10, padx=20, fill="x")
@@ -1502,6 +4917,17 @@ class MainPageFrame(ctk.CTkFrame):
         delete_button = ctk.CTkButton(popup, text="🗑️ Delete This Plan", fg_color="#b30000", hover_color="#800000", command=lambda pid=plan_id, pop=popup: self.show_delete_confirmation_by_id(pid, pop))
         delete_button.pack(pady=(10, 20))
     
+    def open_saved_plan(self, plan_data, popup):
+        #Reopen a saved plan on the planning page from its stored coordinates.
+        try:
+            plan = PlanResult.from_json(plan_data)
+        except (ValueError, KeyError, TypeError):
+            self.show_info_popup("Plan Unavailable", "This plan's map data could not be read.")
+            return
+        popup.destroy()
+        self.controller.show_frame("PlanningFrame")
+        self.controller.frames["PlanningFrame"].display_final_plan(plan)
+
     def show_plans_for_date(self, selected_date):
         if not self.controller.current_user_id:
             return
@@ -1509,7 +4935,7 @@ class MainPageFrame(ctk.CTkFrame):
         with sqlite3.connect("outerinator.db") as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, plan_name, start_location, start_time, end_time, details
+                SELECT id, plan_name, start_location, start_time, end_time, details, plan_data
                 FROM plans
                 WHERE user_id = ? AND date = ?
             """, (self.controller.current_user_id, selected_date.strftime("%Y-%m-%d")))
@@ -1517,9 +4943,9 @@ class MainPageFrame(ctk.CTkFrame):
             plans = cursor.fetchall()
 
         if plans:
-            plan_id, plan_name, start_location, start_time, end_time, details = plans[0]
+            plan_id, plan_name, start_location, start_time, end_time, details, plan_data = plans[0]
             plan_date = selected_date.strftime("%Y-%m-%d")
-            self.show_plan_popup(plan_id, plan_name, start_location, plan_date, start_time, end_time, details)
+            self.show_plan_popup(plan_id, plan_name, start_location, plan_date, start_time, end_time, details, plan_data)
         else:
             self.show_info_popup("No Plans", f"No plans scheduled for {selected_date.strftime('%d %B %Y')}")
  
@@ -1910,8 +5336,16 @@ class PlanningFrame(ctk.CTkFrame):
             places = self.planner.query_osm_places(start_coords[0], start_coords[1], max_distance, osm_tags)
             
             if not places:
-                self.show_message("No places found matching your criteria. Try increasing distance or changing activity type.")
+                #An outage is not an empty area, so don't send the user off to change their criteria
+                if self.planner.last_query_status == 'unavailable':
+                    self.show_message("OpenStreetMap is busy right now. Please wait a minute before planning again.")
+                elif self.planner.last_query_status == 'error':
+                    self.show_message("Couldn't search OpenStreetMap for places. Check your connection and try again.")
+                else:
+                    self.show_message("No places found matching your criteria. Try increasing distance or changing activity type.")
                 return
+            if self.planner.last_query_status == 'stale':
+                self.update_results("⚠️ OpenStreetMap is busy, using saved place data...")
             
             #Step 4: Prepare datetime objects for scheduling
             self.update_results("📅 Creating your itinerary...")
@@ -1925,14 +5359,14 @@ class PlanningFrame(ctk.CTkFrame):
             
             #Step 5: Generate optimized itinerary
             self.update_results("📅 Creating your perfect itinerary...")
-            itinerary = self.planner.create_optimal_itinerary(places, start_coords, outing_start, outing_end)
+            plan = self.planner.create_plan(start_location, start_coords, places, outing_start, outing_end)
             
-            if not itinerary:
+            if not plan.itinerary:
                 self.show_message("Couldn't create a feasible itinerary. Try adjusting your criteria.")
                 return
             
             #Step 6: Display final plan to user
-            self.display_final_plan(itinerary, start_location, len(places))
+            self.display_final_plan(plan)
             
         except Exception as e:
             self.show_message(f"Planning error: {str(e)}")
@@ -1947,16 +5381,7 @@ class PlanningFrame(ctk.CTkFrame):
     
     def get_osm_tags_from_selected(self) -> List[str]:
     #Convert selected category tags to OSM search tags
-        tag_to_osm = {
-            "Outdoors": "leisure=park|natural=wood|natural=beach",
-            "Fun": "tourism=attraction|leisure=adult_gaming_centre",
-            "Food": "amenity=restaurant|amenity=cafe|amenity=fast_food",
-            "Arcade": "leisure=adult_gaming_centre",
-            "Family": "leisure=playground|tourism=zoo|tourism=aquarium",
-            "Romantic": "tourism=viewpoint|amenity=restaurant",
-            "Shopping": "shop=department_store|shop=mall",
-            "Culture": "tourism=museum|tourism=gallery|tourism=theatre"
-        }
+        tag_to_osm = activity_osm_tags
     
         osm_tags = []
         for tag in self.selected_tags:
@@ -1965,7 +5390,7 @@ class PlanningFrame(ctk.CTkFrame):
     
         return osm_tags if osm_tags else ["tourism=attraction"]
     
-    def save_plan_to_db(self, itinerary, start_location):
+    def save_plan_to_db(self, plan: PlanResult):
     #Save the plan to database linked to the logged-in user
     
         #Check if user is logged in (Absolute safety check)
@@ -1977,38 +5402,33 @@ class PlanningFrame(ctk.CTkFrame):
             with sqlite3.connect("outerinator.db") as conn:
                 cursor = conn.cursor()
 
-                #Format itinerary details
-                details = "\n".join([
-                    f"{i+1}. {item['activity']} ({item['type']}) "
-                    f"from {item['start_time'].strftime('%H:%M')} to {item['end_time'].strftime('%H:%M')}"
-                    for i, item in enumerate(itinerary)
-                ])
-
                 #Generate a nice plan name
-                plan_name = f"Outing - {self.selected_date.strftime('%d %B %Y')}"
+                plan_name = f"Outing - {plan.outing_start.strftime('%d %B %Y')}"
 
                 #Insert plan with user_id instead of username
+                #plan_data keeps the coordinates so the plan can be reopened on the map offline
                 cursor.execute("""
-                    INSERT INTO plans (user_id, plan_name, start_location, date, start_time, end_time, details)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO plans (user_id, plan_name, start_location, date, start_time, end_time, details, plan_data)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     self.controller.current_user_id,
                     plan_name,
-                    start_location,
-                    self.selected_date.strftime("%Y-%m-%d"),
-                    self.start_time.get(),
-                    self.end_time.get(),
-                    details
+                    plan.start_location,
+                    plan.outing_start.strftime("%Y-%m-%d"),
+                    plan.outing_start.strftime("%H:%M"),
+                    plan.outing_end.strftime("%H:%M"),
+                    plan.details_text(),
+                    plan.to_json()
                 ))
                 conn.commit()
 
             #Sow success message in a popup
-            self.show_success_popup(plan_name, len(itinerary))
+            self.show_success_popup(plan_name, len(plan.itinerary), plan.outing_start)
 
         except Exception as e:
             self.show_message(f"❌ Could not save plan: {e}", "error")
     
-    def show_success_popup(self, plan_name, activity_count):
+    def show_success_popup(self, plan_name, activity_count, plan_date):
     #Display a popup window when plan is successfully saved
     
         #Create popup window
@@ -2041,7 +5461,7 @@ class PlanningFrame(ctk.CTkFrame):
         message = (
             f"Your plan has been saved successfully, {self.controller.current_username}!\n\n"
             f"Plan: {plan_name}\n"
-            f"Date: {self.selected_date.strftime('%A, %d %B %Y')}\n"
+            f"Date: {plan_date.strftime('%A, %d %B %Y')}\n"
             f"Activities: {activity_count}"
         )
 
@@ -2058,12 +5478,13 @@ class PlanningFrame(ctk.CTkFrame):
         #Allow Enter key to close
         popup.bind('<Return>', lambda e: popup.destroy())
         
-    def display_final_plan(self, itinerary: List[Dict], start_location: str, total_places: int) -> None:
-    #Display the finalized outing plan in the results area
+    def display_final_plan(self, plan: PlanResult) -> None:
+    #Display the finalized outing plan in the results area.
+    #Everything shown comes from the plan itself, so no lookups happen here.
     
-        #Store itinerary for saving later
-        self.current_itinerary = itinerary
-        self.current_start_location = start_location
+        #Store plan for saving later
+        self.current_plan = plan
+        itinerary = plan.itinerary
     
         #Clear previous results
         if hasattr(self, 'results_frame') and self.results_frame.winfo_exists():
@@ -2093,12 +5514,17 @@ class PlanningFrame(ctk.CTkFrame):
         #Plan summary
         activity_count = len(itinerary)
         summary_text = (
-            f"Starting from: {start_location}\n"
-            f"Found {total_places} places • {activity_count} activities planned\n"
-            f"Date: {self.selected_date.strftime('%A, %d %B %Y')}\n"
-            f"Time: {self.start_time.get()} - {self.end_time.get()}"
+            f"Starting from: {plan.start_location}\n"
+            f"Found {plan.places_found} places • {activity_count} activities planned\n"
+            f"Date: {plan.outing_start.strftime('%A, %d %B %Y')}\n"
+            f"Time: {plan.outing_start.strftime('%H:%M')} - {plan.outing_end.strftime('%H:%M')}"
         )
 
+        #Report how much travel the route optimiser saved over a single greedy pass visiting as many stops
+        search_stats = plan.search_stats
+        if search_stats and search_stats['travel_minutes_saved'] > 0:
+            summary_text += f"\nRoute optimised: {search_stats['travel_minutes_saved']} min less travel"
+
         summary = ctk.CTkLabel(self.results_frame, text=summary_text, text_color="#cccccc", font=("Open Sans", 12))
         summary.pack(pady=(0, 15))
 
@@ -2135,8 +5561,8 @@ class PlanningFrame(ctk.CTkFrame):
 
         #Update map with markers
         if itinerary:
-            #Add start location marker
-            start_coords = self.planner.geocode_location(start_location)
+            #Add start location marker at the coordinates the search used
+            start_coords = plan.start_coords
             if start_coords:
                 self.map_widget.map_widget.set_marker(
                     start_coords[0], 
@@ -2173,7 +5599,7 @@ class PlanningFrame(ctk.CTkFrame):
 
         #Save button at the bottom of results
         if itinerary:
-            save_button = ctk.CTkButton(self.results_frame, text="💾 Save This Plan", command=lambda: self.save_plan_to_db(self.current_itinerary, self.current_start_location), fg_color="#4CAF50", hover_color="#45a049", height=40, font=("Open Sans", 13, "bold"), corner_radius=10)
+            save_button = ctk.CTkButton(self.results_frame, text="💾 Save This Plan", command=lambda: self.save_plan_to_db(self.current_plan), fg_color="#4CAF50", hover_color="#45a049", height=40, font=("Open Sans", 13, "bold"), corner_radius=10)
             save_button.pack(pady=(20, 10), padx=20, fill="x")
             
     def __init__(self, parent, controller):
@@ -2369,5 +5795,20 @@ class PlanningFrame(ctk.CTkFrame):
         back_button = ctk.CTkButton(self, text="⬅ Back to Main", command=lambda: self.return_to_main(), fg_color="#cc0000", hover_color="#990000", corner_radius=12, height=38)
         back_button.grid(row=2, column=0, columnspan=2, pady=(8, 20), padx=10, sticky="ew")
 
-app = Outerinator()
-app.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    #Guarded so process pool workers can import this module without opening the app
+    if len(sys.argv) > 2 and sys.argv[1] == "--import-extract":
+        #Load OSM extracts for offline planning instead of opening the app
+        local_places = LocalPlaceStore()
+        gazetteer = Gazetteer()
+        for extract_path in sys.argv[2:]:
+            started = time.perf_counter()
+            try:
+                imported = local_places.import_extract(extract_path, gazetteer=gazetteer)
+            except (OSError, ValueError, RuntimeError, sqlite3.Error) as error:
+                print(f"{extract_path}: import failed: {error}")
+                continue
+            print(f"{extract_path}: {imported} places imported in {time.perf_counter() - started:.1f} s")
+    else:
+        app = Outerinator()
+        app.mainloop()
\ No newline at end of file
@@ -0,0 +1,118 @@
+#Check that the vectorised OutingPlanner.calculate_distances and the travel-time matrix
+#built from it agree with the scalar calculate_distance they replaced in the planner.
+#Random coordinate sets cover the whole globe, pairs straddling the antimeridian, points
+#a few millimetres to a few metres apart, identical points, the poles and near-antipodal
+#pairs. Distances must agree within check_tolerance_km, and matrix entries must equal the
+#scalar road model rounded to minutes.
+#
+#   python outerinator_distance_check.py --pairs 20000
+
+import argparse
+import importlib.util
+import math
+import sys
+from typing import Tuple
+
+import numpy as np
+
+from outerinator_standin_server import standin_app_path
+
+#Check configuration
+check_tolerance_km = 1e-6  #Agreement required, one millimetre; near-antipodal pairs come closest at about 0.2 mm
+check_matrix_points = 300  #Points in each travel-time matrix compared entry by entry
+
+
+def load_app():
+    #Import the Outerinator module without opening the app.
+    spec = importlib.util.spec_from_file_location("outerinator_app", standin_app_path)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+def coordinate_sets(count: int, seed: int) -> dict:
+    #Returns: dict: Name -> (lat1, lon1, lat2, lon2) arrays of point pairs to compare
+    rng = np.random.default_rng(seed)
+    lat1 = rng.uniform(-90, 90, count)
+    lon1 = rng.uniform(-180, 180, count)
+    sets = {'global': (lat1, lon1, rng.uniform(-90, 90, count), rng.uniform(-180, 180, count))}
+
+    #Just either side of 180 degrees, where the longitude difference is nearly 360
+    east = rng.uniform(179.0, 180.0, count)
+    west = rng.uniform(-180.0, -179.0, count)
+    sets['antimeridian'] = (lat1 * 0.9, east, lat1 * 0.9 + rng.uniform(-0.5, 0.5, count), west)
+
+    #Offsets from 1e-8 to 1e-4 degrees, about a millimetre to ten metres
+    offsets = 10.0 ** rng.uniform(-8, -4, (2, count)) * rng.choice((-1, 1), (2, count))
+    sets['close'] = (lat1 * 0.99, lon1, lat1 * 0.99 + offsets[0], lon1 + offsets[1])
+    sets['identical'] = (lat1, lon1, lat1.copy(), lon1.copy())
+    sets['poles'] = (np.full(count, 90.0), lon1, rng.uniform(89.0, 90.0, count) * rng.choice((-1, 1), count), rng.uniform(-180, 180, count))
+
+    #A small step away from the antipode, where the scalar formula still has a defined value
+    step = rng.uniform(1e-3, 1e-1, count)
+    sets['near antipodal'] = (lat1, lon1, -lat1 + step, np.where(lon1 > 0, lon1 - 180.0, lon1 + 180.0) + step)
+    return sets
+
+
+def compare_distances(planner, lat1, lon1, lat2, lon2) -> Tuple[float, int]:
+    #Returns: Tuple[float, int]: (largest difference in km, pairs outside the tolerance)
+    vectorised = planner.calculate_distances(lat1, lon1, lat2, lon2)
+    scalar = np.fromiter((planner.calculate_distance(*pair) for pair in zip(lat1, lon1, lat2, lon2)), dtype=np.float64, count=len(lat1))
+    differences = np.abs(vectorised - scalar)
+    failures = int(np.count_nonzero(differences > check_tolerance_km))
+    return float(differences.max()), failures
+
+
+def compare_matrix(planner, coords: np.ndarray) -> int:
+    #Returns: int: Matrix entries that differ from the scalar road model
+    matrix = planner.build_travel_time_matrix(coords)
+    failures = 0
+    for row in range(len(coords)):
+        for column in range(len(coords)):
+            if row == column:
+                expected = 0
+            else:
+                minutes = planner.calculate_distance(coords[row, 0], coords[row, 1], coords[column, 0], coords[column, 1]) * 1.4 / 25.0 * 60 + 5
+                #A value this close to a half minute may round either way
+                if abs(minutes - math.floor(minutes) - 0.5) < 1e-6:
+                    continue
+                expected = int(np.rint(minutes))
+            if matrix[row, column] != expected:
+                failures += 1
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check the vectorised distance functions against calculate_distance.")
+    parser.add_argument("--pairs", type=int, default=20000, help="Point pairs in each coordinate set")
+    parser.add_argument("--seed", type=int, default=1)
+    arguments = parser.parse_args(argv)
+
+    app = load_app()
+    #Only the distance functions are used, so the planner's caches and services are not opened
+    planner = app.OutingPlanner.__new__(app.OutingPlanner)
+
+    failed = False
+    print(f"tolerance {check_tolerance_km:g} km")
+    for name, (lat1, lon1, lat2, lon2) in coordinate_sets(arguments.pairs, arguments.seed).items():
+        largest, failures = compare_distances(planner, lat1, lon1, lat2, lon2)
+        #One origin against many destinations, the broadcast the planner uses for radius filtering
+        origin_largest, origin_failures = compare_distances(planner, np.full(len(lat2), lat1[0]), np.full(len(lon2), lon1[0]), lat2, lon2)
+        broadcast = planner.calculate_distances(lat1[0], lon1[0], lat2, lon2)
+        origin_failures += int(np.count_nonzero(broadcast != planner.calculate_distances(np.full(len(lat2), lat1[0]), np.full(len(lon2), lon1[0]), lat2, lon2)))
+        failed = failed or failures > 0 or origin_failures > 0
+        print(f"{name:>15}: largest difference {max(largest, origin_largest):.3g} km, {failures + origin_failures} outside tolerance")
+
+    rng = np.random.default_rng(arguments.seed)
+    for name, center in (('city', (-36.85, 174.76)), ('antimeridian', (-16.5, 179.9))):
+        coords = np.column_stack((center[0] + rng.uniform(-0.5, 0.5, check_matrix_points), center[1] + rng.uniform(-0.5, 0.5, check_matrix_points)))
+        #Longitudes past 180 are wrapped, so the matrix spans the antimeridian
+        coords[:, 1] = (coords[:, 1] + 180.0) % 360.0 - 180.0
+        failures = compare_matrix(planner, coords)
+        failed = failed or failures > 0
+        print(f"{name:>15} travel-time matrix: {failures} of {check_matrix_points ** 2} entries differ")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#Memory benchmark for reading Overpass responses and holding the places found.
+#Writes a synthetic Overpass response (named and unnamed nodes and ways with the usual
+#address and contact tags), then measures:
+#  - reading it the old way, the whole body through response.json(), against feeding
+#    64 KiB chunks to OverpassStreamParser: tracemalloc peak in this process and peak RSS
+#    of a fresh process per path;
+#  - holding the parser's places as element dicts, as the planner's candidates used to,
+#    against PlaceRecords from ingest_places, with and without their tags kept in
+#    OutingPlanner.place_tags.
+#
+#   python outerinator_memory_benchmark.py --elements 60000
+
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from outerinator_standin_server import standin_app_path
+
+#Benchmark configuration
+benchmark_chunk_bytes = 64 * 1024  #Chunk size fed to the streaming parser, as fetch_overpass_query reads
+
+
+def load_app():
+    #Import the Outerinator module without opening the app.
+    spec = importlib.util.spec_from_file_location("outerinator_app", standin_app_path)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+def write_response(path: str, count: int, seed: int) -> int:
+    #Write a synthetic Overpass JSON response where a third of the elements have no name.
+
+    #Returns: int: Size of the response in bytes
+    rng = random.Random(seed)
+    elements = []
+    for osm_id in range(count):
+        tags = {'amenity': rng.choice(('cafe', 'restaurant', 'bar')), 'name': f"Café {osm_id}" if osm_id % 3 else '',
+                'addr:street': 'Queen Street ' * 3, 'website': f"https://example.com/{osm_id}/" + 'x' * 30, 'opening_hours': 'Mo-Fr 09:00-17:00'}
+        if rng.random() < 0.5:
+            element = {'type': 'node', 'id': osm_id, 'lat': -36.8 + rng.random(), 'lon': 174.0 + rng.random(), 'tags': tags}
+        else:
+            element = {'type': 'way', 'id': osm_id, 'center': {'lat': -36.8 + rng.random(), 'lon': 174.0 + rng.random()}, 'nodes': list(range(osm_id, osm_id + 20)), 'tags': tags}
+        elements.append(element)
+    with open(path, "w", encoding="utf-8") as response:
+        json.dump({'version': 0.6, 'generator': 'Overpass API', 'osm3s': {'copyright': 'synthetic'}, 'elements': elements}, response, indent=1, ensure_ascii=False)
+    return os.path.getsize(path)
+
+
+def read_full(app, path: str) -> list:
+    #Returns: list: Every element, read the way response.json() did
+    with open(path, "rb") as response:
+        body = response.read()
+    return json.loads(body.decode("utf-8"))['elements']
+
+
+def read_streaming(app, path: str) -> list:
+    #Returns: list: The named, slimmed elements OverpassStreamParser yields
+    parser = app.OverpassStreamParser()
+    elements = []
+    with open(path, "rb") as response:
+        for chunk in iter(lambda: response.read(benchmark_chunk_bytes), b""):
+            elements.extend(parser.feed(chunk))
+    elements.extend(parser.close())
+    return elements
+
+
+def traced_peak(function, *args) -> tuple:
+    #Returns: tuple: (result, peak MB, MB still held by the result, seconds)
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 1024 / 1024, current / 1024 / 1024, seconds
+
+
+def held_records(planner, elements: list, keep_tags: bool) -> tuple:
+    #Returns: tuple: (records, MB held by the records and, if keep_tags, the tags in place_tags)
+    text = json.dumps(elements)
+    gc.collect()
+    tracemalloc.start()
+    copies = json.loads(text)
+    records = planner.ingest_places(copies)
+    del copies
+    if not keep_tags:
+        planner.place_tags = {}
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return records, current / 1024 / 1024
+
+
+def peak_rss(path: str, reader: str) -> float:
+    #Returns: float: Peak RSS growth in MB of a fresh process reading the response with one reader
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--rss", reader, "--response", path], capture_output=True, text=True, check=True).stdout
+    return float(output.strip())
+
+
+def peak_rss_megabytes() -> float:
+    #Returns: float: Peak RSS of this process so far
+    #VmHWM starts again at exec, ru_maxrss carries over the parent's peak on Linux
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_rss(reader: str, path: str) -> None:
+    #Print the peak RSS growth of reading the response, in a process doing nothing else.
+    app = load_app()
+    gc.collect()
+    before = peak_rss_megabytes()
+    elements = (read_full if reader == "full" else read_streaming)(app, path)
+    print(peak_rss_megabytes() - before)
+    del elements
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure memory used reading Overpass responses and holding places.")
+    parser.add_argument("--elements", type=int, default=60000, help="Elements in the synthetic response")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rss", choices=("full", "streaming"), help=argparse.SUPPRESS)
+    parser.add_argument("--response", help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+
+    if arguments.rss:
+        measure_rss(arguments.rss, arguments.response)
+        return 0
+
+    app = load_app()
+    path = os.path.join(tempfile.mkdtemp(prefix="outerinator_memory_bench_"), "response.json")
+    size = write_response(path, arguments.elements, arguments.seed)
+    print(f"response: {size / 1024 / 1024:.1f} MB, {arguments.elements} elements")
+
+    full, full_peak, full_held, full_seconds = traced_peak(read_full, app, path)
+    streamed, stream_peak, stream_held, stream_seconds = traced_peak(read_streaming, app, path)
+    print(f"{'reader':>16} {'traced peak MB':>15} {'held MB':>8} {'peak RSS MB':>12} {'seconds':>8} {'elements':>9}")
+    print(f"{'response.json()':>16} {full_peak:>15.1f} {full_held:>8.1f} {peak_rss(path, 'full'):>12.1f} {full_seconds:>8.2f} {len(full):>9}")
+    print(f"{'stream parser':>16} {stream_peak:>15.1f} {stream_held:>8.1f} {peak_rss(path, 'streaming'):>12.1f} {stream_seconds:>8.2f} {len(streamed):>9}")
+
+    del full
+    #The planner's candidates used to hold the element dicts themselves
+    _, _, dicts_held, _ = traced_peak(lambda: json.loads(json.dumps(streamed)))
+    #Only ingest_places is used, so the planner's caches and services are not opened
+    planner = app.OutingPlanner.__new__(app.OutingPlanner)
+    planner.classifier = app.PlaceClassifier()
+    records, records_held = held_records(planner, streamed, False)
+    _, tagged_held = held_records(planner, streamed, True)
+    per_place = 1024 * 1024 / len(records)
+    print(f"{len(records)} places held as element dicts: {dicts_held * per_place:.0f} bytes each, as PlaceRecords: "
+          f"{records_held * per_place:.0f} bytes each, {tagged_held * per_place:.0f} with their tags in place_tags")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
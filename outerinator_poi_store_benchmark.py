@@ -0,0 +1,154 @@
+#Benchmark for LocalPlaceStore, the R*Tree + inverted tag index POI store.
+#Builds stores of synthetic places at a constant density (so a search finds about the
+#same number of places at every size, as a larger extract covers more ground) and times
+#bbox searches for random activity categories against the previous (lat, lon) B-tree
+#layout, which filtered tags in Python.
+#
+#   python outerinator_poi_store_benchmark.py --sizes 10000,100000,1000000,5000000 --queries 200
+
+import argparse
+import importlib.util
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import List, Dict, Tuple
+
+from outerinator_standin_server import percentile, standin_app_path
+
+#Benchmark configuration
+benchmark_places_per_square_degree = 50000  #Place density, roughly a mid-sized city spread over the region
+benchmark_radius_km = 5.0  #Search radius of every timed query
+benchmark_origin = (-45.0, 165.0)  #South-west corner of the synthetic region
+
+
+def load_app():
+    #Import the Outerinator module without opening the app.
+    spec = importlib.util.spec_from_file_location("outerinator_app", standin_app_path)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+def synthetic_places(app, count: int, seed: int) -> Tuple[List[Dict], float]:
+    #Generate named places of the activity types, spread evenly over a square region.
+
+    #Returns: Tuple[List[Dict], float]: (Overpass-style elements, side of the region in degrees)
+    rng = random.Random(seed)
+    side = math.sqrt(count / benchmark_places_per_square_degree)
+    pairs = [tuple(pattern.split('=', 1)) for patterns in app.activity_osm_tags.values() for pattern in patterns.split('|')]
+    elements = []
+    for osm_id in range(1, count + 1):
+        key, value = rng.choice(pairs)
+        lat = benchmark_origin[0] + rng.random() * side
+        lon = benchmark_origin[1] + rng.random() * side
+        elements.append({'type': 'node' if osm_id % 5 else 'way', 'id': osm_id, 'lat': lat, 'lon': lon, 'tags': {'name': f"Place {osm_id}", key: value}})
+    return elements, side
+
+
+def build_btree_baseline(db_path: str, elements: List[Dict]) -> None:
+    #Build the earlier layout: one table with a (lat, lon) index and tags as JSON.
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE osm_places (osm_type TEXT NOT NULL, osm_id INTEGER NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL, tags TEXT NOT NULL, PRIMARY KEY (osm_type, osm_id))")
+        conn.execute("CREATE INDEX idx_osm_places_position ON osm_places (lat, lon)")
+        for start in range(0, len(elements), 10000):
+            conn.executemany("INSERT INTO osm_places VALUES (?, ?, ?, ?, ?)", [(element['type'], element['id'], element['lat'], element['lon'], json.dumps(element['tags'], separators=(",", ":"))) for element in elements[start:start + 10000]])
+            conn.commit()
+
+
+def query_btree_baseline(db_path: str, bbox: Tuple[float, float, float, float], values_by_key: Dict[str, List[str]]) -> List[Dict]:
+    #Search the earlier layout: index range on the bbox, tag filter in Python.
+    wanted = {key: set(values) for key, values in values_by_key.items()}
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT osm_type, osm_id, lat, lon, tags FROM osm_places WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?", (bbox[0], bbox[2], bbox[1], bbox[3])).fetchall()
+    elements = []
+    for osm_type, osm_id, lat, lon, tags_json in rows:
+        tags = json.loads(tags_json)
+        if any(tags.get(key) in values for key, values in wanted.items()):
+            elements.append({'type': osm_type, 'id': osm_id, 'lat': lat, 'lon': lon, 'tags': tags})
+    return elements
+
+
+def random_queries(app, side: float, count: int, seed: int) -> List[Tuple[Tuple[float, float, float, float], Dict[str, List[str]]]]:
+    #Returns: List: (bbox, values_by_key) for searches at random points with one to three random categories
+    rng = random.Random(seed)
+    planner_tags = app.OutingPlanner.parse_osm_tags
+    categories = list(app.activity_osm_tags.values())
+    queries = []
+    for _ in range(count):
+        lat = benchmark_origin[0] + rng.random() * side
+        lon = benchmark_origin[1] + rng.random() * side
+        radius_deg = benchmark_radius_km / 111.0
+        lon_radius_deg = radius_deg / math.cos(math.radians(lat))
+        bbox = (lat - radius_deg, lon - lon_radius_deg, lat + radius_deg, lon + lon_radius_deg)
+        queries.append((bbox, planner_tags(None, rng.sample(categories, rng.randint(1, 3)))))
+    return queries
+
+
+def time_queries(search, queries) -> Tuple[List[float], int]:
+    #Returns: Tuple[List[float], int]: (milliseconds per query, total places returned)
+    timings = []
+    returned = 0
+    for bbox, values_by_key in queries:
+        started = time.perf_counter()
+        returned += len(search(bbox, values_by_key))
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return timings, returned
+
+
+def file_megabytes(db_path: str) -> float:
+    return sum(os.path.getsize(db_path + suffix) for suffix in ("", "-wal") if os.path.exists(db_path + suffix)) / 1024 / 1024
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the local POI store against the earlier B-tree layout.")
+    parser.add_argument("--sizes", default="10000,100000,1000000,5000000", help="Comma separated store sizes")
+    parser.add_argument("--queries", type=int, default=200, help="Timed searches per size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--work-dir", default=None, help="Where the benchmark databases are built, a temporary directory by default")
+    arguments = parser.parse_args(argv)
+
+    app = load_app()
+    work_dir = arguments.work_dir or tempfile.mkdtemp(prefix="outerinator_poi_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    print(f"{'places':>9} {'build s':>8} {'MB':>7} {'rows/q':>7} | {'B-tree p50':>10} {'p99':>8} | {'R*Tree p50':>10} {'p99':>8} | speedup")
+
+    for size in (int(value) for value in arguments.sizes.split(",")):
+        elements, side = synthetic_places(app, size, arguments.seed)
+        store_path = os.path.join(work_dir, f"store_{size}.db")
+        baseline_path = os.path.join(work_dir, f"baseline_{size}.db")
+        for db_path in (store_path, baseline_path):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+        started = time.perf_counter()
+        store = app.LocalPlaceStore(store_path)
+        store.add_elements(elements)
+        build_seconds = time.perf_counter() - started
+        build_btree_baseline(baseline_path, elements)
+        del elements
+
+        queries = random_queries(app, side, arguments.queries, arguments.seed + 1)
+        #One untimed pass warms the page cache for both layouts
+        time_queries(store.query, queries[:20])
+        time_queries(lambda bbox, values: query_btree_baseline(baseline_path, bbox, values), queries[:20])
+        store_times, store_rows = time_queries(store.query, queries)
+        baseline_times, baseline_rows = time_queries(lambda bbox, values: query_btree_baseline(baseline_path, bbox, values), queries)
+        if store_rows != baseline_rows:
+            print(f"warning: layouts disagree at {size} places ({store_rows} vs {baseline_rows} rows)")
+
+        baseline_p50, store_p50 = percentile(baseline_times, 50), percentile(store_times, 50)
+        print(f"{size:>9} {build_seconds:>8.1f} {file_megabytes(store_path):>7.1f} {store_rows / len(queries):>7.0f} | "
+              f"{baseline_p50:>10.2f} {percentile(baseline_times, 99):>8.2f} | {store_p50:>10.2f} {percentile(store_times, 99):>8.2f} | "
+              f"{baseline_p50 / store_p50:.1f}x", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
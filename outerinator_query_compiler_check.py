@@ -0,0 +1,128 @@
+#Check that OutingPlanner.compile_overpass_query finds the same places as the query
+#builder it replaced, which emitted node, way and relation statements with their own bbox
+#for every key=value pair of every selected category.
+#Both queries are answered by the stand-in server from recorded Overpass elements, for
+#every combination of activity categories. Without recorded fixtures a synthetic set is
+#used, with places of every activity type plus near misses such as "cafe_bar", "x_cafe"
+#and values containing regex characters, which a badly anchored or escaped regex would let in.
+#
+#   python outerinator_query_compiler_check.py --fixtures standin_fixtures --center -36.8509,174.7645 --radius 5
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import urllib.request
+from typing import List, Dict, Tuple, Optional
+
+from outerinator_standin_server import FaultInjector, load_app, start_server, standin_host
+
+#Extra tag patterns checked on top of the activity categories, to exercise value escaping
+check_extra_tags = ["shop=a.b|shop=c+d|shop=e(f)", "tourism=\"quoted\"|tourism=back\\slash"]
+check_synthetic_places = 4000  #Places generated when no recorded fixtures are given
+
+
+def legacy_overpass_query(bbox: Tuple[float, float, float, float], tags: List[str]) -> Optional[str]:
+    #Build the query the way query_osm_places did before compile_overpass_query, with quotes escaped.
+
+    #Returns: Optional[str]: Overpass QL query, or None if no usable tag patterns were given
+    min_lat, min_lon, max_lat, max_lon = bbox
+    overpass_parts = []
+    for tag_category in tags:
+        for tag_part in tag_category.split('|'):
+            tag_part = tag_part.strip()
+            if '=' in tag_part:
+                key, value = tag_part.split('=', 1)
+                key = key.strip().replace('\\', '\\\\').replace('"', '\\"')
+                value = value.strip().replace('\\', '\\\\').replace('"', '\\"')
+                for element_type in ('node', 'way', 'relation'):
+                    overpass_parts.append(f'{element_type}["{key}"="{value}"]({min_lat},{min_lon},{max_lat},{max_lon});')
+    if not overpass_parts:
+        return None
+    return "[out:json][timeout:30];(" + "".join(overpass_parts) + ");out center;"
+
+
+def synthetic_fixture(fixtures_path: str, app, center: Tuple[float, float], radius_km: float, seed: int) -> None:
+    #Write a recorded Overpass response with matching places and near misses around the centre.
+    rng = random.Random(seed)
+    pairs = [tuple(pattern.split('=', 1)) for patterns in list(app.activity_osm_tags.values()) + check_extra_tags for pattern in patterns.split('|')]
+    #Values a correct filter must reject: prefixes, suffixes, lists and regex look-alikes
+    near_misses = [(key, mutate) for key, value in pairs for mutate in (value + "_bar", "x_" + value, value + ";bar", value.upper(), "aXb", "ccd", "ef")]
+    spread = 2 * radius_km / 111.0
+
+    elements = []
+    for osm_id in range(1, check_synthetic_places + 1):
+        key, value = rng.choice(pairs if rng.random() < 0.6 else near_misses)
+        lat = center[0] + rng.uniform(-spread, spread)
+        lon = center[1] + rng.uniform(-spread, spread) / math.cos(math.radians(center[0]))
+        element_type = rng.choice(('node', 'node', 'way', 'relation'))
+        element = {'type': element_type, 'id': osm_id, 'tags': {'name': f"Place {osm_id}", key: value}}
+        if element_type == 'node':
+            element.update(lat=lat, lon=lon)
+        else:
+            element['center'] = {'lat': lat, 'lon': lon}
+        elements.append(element)
+
+    os.makedirs(os.path.join(fixtures_path, "overpass"), exist_ok=True)
+    with open(os.path.join(fixtures_path, "overpass", "synthetic.json"), "w", encoding="utf-8") as fixture:
+        json.dump({'version': 0.6, 'elements': elements}, fixture)
+
+
+def run_query(url: str, overpass_query: str) -> set:
+    #Returns: set: (type, id) of every element the stand-in returned
+    request = urllib.request.Request(url, data=overpass_query.encode("utf-8"))
+    with urllib.request.urlopen(request, timeout=30) as response:
+        elements = json.loads(response.read().decode("utf-8"))['elements']
+    return {(element['type'], element['id']) for element in elements}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check the compiled Overpass query against the earlier per-tag query builder.")
+    parser.add_argument("--fixtures", default=None, help="Directory of recorded responses, synthetic places by default")
+    parser.add_argument("--center", default="-36.8509,174.7645", help="lat,lon searched around")
+    parser.add_argument("--radius", type=float, default=5.0, help="Search radius in km")
+    parser.add_argument("--seed", type=int, default=1)
+    arguments = parser.parse_args(argv)
+
+    center = tuple(float(value) for value in arguments.center.split(","))
+    server = start_server(arguments.fixtures or tempfile.mkdtemp(prefix="outerinator_query_check_"), FaultInjector(), standin_host, 0)
+    base_url = f"http://{standin_host}:{server.server_address[1]}"
+    app = load_app(f"{base_url}/api/interpreter", f"{base_url}/search")
+    if not arguments.fixtures:
+        synthetic_fixture(server.fixtures.directory, app, center, arguments.radius, arguments.seed)
+        server.fixtures.load()
+    #Answer every query from the recorded elements rather than replaying a recording of the same query
+    server.fixtures.responses['overpass'].clear()
+
+    #Only the query builder is used, so the planner's caches and services are not opened
+    planner = app.OutingPlanner.__new__(app.OutingPlanner)
+    bbox = planner.calculate_bounding_box(center[0], center[1], arguments.radius)
+    categories = list(app.activity_osm_tags.values())
+    tag_sets = [list(combination) for size in range(1, len(categories) + 1) for combination in itertools.combinations(categories, size)]
+    tag_sets += [[tags] for tags in check_extra_tags]
+
+    mismatches = 0
+    for tags in tag_sets:
+        legacy_query = legacy_overpass_query(bbox, tags)
+        compiled_query = planner.compile_overpass_query(bbox, tags)
+        legacy_places = run_query(f"{base_url}/api/interpreter", legacy_query)
+        compiled_places = run_query(f"{base_url}/api/interpreter", compiled_query)
+        if legacy_places != compiled_places:
+            mismatches += 1
+            print(f"MISMATCH {tags}: {len(legacy_places - compiled_places)} only in the old query, {len(compiled_places - legacy_places)} only in the compiled one")
+
+    legacy_query = legacy_overpass_query(bbox, categories)
+    compiled_query = planner.compile_overpass_query(bbox, categories)
+    print(f"{len(tag_sets)} category combinations checked against {len(server.fixtures.elements)} recorded elements, {mismatches} mismatched")
+    print(f"All categories: {len(server.fixtures.parse_overpass_query(legacy_query)[1])} statements ({len(legacy_query)} bytes) before, "
+          f"{len(server.fixtures.parse_overpass_query(compiled_query)[1])} statements ({len(compiled_query)} bytes) compiled")
+    server.shutdown()
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#Benchmark for the itinerary route solvers: ItineraryOptimizer.solve_exact against the
+#optimise heuristic on synthetic outings, to show where exact_solver_max_candidates should
+#sit. For each candidate count the median solve time of both is printed with the average
+#(stops, categories, travel) each found. --check also compares solve_exact with a brute
+#force search over every route on small instances, and --windows gives places opening hours
+#so visits can wait for opening.
+#
+#   python outerinator_route_solver_benchmark.py --sizes 8,12,16,20,24 --hours 8 --stops 8 --check 60 --windows
+
+import argparse
+import importlib.util
+import itertools
+import random
+import statistics
+import sys
+import time
+from typing import Tuple
+
+import numpy as np
+
+from outerinator_standin_server import standin_app_path
+
+#Benchmark configuration
+benchmark_center = (-36.8509, 174.7645)  #Places are spread around this point
+benchmark_spread_deg = 0.1  #Half the side of the square the places are spread over
+benchmark_visit_minutes = (30, 60, 90, 120, 180)  #Visit lengths picked from
+benchmark_types = 5  #Distinct activity categories
+
+
+def load_app():
+    #Import the Outerinator module without opening the app.
+    spec = importlib.util.spec_from_file_location("outerinator_app", standin_app_path)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+def random_windows(rng: random.Random, window_minutes: int):
+    #Returns: Optional[Tuple]: Opening windows in outing minutes, or None for a place open throughout
+    quarter = window_minutes // 4
+    return rng.choice((None, None, ((0, quarter),), ((2 * quarter, window_minutes),), ((quarter // 2, quarter + quarter // 2), (2 * quarter + quarter // 2, window_minutes)),
+                       ((3 * quarter, 3 * quarter + 30),), ((quarter, 2 * quarter), (3 * quarter, 3 * quarter + quarter // 2))))
+
+
+def random_optimizer(app, count: int, window_minutes: int, max_stops: int, seed: int, windows: bool = False):
+    #Returns: ItineraryOptimizer: A synthetic outing with count candidates around benchmark_center
+    rng = random.Random(seed)
+    coords = np.asarray([benchmark_center] + [(benchmark_center[0] + rng.uniform(-benchmark_spread_deg, benchmark_spread_deg),
+                                               benchmark_center[1] + rng.uniform(-benchmark_spread_deg, benchmark_spread_deg)) for _ in range(count)])
+    #Only the travel-time matrix is used, so the planner's caches and services are not opened
+    travel_matrix = app.OutingPlanner.__new__(app.OutingPlanner).build_travel_time_matrix(coords)
+    durations = [0] + [rng.choice(benchmark_visit_minutes) for _ in range(count)]
+    types = [-1] + [rng.randrange(benchmark_types) for _ in range(count)]
+    opening_windows = [None] + [random_windows(rng, window_minutes) for _ in range(count)] if windows else None
+    return app.ItineraryOptimizer(travel_matrix, durations, types, window_minutes, max_stops, opening_windows=opening_windows)
+
+
+def brute_force_score(optimizer) -> Tuple[int, int, int]:
+    #Returns: Tuple[int, int, int]: Best score over every ordering of every subset
+    best = optimizer.score([])
+    for size in range(1, min(optimizer.max_stops, len(optimizer.candidates)) + 1):
+        for route in itertools.permutations(optimizer.candidates, size):
+            route_score = optimizer.score(list(route))
+            if route_score is not None and route_score > best:
+                best = route_score
+    return best
+
+
+def check_exact(app, instances: int, seed: int, windows: bool = False) -> int:
+    #Compare solve_exact with a brute force search on small random outings.
+
+    #Returns: int: Instances where the exact solver's score differs from the brute force one
+    mismatches = 0
+    for instance in range(instances):
+        rng = random.Random(seed + instance)
+        optimizer = random_optimizer(app, rng.randint(1, 7), rng.choice((60, 120, 240, 480)), rng.randint(1, 5), seed + instance, windows)
+        exact_score = optimizer.score(optimizer.solve_exact())
+        best_score = brute_force_score(optimizer)
+        if exact_score != best_score:
+            mismatches += 1
+            print(f"mismatch on instance {instance}: exact {exact_score}, brute force {best_score}")
+    return mismatches
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the exact route solver against the heuristic.")
+    parser.add_argument("--sizes", default="8,10,12,14,16,18,20,22,24", help="Comma separated candidate counts")
+    parser.add_argument("--hours", type=float, default=8.0, help="Outing length")
+    parser.add_argument("--stops", type=int, default=8, help="Most stops in a route, the planner's max_activities")
+    parser.add_argument("--runs", type=int, default=5, help="Outings timed per size")
+    parser.add_argument("--budget", type=float, default=10.0, help="Seconds the exact solver may take per outing")
+    parser.add_argument("--check", type=int, default=0, help="Small outings compared with a brute force search")
+    parser.add_argument("--windows", action="store_true", help="Give places opening hours")
+    parser.add_argument("--seed", type=int, default=1)
+    arguments = parser.parse_args(argv)
+
+    app = load_app()
+    window_minutes = int(arguments.hours * 60)
+    print(f"{'candidates':>10} | {'exact ms':>9} {'score':>16} | {'heuristic ms':>12} {'score':>16}")
+    for size in (int(value) for value in arguments.sizes.split(",")):
+        exact_times, heuristic_times, exact_scores, heuristic_scores = [], [], [], []
+        for run in range(arguments.runs):
+            optimizer = random_optimizer(app, size, window_minutes, arguments.stops, arguments.seed * 1000 + size * 10 + run, arguments.windows)
+            started = time.perf_counter()
+            route = optimizer.solve_exact(arguments.budget)
+            exact_times.append((time.perf_counter() - started) * 1000.0)
+            if route is not None:
+                exact_scores.append(optimizer.score(route))
+
+            started = time.perf_counter()
+            route = optimizer.optimise()
+            heuristic_times.append((time.perf_counter() - started) * 1000.0)
+            heuristic_scores.append(optimizer.score(route))
+
+        exact_text = " ".join(f"{statistics.mean(part):.1f}" for part in zip(*exact_scores)) if len(exact_scores) == arguments.runs else "timed out"
+        heuristic_text = " ".join(f"{statistics.mean(part):.1f}" for part in zip(*heuristic_scores))
+        print(f"{size:>10} | {statistics.median(exact_times):>9.1f} {exact_text:>16} | {statistics.median(heuristic_times):>12.1f} {heuristic_text:>16}", flush=True)
+
+    if arguments.check:
+        mismatches = check_exact(app, arguments.check, arguments.seed, arguments.windows)
+        print(f"{arguments.check} small outings compared with brute force, {mismatches} mismatched")
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
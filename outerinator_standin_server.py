@@ -0,0 +1,487 @@
+#Local stand-in for the Overpass and Nominatim APIs used by Outerinator.
+#Replays recorded responses with configurable latency, bandwidth and injected errors,
+#so planning can be tested and benchmarked without the live OpenStreetMap services.
+#
+#By default the fixtures in standin_bench_fixtures are served: a place search around central
+#Auckland for the default bench --center/--tags and a geocode of "Auckland". They are
+#synthetic places in the exact form of recordings, so the benchmark is reproducible without
+#the live services. Record your own into another directory (add --record to fill misses):
+#   python outerinator_standin_server.py serve --fixtures standin_fixtures --record --latency 150 --jitter 50 --bandwidth 256 --error-rate 0.05
+#Point the app at it:
+#   OUTERINATOR_OVERPASS_URLS=http://127.0.0.1:8765/api/interpreter
+#   OUTERINATOR_NOMINATIM_URL=http://127.0.0.1:8765/search
+#   OUTERINATOR_NOMINATIM_MIN_INTERVAL=0.01
+#Measure p50/p99 of place searches and geocoding against an in-process stand-in:
+#   python outerinator_standin_server.py bench --runs 50 --latency 150
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+from typing import List, Dict, Tuple, Optional
+
+#Stand-in server configuration
+standin_host = "127.0.0.1"
+standin_port = 8765
+standin_fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "standin_bench_fixtures")  #Directory of recorded responses, one subdirectory per service
+standin_overpass_upstream = "https://overpass-api.de/api/interpreter"  #Asked on a miss in --record mode
+standin_nominatim_upstream = "https://nominatim.openstreetmap.org/search"  #Asked on a miss in --record mode
+standin_user_agent = "outerinator_app/1.0 (stand-in recorder)"
+standin_latency_samples = 10000  #Response times kept per route for /stats
+standin_app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Outerinator_iteration_5.py")
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    #Nearest-rank percentile.
+
+    #Args: samples (List[float]): Measurements, percent (float): Percentile between 0 and 100
+
+    #Returns: float: The measurement at that percentile, 0 when there are none
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(percent / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarise(samples: List[float]) -> Dict:
+    #Returns: Dict: Count, p50, p99 and mean of a list of millisecond timings
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50), 2),
+        'p99_ms': round(percentile(samples, 99), 2),
+        'mean_ms': round(sum(samples) / len(samples), 2) if samples else 0.0,
+    }
+
+
+class FixtureStore:
+    #Recorded Overpass and Nominatim responses.
+    #Each response is a JSON file named after a hash of the request, under overpass/
+    #or nominatim/ in the fixtures directory. An Overpass query with no exact recording
+    #is answered from every recorded element that lies in its bbox and matches its tag
+    #filters, so a handful of recordings covers new searches around the same area.
+
+    def __init__(self, directory: str = standin_fixtures_path):
+        #Args: directory (str): Fixtures directory, created if missing
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.responses = {'overpass': {}, 'nominatim': {}}
+        self.elements = {}  #(type, id) -> element from any recorded Overpass response
+        self.load()
+
+    @staticmethod
+    def overpass_key(query: str) -> str:
+        #Returns: str: Fixture name for an Overpass QL query
+        return hashlib.sha1(" ".join(query.split()).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def nominatim_key(params: Dict[str, str]) -> str:
+        #Returns: str: Fixture name for a search, from the query text and result limit
+        query = " ".join(params.get('q', '').casefold().split())
+        return hashlib.sha1(f"{query}|{params.get('limit', '')}".encode("utf-8")).hexdigest()
+
+    def load(self) -> None:
+        #Read every recorded response into memory.
+        for service in self.responses:
+            service_path = os.path.join(self.directory, service)
+            os.makedirs(service_path, exist_ok=True)
+            for file_name in os.listdir(service_path):
+                if not file_name.endswith(".json"):
+                    continue
+                with open(os.path.join(service_path, file_name), "rb") as fixture:
+                    self.add(service, file_name[:-5], fixture.read())
+
+    def add(self, service: str, key: str, body: bytes) -> None:
+        #Keep a response in memory, indexing Overpass elements for bbox answers.
+        with self.lock:
+            self.responses[service][key] = body
+            if service != 'overpass':
+                return
+            try:
+                elements = json.loads(body.decode("utf-8")).get('elements', [])
+            except (ValueError, AttributeError):
+                return
+            for element in elements:
+                self.elements[(element.get('type'), element.get('id'))] = element
+
+    def save(self, service: str, key: str, body: bytes) -> None:
+        #Record a response to disk and memory.
+        with open(os.path.join(self.directory, service, key + ".json"), "wb") as fixture:
+            fixture.write(body)
+        self.add(service, key, body)
+
+    def lookup(self, service: str, key: str) -> Optional[bytes]:
+        #Returns: Optional[bytes]: The recorded response, or None if there is none
+        with self.lock:
+            return self.responses[service].get(key)
+
+    @staticmethod
+    def parse_overpass_query(query: str) -> Tuple[Optional[Tuple[float, ...]], List[Tuple[Tuple[str, ...], str, re.Pattern, Optional[Tuple[float, ...]]]]]:
+        #Read the global bbox and the tag filter statements of a query.
+        #Understands the compact nwr form built by compile_overpass_query as well as the
+        #older node/way/relation statements that carry their own bbox.
+
+        #Returns: Tuple: (global bbox or None, [(element types, key, compiled value pattern, statement bbox or None)])
+        bbox_match = re.search(r"\[bbox:([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\]", query)
+        bbox = tuple(float(value) for value in bbox_match.groups()) if bbox_match else None
+
+        statements = []
+        for element_type, key, operator, value, statement_bbox in re.findall(r'(nwr|node|way|relation)\["((?:[^"\\]|\\.)*)"(=|~)"((?:[^"\\]|\\.)*)"\](?:\(([-\d.,\s]+)\))?', query):
+            key = key.replace('\\"', '"').replace('\\\\', '\\')
+            value = value.replace('\\"', '"').replace('\\\\', '\\')
+            types = ('node', 'way', 'relation') if element_type == 'nwr' else (element_type,)
+            own_bbox = tuple(float(part) for part in statement_bbox.split(",")) if statement_bbox else None
+            statements.append((types, key, re.compile(re.escape(value) + "$" if operator == "=" else value), own_bbox))
+        return bbox, statements
+
+    def answer_overpass(self, query: str) -> bytes:
+        #Build an Overpass response from recorded elements for a query that was never recorded.
+        bbox, statements = self.parse_overpass_query(query)
+        with self.lock:
+            elements = list(self.elements.values())
+
+        matched = []
+        for element in elements:
+            lat = element.get('lat', element.get('center', {}).get('lat'))
+            lon = element.get('lon', element.get('center', {}).get('lon'))
+            if lat is None or lon is None:
+                continue
+            if not statements:
+                if not bbox or bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]:
+                    matched.append(element)
+                continue
+
+            tags = element.get('tags', {})
+            for types, key, pattern, own_bbox in statements:
+                #A statement's own bbox takes the place of the global one
+                area = own_bbox or bbox
+                if element.get('type') not in types or key not in tags or not pattern.match(tags[key]):
+                    continue
+                if area and not (area[0] <= lat <= area[2] and area[1] <= lon <= area[3]):
+                    continue
+                matched.append(element)
+                break
+
+        return json.dumps({'version': 0.6, 'generator': 'Outerinator stand-in', 'elements': matched}).encode("utf-8")
+
+    def answer_nominatim(self, params: Dict[str, str]) -> bytes:
+        #Answer an unrecorded search from recorded results whose name contains the query.
+        query = " ".join(params.get('q', '').casefold().split())
+        limit = int(params.get('limit', 10) or 10)
+        with self.lock:
+            bodies = list(self.responses['nominatim'].values())
+
+        matched = {}
+        for body in bodies:
+            try:
+                results = json.loads(body.decode("utf-8"))
+            except ValueError:
+                continue
+            for result in results if isinstance(results, list) else []:
+                if query and query in result.get('display_name', '').casefold():
+                    matched.setdefault(result.get('place_id'), result)
+        return json.dumps(list(matched.values())[:limit]).encode("utf-8")
+
+
+class FaultInjector:
+    #Latency, bandwidth and error settings applied to every response.
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, bandwidth_kbps: float = 0.0, error_rate: float = 0.0,
+                 error_statuses: Tuple[int, ...] = (429, 504), retry_after: Optional[str] = None, truncate_rate: float = 0.0, seed: Optional[int] = None):
+        #Args: latency_ms (float): Delay before the first byte, jitter_ms (float): Random extra delay up to this, bandwidth_kbps (float): Body transfer rate, 0 for unlimited, error_rate (float): Share of requests answered with an error status, error_statuses (Tuple[int, ...]): Statuses picked from for errors, retry_after (Optional[str]): Retry-After sent with errors, truncate_rate (float): Share of responses cut off half way, seed (Optional[int]): Seed for reproducible runs
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bandwidth_kbps = bandwidth_kbps
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.retry_after = retry_after
+        self.truncate_rate = truncate_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def plan(self) -> Tuple[float, Optional[int], bool]:
+        #Decide what happens to one response.
+
+        #Returns: Tuple[float, Optional[int], bool]: (seconds to wait, error status or None, whether to truncate)
+        with self.lock:
+            delay = (self.latency_ms + self.random.uniform(0.0, self.jitter_ms)) / 1000.0
+            status = self.random.choice(self.error_statuses) if self.random.random() < self.error_rate else None
+            truncate = status is None and self.random.random() < self.truncate_rate
+        return delay, status, truncate
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    #Serves /api/interpreter (Overpass), /search (Nominatim) and /stats.
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        #Keep benchmark output clean; timings are available from /stats instead
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path.endswith("/stats"):
+            self.send_body(200, json.dumps(self.server.statistics()).encode("utf-8"))
+        elif url.path.endswith("/search"):
+            self.serve('nominatim', params)
+        elif url.path.endswith("/interpreter"):
+            self.serve('overpass', params.get('data', ''))
+        else:
+            self.send_body(404, b'{"error": "unknown endpoint"}')
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = self.rfile.read(length).decode("utf-8")
+        #Overpass takes the query raw or as a form field
+        if body.startswith("data="):
+            body = parse_qs(body).get('data', [''])[-1]
+        if urlsplit(self.path).path.endswith("/interpreter"):
+            self.serve('overpass', body)
+        else:
+            self.send_body(404, b'{"error": "unknown endpoint"}')
+
+    def serve(self, service: str, request) -> None:
+        #Answer a request from the fixtures, applying the configured faults.
+        started = time.perf_counter()
+        delay, status, truncate = self.server.faults.plan()
+        if delay > 0:
+            time.sleep(delay)
+
+        if status is not None:
+            headers = {'Retry-After': self.server.faults.retry_after} if self.server.faults.retry_after else {}
+            self.send_body(status, json.dumps({'error': f"injected {status}"}).encode("utf-8"), headers)
+        else:
+            self.send_body(200, self.server.answer(service, request), truncate=truncate)
+        self.server.record(service, (time.perf_counter() - started) * 1000.0)
+
+    def send_body(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None, truncate: bool = False) -> None:
+        #Send a JSON response at the configured bandwidth, optionally cutting it off half way.
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if truncate:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+        if truncate:
+            body = body[:len(body) // 2]
+        bytes_per_second = self.server.faults.bandwidth_kbps * 1024
+        chunk_size = max(1024, int(bytes_per_second / 20)) if bytes_per_second else len(body) or 1
+        try:
+            for start in range(0, len(body), chunk_size):
+                chunk = body[start:start + chunk_size]
+                self.wfile.write(chunk)
+                if bytes_per_second:
+                    time.sleep(len(chunk) / bytes_per_second)
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            #The client gave up, for example a hedged request that lost
+            self.close_connection = True
+
+
+class StandinServer(ThreadingHTTPServer):
+    #HTTP server holding the fixtures, fault settings and per-route timings.
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], fixtures: FixtureStore, faults: FaultInjector, record: bool = False, verbose: bool = False):
+        #Args: address (Tuple[str, int]): (host, port), port 0 picks a free one, fixtures (FixtureStore): Recorded responses, faults (FaultInjector): Latency and error settings, record (bool): Fetch and record misses from the live services, verbose (bool): Log every request
+        super().__init__(address, StandinHandler)
+        self.fixtures = fixtures
+        self.faults = faults
+        self.record_misses = record
+        self.verbose = verbose
+        self.stats_lock = threading.Lock()
+        self.timings = {'overpass': deque(maxlen=standin_latency_samples), 'nominatim': deque(maxlen=standin_latency_samples)}
+
+    def answer(self, service: str, request) -> bytes:
+        #Find the response body for a request: recorded, then recorded live in --record mode, then built from the fixtures.
+        if service == 'overpass':
+            key = self.fixtures.overpass_key(request)
+        else:
+            key = self.fixtures.nominatim_key(request)
+
+        body = self.fixtures.lookup(service, key)
+        if body is not None:
+            return body
+        if self.record_misses:
+            body = self.fetch_upstream(service, request)
+            if body is not None:
+                self.fixtures.save(service, key, body)
+                return body
+        return self.fixtures.answer_overpass(request) if service == 'overpass' else self.fixtures.answer_nominatim(request)
+
+    def fetch_upstream(self, service: str, request) -> Optional[bytes]:
+        #Ask the live service for a response to record.
+
+        #Returns: Optional[bytes]: The response body, or None if the live service failed
+        headers = {'User-Agent': standin_user_agent}
+        if service == 'overpass':
+            upstream = urllib.request.Request(standin_overpass_upstream, data=request.encode("utf-8"), headers=headers)
+        else:
+            query = urlencode(request)
+            upstream = urllib.request.Request(f"{standin_nominatim_upstream}?{query}", headers=headers)
+            #Stay inside Nominatim's one request per second while recording
+            time.sleep(1.0)
+        try:
+            with urllib.request.urlopen(upstream, timeout=90) as response:
+                return response.read()
+        except OSError:
+            return None
+
+    def handle_error(self, request, client_address) -> None:
+        #Clients dropping pooled or hedged connections is normal, so only report other errors
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)) or self.verbose:
+            super().handle_error(request, client_address)
+
+    def record(self, service: str, milliseconds: float) -> None:
+        with self.stats_lock:
+            self.timings[service].append(milliseconds)
+
+    def statistics(self) -> Dict[str, Dict]:
+        #Returns: Dict[str, Dict]: Server-side timing summary per route
+        with self.stats_lock:
+            return {service: summarise(list(samples)) for service, samples in self.timings.items()}
+
+
+def start_server(fixtures_path: str, faults: FaultInjector, host: str = standin_host, port: int = standin_port, record: bool = False, verbose: bool = False) -> StandinServer:
+    #Start a stand-in server on a background thread.
+
+    #Returns: StandinServer: The running server, stop it with shutdown()
+    server = StandinServer((host, port), FixtureStore(fixtures_path), faults, record, verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_app(overpass_url: str, nominatim_url: str):
+    #Import the Outerinator module configured to use the stand-in server.
+    #The endpoint settings are read at import time, so the environment is set first.
+
+    #Returns: module: The imported app module
+    os.environ["OUTERINATOR_OVERPASS_URLS"] = overpass_url
+    os.environ["OUTERINATOR_NOMINATIM_URL"] = nominatim_url
+    os.environ.setdefault("OUTERINATOR_NOMINATIM_MIN_INTERVAL", "0.01")
+    spec = importlib.util.spec_from_file_location("outerinator_app", standin_app_path)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+def run_benchmark(arguments: argparse.Namespace, faults: FaultInjector) -> Dict[str, Dict]:
+    #Time place searches and geocoding through the app's own code paths against an in-process stand-in.
+
+    #Returns: Dict[str, Dict]: Client-side and server-side timing summaries
+    server = start_server(arguments.fixtures, faults, arguments.host, 0, verbose=arguments.verbose)
+    base_url = f"http://{arguments.host}:{server.server_address[1]}"
+    app = load_app(f"{base_url}/api/interpreter", f"{base_url}/search")
+
+    #Only place searches and geocoding are used, so the planner is built without opening the
+    #caches and place stores in the working directory. Every store is a fresh one in a temp
+    #directory, so no warm tile, geocode or imported extract answers before the stand-in
+    work_path = tempfile.mkdtemp(prefix="outerinator_bench_")
+    planner = app.OutingPlanner.__new__(app.OutingPlanner)
+    planner.geocoding = app.GeocodingService.shared()
+    planner.geocode_cache = app.GeocodeCache(os.path.join(work_path, "cache.db"))
+    planner.gazetteer = app.Gazetteer(os.path.join(work_path, "gazetteer.db"), ())
+    planner.overpass_cache = app.OverpassCache(os.path.join(work_path, "cache.db"))
+    planner.overpass_endpoints = app.OverpassEndpointPool()
+    planner.local_places = app.LocalPlaceStore(os.path.join(work_path, "osm.db"))
+    planner.classifier = app.PlaceClassifier()
+    planner.opening_hours = app.OpeningHoursParser()
+    planner.place_tags = {}
+    planner.last_query_status = None
+    planner.last_query_source = None
+
+    center_lat, center_lon = (float(value) for value in arguments.center.split(","))
+    tags = [tag for tag in arguments.tags.split(",") if tag]
+    timings = {'query_osm_places': [], 'geocode': []}
+    statuses = {}
+    places_found = 0
+
+    for run in range(arguments.runs):
+        if not arguments.warm:
+            planner.overpass_cache.clear()
+        started = time.perf_counter()
+        places = planner.query_osm_places(center_lat, center_lon, arguments.radius, tags)
+        timings['query_osm_places'].append((time.perf_counter() - started) * 1000.0)
+        statuses[planner.last_query_status] = statuses.get(planner.last_query_status, 0) + 1
+        places_found = len(places)
+
+        started = time.perf_counter()
+        try:
+            planner.geocoding.search(arguments.query, 1, app.geocode_priority_background)
+        except RuntimeError:
+            pass
+        timings['geocode'].append((time.perf_counter() - started) * 1000.0)
+
+    results = {name: summarise(samples) for name, samples in timings.items()}
+    results['query_osm_places']['places_found'] = places_found
+    results['query_osm_places']['statuses'] = statuses
+    results['server'] = server.statistics()
+    server.shutdown()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stand-in Overpass and Nominatim server for Outerinator tests and benchmarks.")
+    parser.add_argument("command", choices=("serve", "bench"), help="serve: run the server, bench: time the app against an in-process server")
+    parser.add_argument("--fixtures", default=standin_fixtures_path, help="Directory of recorded responses")
+    parser.add_argument("--host", default=standin_host)
+    parser.add_argument("--port", type=int, default=standin_port)
+    parser.add_argument("--record", action="store_true", help="Fetch and record responses missing from the fixtures from the live services")
+    parser.add_argument("--latency", type=float, default=0.0, help="Milliseconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra milliseconds, up to this")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="KiB/s for response bodies, 0 for unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with an error status")
+    parser.add_argument("--error-statuses", default="429,504", help="Comma separated statuses used for injected errors")
+    parser.add_argument("--retry-after", default=None, help="Retry-After header sent with injected errors")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Share of responses cut off half way")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible latency and errors")
+    parser.add_argument("--runs", type=int, default=30, help="bench: repetitions")
+    parser.add_argument("--center", default="-36.8509,174.7645", help="bench: lat,lon searched around")
+    parser.add_argument("--radius", type=float, default=5.0, help="bench: search radius in km")
+    parser.add_argument("--tags", default="leisure=park|natural=wood|natural=beach,amenity=restaurant|amenity=cafe|amenity=fast_food", help="bench: comma separated OSM tag patterns")
+    parser.add_argument("--query", default="Auckland", help="bench: geocoded place name")
+    parser.add_argument("--warm", action="store_true", help="bench: keep the Overpass tile cache between runs")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    arguments = parser.parse_args(argv)
+
+    faults = FaultInjector(arguments.latency, arguments.jitter, arguments.bandwidth, arguments.error_rate,
+                           tuple(int(status) for status in arguments.error_statuses.split(",") if status.strip()),
+                           arguments.retry_after, arguments.truncate_rate, arguments.seed)
+
+    if arguments.command == "bench":
+        print(json.dumps(run_benchmark(arguments, faults), indent=2))
+        return 0
+
+    server = StandinServer((arguments.host, arguments.port), FixtureStore(arguments.fixtures), faults, arguments.record, arguments.verbose)
+    print(f"Stand-in serving {arguments.fixtures} on http://{arguments.host}:{server.server_address[1]} (/api/interpreter, /search, /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.statistics(), indent=2))
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())